@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Compare the stream throughput of the Python `add_tags_from_sigmf` block against the
+native `add_tags_from_sigmf_native` (C++ `tag_inserter`) implementation by pushing
+samples from a null source through each block into a null sink.
+"""
+
+import argparse
+import time
+import numpy
+from gnuradio import gr
+from gnuradio import blocks
+from gnuradio import sigmf_utils
+
+
+def make_metadata(n_samples, n_annotations, rate=61.44e6):
+    starts = numpy.sort(numpy.random.randint(0, n_samples, n_annotations))
+    annotations = [{'core:sample_start': int(s), 'core:sample_count': 1000,
+                    'core:freq_lower_edge': 915e6 + 1e5, 'core:freq_upper_edge': 915e6 + 3e5}
+                   for s in starts]
+    return {'global': {'core:sample_rate': rate, 'core:datatype': 'ci16_le'},
+            'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+            'annotations': annotations}
+
+
+def run(factory, dtype, md, n_samples):
+    itemsize = numpy.dtype(dtype).itemsize
+    tb = gr.top_block()
+    src = blocks.null_source(itemsize)
+    head = blocks.head(itemsize, n_samples)
+    tagger = factory(dtype, md)
+    snk = blocks.null_sink(itemsize)
+    tb.connect(src, head, tagger, snk)
+    t0 = time.perf_counter()
+    tb.run()
+    return n_samples / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', type=int, default=100000000)
+    parser.add_argument('--annotations', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f'{"type":>10} {"python (Msps)":>14} {"native (Msps)":>14}')
+    for name, dtype in [('ci16_le', numpy.int16), ('cf32_le', numpy.complex64)]:
+        md = make_metadata(args.samples, args.annotations)
+        python_rate = run(sigmf_utils.add_tags_from_sigmf, dtype, md, args.samples)
+        native_rate = run(sigmf_utils.add_tags_from_sigmf_native, dtype, md, args.samples)
+        print(f'{name:>10} {python_rate / 1e6:>14.1f} {native_rate / 1e6:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
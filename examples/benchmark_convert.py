@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Measure the datatype conversion throughput of `sigmf_file_source` for every SigMF
+core datatype and output type. The `kernel` column is the `SampleConverter` alone on
+buffers of `--chunk` samples, the `flowgraph` column streams a generated recording
+of `--samples` samples through `sigmf_file_source` into a null sink (page cache warm).
+For reference the previous `ci16_le` to `cf32_le` conversion chain (file source and
+`interleaved_short_to_complex`) is timed as well.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy
+import pmt
+from gnuradio import gr
+from gnuradio import blocks
+from gnuradio import sigmf_utils
+from gnuradio.sigmf_utils.convert import SampleConverter, SIGMF_DATATYPES, parse_datatype
+
+
+def random_samples(converter, count):
+    samples = converter.make_buffer(count)
+    kind = converter.component_type.kind
+    if kind == 'f':
+        samples[:] = numpy.random.randn(*samples.shape)
+    else:
+        info = numpy.iinfo(converter.component_type)
+        samples[:] = numpy.random.randint(info.min, info.max, samples.shape, dtype=numpy.int64)
+    return samples
+
+
+def run_kernel(converter, chunk, repeats):
+    samples = random_samples(converter, chunk)
+    out = numpy.empty(chunk * converter.items_per_sample, converter.item_type)
+    converter.convert(samples, out)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        converter.convert(samples, out)
+    return chunk * repeats / (time.perf_counter() - t0)
+
+
+def make_recording(directory, datatype, n_samples, chunk=1 << 20):
+    base = os.path.join(directory, f'bench_{datatype}')
+    converter = SampleConverter(datatype, 'cf32_le')
+    with open(base + '.sigmf-data', 'wb') as f:
+        for start in range(0, n_samples, chunk):
+            random_samples(converter, min(chunk, n_samples - start)).tofile(f)
+    md = {'global': {'core:sample_rate': 10e6, 'core:datatype': datatype},
+          'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+          'annotations': []}
+    with open(base + '.sigmf-meta', 'w') as f:
+        json.dump(md, f)
+    return base
+
+
+def run_flowgraph(source, itemsize, n_samples):
+    tb = gr.top_block()
+    tb.connect(source, blocks.null_sink(itemsize))
+    t0 = time.perf_counter()
+    tb.run()
+    return n_samples / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', type=int, default=10000000)
+    parser.add_argument('--chunk', type=int, default=8192)
+    parser.add_argument('--repeats', type=int, default=1000)
+    parser.add_argument('--reader', default='mmap', choices=['file', 'mmap'])
+    parser.add_argument('--dir', default=None, help='directory for the generated recordings')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        print(f'{"datatype":>10} {"output":>8} {"kernel MS/s":>12} {"flowgraph MS/s":>15}')
+        for datatype in SIGMF_DATATYPES:
+            base = make_recording(tmp, datatype, args.samples)
+            # warm up the page cache
+            with open(base + '.sigmf-data', 'rb') as f:
+                while f.read(1 << 24):
+                    pass
+            for output_type in ['cf32_le', 'ci16_le', 'rf32_le']:
+                if output_type == 'rf32_le' and parse_datatype(datatype)[0]:
+                    continue
+                converter = SampleConverter(datatype, output_type)
+                kernel = run_kernel(converter, args.chunk, args.repeats)
+                src = sigmf_utils.sigmf_file_source(base + '.sigmf-meta', output_type, 0, pmt.PMT_NIL, False, False,
+                                                    args.reader)
+                flowgraph = run_flowgraph(src, numpy.dtype(converter.item_type).itemsize, args.samples)
+                print(f'{datatype:>10} {output_type:>8} {kernel / 1e6:>12.1f} {flowgraph / 1e6:>15.1f}')
+
+            if datatype == 'ci16_le':
+                src = blocks.file_source(gr.sizeof_short, base + '.sigmf-data', False)
+                chain = gr.hier_block2('legacy_chain', gr.io_signature(0, 0, 0),
+                                       gr.io_signature(1, 1, gr.sizeof_gr_complex))
+                convert = blocks.interleaved_short_to_complex(False, False, 2 ** 15)
+                chain.connect(src, convert, chain)
+                legacy = run_flowgraph(chain, gr.sizeof_gr_complex, args.samples)
+                print(f'{"(legacy)":>10} {"cf32_le":>8} {"":>12} {legacy / 1e6:>15.1f}')
+            os.remove(base + '.sigmf-meta')
+            os.remove(base + '.sigmf-data')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Compare the `sigmf_file_source` readers by streaming a generated dataset into a null
+sink with the GNU Radio file source (`file`), the memory mapped `sigmf_data_source`
+(`mmap`), the asynchronous thread pool reader (`prefetch`) and its direct I/O variant
+(`direct`), for both `ci16_le` and `cf32_le` recordings. Throughput, the process CPU
+time per sample and the growth of the page cache during playback are reported. For
+`prefetch` and `direct` the time playback stalled waiting for data is reported too,
+run with `--dir` on the network share or the recording disk to size
+`--depth`/`--chunk-size`. The first pass over the file warms the page cache, so the
+numbers reflect reader overhead rather than disk speed (except for `direct`, which
+always reads the disk) unless `--drop-caches` is given (requires root). A `direct*`
+row fell back to buffered reads because the file system does not support direct I/O.
+With `--tags` the SigMF tags are generated as well, which the `mmap` path does inside
+the source block rather than in a separate tagging block.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+import numpy
+import pmt
+from gnuradio import gr
+from gnuradio import blocks
+from gnuradio import sigmf_utils
+
+
+def make_recording(directory, datatype, n_samples, chunk=1 << 20):
+    base = os.path.join(directory, f'bench_{datatype}')
+    with open(base + '.sigmf-data', 'wb') as f:
+        for start in range(0, n_samples, chunk):
+            count = min(chunk, n_samples - start)
+            if datatype == 'ci16_le':
+                numpy.random.randint(-2**15, 2**15, 2 * count, dtype=numpy.int16).tofile(f)
+            else:
+                numpy.random.randn(2 * count).astype(numpy.float32).tofile(f)
+    md = {'global': {'core:sample_rate': 10e6, 'core:datatype': datatype},
+          'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+          'annotations': []}
+    with open(base + '.sigmf-meta', 'w') as f:
+        json.dump(md, f)
+    return base + '.sigmf-meta'
+
+
+def page_cache_size():
+    """
+    Return the size of the page cache in bytes (Linux only, 0 elsewhere).
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('Cached:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def run(filename, datatype, reader, args, drop_caches, tags=False):
+    if drop_caches:
+        subprocess.run(['sh', '-c', 'sync; echo 3 > /proc/sys/vm/drop_caches'], check=True)
+    tb = gr.top_block()
+    src = sigmf_utils.sigmf_file_source(filename, datatype, 0, pmt.PMT_NIL, False, tags, reader, args.readahead,
+                                        prefetch_depth=args.depth, prefetch_chunk_size=args.chunk_size,
+                                        prefetch_threads=args.threads)
+    snk = blocks.null_sink(gr.sizeof_short if datatype == 'ci16_le' else gr.sizeof_gr_complex)
+    tb.connect(src, snk)
+    cached = page_cache_size()
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    tb.run()
+    wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+    return wall, cpu, page_cache_size() - cached, src.reader_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', type=int, default=100000000)
+    parser.add_argument('--readahead', type=int, default=16 << 20)
+    parser.add_argument('--drop-caches', action='store_true')
+    parser.add_argument('--tags', action='store_true', help='also generate the SigMF tags')
+    parser.add_argument('--depth', type=int, default=8, help='prefetch ring depth')
+    parser.add_argument('--chunk-size', type=int, default=4 << 20, help='prefetch buffer size in bytes')
+    parser.add_argument('--threads', type=int, default=2, help='prefetch I/O threads')
+    parser.add_argument('--readers', nargs='+', default=['file', 'mmap', 'prefetch', 'direct'],
+                        choices=['file', 'mmap', 'prefetch', 'direct'])
+    parser.add_argument('--dir', default=None, help='directory for the generated recordings')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        print(f'{"datatype":>10} {"reader":>8} {"MS/s":>10} {"CPU ns/sample":>14} {"stall (s)":>10} '
+              f'{"cache (MiB)":>12}')
+        for datatype in ['ci16_le', 'cf32_le']:
+            filename = make_recording(tmp, datatype, args.samples)
+            # warm up the page cache so both readers see the same conditions
+            run(filename, datatype, 'file', args, False)
+            for reader in args.readers:
+                wall, cpu, cached, stats = run(filename, datatype, reader, args, args.drop_caches, args.tags)
+                stall = f'{stats["stall_time"]:.3f}' if 'stall_time' in stats else '-'
+                if not stats.get('direct', True):
+                    reader += '*'
+                print(f'{datatype:>10} {reader:>8} {args.samples / wall / 1e6:>10.1f} '
+                      f'{cpu / args.samples * 1e9:>14.2f} {stall:>10} {cached / 2**20:>12.1f}')
+            os.remove(filename)
+            os.remove(filename.replace('.sigmf-meta', '.sigmf-data'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Compare loading a large `.sigmf-meta` file with `json.load` against the streaming
+`read_metadata` loader. A metadata file with `--annotations` annotations is generated,
+once with the annotations last (as written by `AnnotationWriter`) and once with sorted
+keys (annotations first, as written by most other SigMF tools). For each loader the
+time until the first SigMF tag is available, the time to generate every annotation
+tag, the time to pull the annotation columns (`annotation_columns()`, without
+generating tags) and the peak Python memory (tracemalloc, measured in a separate pass) are shown,
+with `read_metadata` run once per installed `codec` backend and once with the
+`.sigmf-idx` annotation sidecar (the time to build it is shown first). Writing the same
+annotations is compared too: `json.dump` with `indent=4` of the whole dictionary
+against the streaming `AnnotationWriter` in its pretty and compact formats.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from gnuradio.sigmf_utils import codec, annotation_columns
+from gnuradio.sigmf_utils.annotation_writer import AnnotationWriter
+from gnuradio.sigmf_utils.metadata import read_metadata
+from gnuradio.sigmf_utils.add_tags_from_sigmf import TagGenerator
+
+
+SIGMF_GLOBAL = {'core:sample_rate': 10e6, 'core:datatype': 'cf32_le'}
+SIGMF_CAPTURES = [{'core:sample_start': 0, 'core:frequency': 915e6}]
+
+
+def make_annotation(idx):
+    return {'core:sample_start': idx * 1000, 'core:sample_count': 500,
+            'core:freq_lower_edge': 914.9e6, 'core:freq_upper_edge': 915.1e6,
+            'core:label': 'burst', 'capture_details:SNRdB': 12.5}
+
+
+def make_metadata(filename, n_annotations, sort_keys):
+    md = {'global': SIGMF_GLOBAL, 'captures': SIGMF_CAPTURES, 'annotations': []}
+    with open(filename, 'w') as f:
+        header = json.dumps(md, sort_keys=sort_keys, indent=4)
+        head, tail = header.split('"annotations": []')
+        f.write(head + '"annotations": [')
+        for idx in range(n_annotations):
+            anno = make_annotation(idx)
+            f.write((',' if idx else '') + '\n        ' + json.dumps(anno, sort_keys=sort_keys))
+        f.write('\n    ]' + tail)
+
+
+def write_json(filename, annotations, pretty):
+    with open(filename, 'w') as f:
+        json.dump({'global': SIGMF_GLOBAL, 'captures': SIGMF_CAPTURES, 'annotations': annotations}, f, indent=4)
+
+
+def write_streamed(filename, annotations, pretty, batch_size=256):
+    writer = AnnotationWriter(filename, SIGMF_GLOBAL, SIGMF_CAPTURES, pretty)
+    writer.open()
+    for start in range(0, len(annotations), batch_size):
+        writer.write_batch(annotations[start:start + batch_size])
+    writer.close()
+
+
+def load_json(filename):
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def run(loader, filename):
+    t0 = time.perf_counter()
+    tags = TagGenerator(loader(filename)).annotation_tags()
+    next(tags)
+    first = time.perf_counter() - t0
+    count = 1 + sum(1 for tag in tags)
+    return first, time.perf_counter() - t0, count
+
+
+def columns(loader, filename):
+    t0 = time.perf_counter()
+    annotation_columns(loader(filename)['annotations'])
+    return time.perf_counter() - t0
+
+
+def load_sidecar(filename):
+    return read_metadata(filename, annotation_index=True)
+
+
+def peak_memory(loader, filename):
+    tracemalloc.start()
+    for tag in TagGenerator(loader(filename)).annotation_tags():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--annotations', type=int, default=1000000)
+    parser.add_argument('--dir', default=None, help='directory for the generated metadata')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        filename = os.path.join(tmp, 'bench.sigmf-meta')
+        loaders = [('json.load', 'json', load_json)]
+        loaders += [('read_metadata', backend, read_metadata) for backend in codec.BACKENDS]
+        loaders += [('sigmf-idx', codec.backend(), load_sidecar)]
+        print(f'{"layout":>18} {"loader":>14} {"backend":>9} {"first tag (s)":>14} {"all tags (s)":>13} '
+              f'{"columns (s)":>12} {"peak (MiB)":>11}')
+        for sort_keys in [False, True]:
+            make_metadata(filename, args.annotations, sort_keys)
+            layout = 'annotations first' if sort_keys else 'annotations last'
+            t0 = time.perf_counter()
+            load_sidecar(filename)
+            print(f'{layout:>18} {"(build sidecar)":>14} {codec.backend():>9} {time.perf_counter() - t0:>14.3f}')
+            for name, backend, loader in loaders:
+                codec.set_backend(backend)
+                first, total, count = run(loader, filename)
+                parsed = columns(loader, filename)
+                peak = peak_memory(loader, filename)
+                print(f'{layout:>18} {name:>14} {backend:>9} {first:>14.3f} {total:>13.3f} {parsed:>12.3f} '
+                      f'{peak / 2**20:>11.1f}')
+        print(f'({os.path.getsize(filename) / 2**20:.0f} MiB of metadata, {count} annotation tags)')
+        os.remove(filename)
+
+        annotations = [make_annotation(idx) for idx in range(args.annotations)]
+        writers = [('json.dump', 'json', write_json, True)]
+        writers += [(f'{"pretty" if pretty else "compact"} writer', backend, write_streamed, pretty)
+                    for backend in codec.BACKENDS if backend != 'simdjson' for pretty in [True, False]]
+        print(f'\n{"writer":>18} {"backend":>9} {"write (s)":>10} {"size (MiB)":>11}')
+        for name, backend, writer, pretty in writers:
+            codec.set_backend(backend)
+            t0 = time.perf_counter()
+            writer(filename, annotations, pretty)
+            elapsed = time.perf_counter() - t0
+            print(f'{name:>18} {backend:>9} {elapsed:>10.3f} {os.path.getsize(filename) / 2**20:>11.1f}')
+            os.remove(filename)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Measure the PDU handling throughput (PDUs per second) of the Python `pdu_meta_writer`
+block against the native `pdu_annotation_sink` block. PDUs are posted directly to the
+message port of a running flowgraph in batches small enough to stay below the message
+queue limit, and the rate is taken from the number of annotations produced.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import pmt
+from gnuradio import gr
+from gnuradio import blocks
+from gnuradio import sigmf_utils
+
+
+def make_pdus(count, fft_mode=True):
+    pdus = []
+    for n in range(count):
+        if fft_mode:
+            meta = {'start_offset': n * 1000, 'end_offset': n * 1000 + 500, 'center_frequency': 901e6,
+                    'bandwidth': 1e6, 'burst_id': n, 'snr_db': 12.5}
+        else:
+            meta = {'burst_time': (n // 1000, (n % 1000) / 1000.0), 'sample_rate': 40e6,
+                    'center_frequency': 901e6, 'bandwidth': 1e6, 'pdu_num': n, 'snr_db': 12.5}
+        pdus.append(pmt.cons(pmt.to_pmt(meta), pmt.init_c32vector(64, [0] * 64)))
+    return pdus
+
+
+def run(block, count_fn, pdus, batch=4096):
+    tb = gr.top_block()
+    strobe = blocks.message_strobe(pmt.PMT_NIL, 1e6)
+    tb.msg_connect(strobe, 'strobe', block, 'in')
+    port = pmt.intern('in')
+    tb.start()
+    t0 = time.perf_counter()
+    for start in range(0, len(pdus), batch):
+        for pdu in pdus[start:start + batch]:
+            block.to_basic_block()._post(port, pdu)
+        while count_fn() < start:
+            time.sleep(0.0001)
+    while count_fn() < len(pdus):
+        time.sleep(0.0001)
+    elapsed = time.perf_counter() - t0
+    tb.stop()
+    tb.wait()
+    return len(pdus) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pdus', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'bench.sigmf-meta')
+        print(f'{"mode":>12} {"python (PDU/s)":>16} {"native (PDU/s)":>16}')
+        for mode, fft_mode in [('fft_burst', True), ('tags_to_pdu', False)]:
+            pdus = make_pdus(args.pdus, fft_mode)
+            python_block = sigmf_utils.pdu_meta_writer(filename, 900e6, 40e6, 'use_burst_id', 'ci16_le')
+            python_rate = run(python_block, lambda: python_block.writer.count, pdus)
+            native_block = sigmf_utils.pdu_annotation_sink(filename, 900e6, 40e6, 'use_burst_id', 'ci16_le')
+            native_rate = run(native_block, native_block.annotation_count, pdus)
+            print(f'{mode:>12} {python_rate:>16.0f} {native_rate:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
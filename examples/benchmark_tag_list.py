@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Measure how long `add_tags_from_sigmf` takes to build its tag list as a function of
+the number of annotations in the SigMF metadata (compilation plus one full pass of the
+tag generator), and how long a repeat takes once the tags have been cached. The
+per-annotation Python loop that was used before the vectorized compilation stage is
+included for comparison.
+"""
+
+import argparse
+import time
+import numpy
+import pmt
+from gnuradio import gr
+from gnuradio import sigmf_utils
+
+
+def make_metadata(n_annotations, n_captures=100, rate=40e6):
+    captures = [{'core:sample_start': int(i * 10 * n_annotations), 'core:frequency': 915e6 + i * 1e6}
+                for i in range(n_captures)]
+    starts = numpy.sort(numpy.random.randint(0, 1000 * n_annotations, n_annotations))
+    annotations = [{'core:sample_start': int(s), 'core:sample_count': 1000,
+                    'core:freq_lower_edge': 915e6 + 1e5, 'core:freq_upper_edge': 915e6 + 3e5}
+                   for s in starts]
+    return {'global': {'core:sample_rate': rate, 'core:datatype': 'cf32_le'},
+            'captures': captures, 'annotations': annotations}
+
+
+def legacy_annotation_tags(md):
+    """ the per-annotation loop as it was implemented before compile_annotations() """
+    tags = []
+    rate = float(md['global']['core:sample_rate'])
+    sob = pmt.intern('new_burst')
+    eob = pmt.intern('gone_burst')
+    for idx, anno in enumerate(md['annotations']):
+        offset = anno.get('core:sample_start', 0)
+        frequency = float(sigmf_utils.get_capture_metadata(md['captures'], offset, 'core:frequency'))
+        end = offset + anno.get('core:sample_count', offset)
+        tag_dict = {'sample_rate': rate, 'center_frequency': frequency, 'burst_id': idx}
+        f_lower = anno.get('core:freq_lower_edge')
+        f_upper = anno.get('core:freq_upper_edge')
+        if f_lower and f_upper:
+            tag_dict['bandwidth'] = float(f_upper - f_lower)
+            freq = f_lower + float(tag_dict['bandwidth']) / 2.0
+            tag_dict['relative_frequency'] = (freq - frequency) * 1.0 / rate
+        tags.append(gr.tag_utils.python_to_tag((offset, sob, pmt.to_pmt(tag_dict), pmt.intern('SigMF Annotation'))))
+        tags.append(gr.tag_utils.python_to_tag((end, eob, pmt.to_pmt({'burst_id': idx}), pmt.intern('SigMF Annotation'))))
+    return tags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--legacy', action='store_true', help='also time the legacy per-annotation loop')
+    args = parser.parse_args()
+
+    print(f'{"annotations":>12} {"build (s)":>12} {"repeat (s)":>12} {"legacy (s)":>12}')
+    for count in args.counts:
+        md = make_metadata(count)
+
+        # tags are generated lazily, so walk the whole tag stream once
+        t0 = time.perf_counter()
+        block = sigmf_utils.add_tags_from_sigmf(numpy.complex64, md, True, pmt.intern('rx_start'))
+        for tag in block.scheduler.template.replay(0):
+            pass
+        build = time.perf_counter() - t0
+
+        # a repeat replays the cached tags with a new base offset
+        t0 = time.perf_counter()
+        for tag in block.scheduler.template.replay(1 << 40):
+            pass
+        repeat = time.perf_counter() - t0
+
+        legacy = float('nan')
+        if args.legacy:
+            t0 = time.perf_counter()
+            legacy_annotation_tags(md)
+            legacy = time.perf_counter() - t0
+
+        print(f'{count:>12} {build:>12.3f} {repeat:>12.3f} {legacy:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
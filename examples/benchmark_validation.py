@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+"""
+Compare the `fast` and `full` modes of `validate_metadata` and the current
+`check_metadata` against the per-annotation loop `check_metadata` used to run. A list
+of `--list-annotations` annotations held in memory is validated with each, then a
+`.sigmf-meta` file with `--annotations` annotations (one in a thousand of them out of
+order) is validated with its annotations streamed from the file (`read_metadata`) and
+from its `.sigmf-idx` sidecar (the time to build it is shown first). The number of
+problems found (at most the default `max_issues` of 1000) is shown with the time.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from gnuradio.sigmf_utils import validate_metadata, check_metadata
+from gnuradio.sigmf_utils.metadata import read_metadata
+
+
+SIGMF_GLOBAL = {'core:sample_rate': 10e6, 'core:datatype': 'cf32_le', 'core:version': '1.0.0',
+                'core:extensions': [{'name': 'capture_details', 'version': '1.0.0', 'optional': True}]}
+SIGMF_CAPTURES = [{'core:sample_start': 0, 'core:frequency': 915e6}]
+
+
+def make_annotation(idx):
+    start = (idx - 500 if idx % 1000 == 999 else idx) * 1000
+    return {'core:sample_start': start, 'core:sample_count': 500,
+            'core:freq_lower_edge': 914.9e6, 'core:freq_upper_edge': 915.1e6,
+            'core:label': 'burst', 'capture_details:SNRdB': 12.5}
+
+
+def make_metadata(filename, n_annotations, block=100000):
+    with open(filename, 'w') as f:
+        head, tail = json.dumps({'global': SIGMF_GLOBAL, 'captures': SIGMF_CAPTURES, 'annotations': []},
+                                indent=4).split('"annotations": []')
+        f.write(head + '"annotations": [')
+        for first in range(0, n_annotations, block):
+            f.write(','.join('\n        ' + json.dumps(make_annotation(idx))
+                             for idx in range(first, min(first + block, n_annotations))))
+            if first + block < n_annotations:
+                f.write(',')
+        f.write('\n    ]' + tail)
+
+
+def check_loop(metadata):
+    # the structural checks of the original `check_metadata`, one annotation at a time
+    problems = 0
+    for capture in metadata['captures']:
+        if not isinstance(capture, dict) or capture.get('core:sample_start') is None:
+            problems += 1
+    for annotation in metadata['annotations']:
+        if not isinstance(annotation, dict) or annotation.get('core:sample_start') is None:
+            problems += 1
+    return [None] * problems
+
+
+def timed(validate, metadata):
+    t0 = time.perf_counter()
+    issues = validate(metadata)
+    return time.perf_counter() - t0, len(issues)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--annotations', type=int, default=10000000)
+    parser.add_argument('--list-annotations', type=int, default=1000000)
+    parser.add_argument('--dir', default=None, help='directory for the generated metadata')
+    args = parser.parse_args()
+
+    validators = [('fast', lambda md: validate_metadata(md, 'fast')),
+                  ('full', lambda md: validate_metadata(md, 'full'))]
+    print(f'{"annotations":>18} {"count":>10} {"validation":>20} {"time (s)":>9} {"problems":>9}')
+
+    metadata = {'global': SIGMF_GLOBAL, 'captures': SIGMF_CAPTURES,
+                'annotations': [make_annotation(idx) for idx in range(args.list_annotations)]}
+    checks = [('check_metadata loop', check_loop), ('check_metadata', lambda md: check_metadata(md) or [])]
+    for name, validate in checks + validators:
+        elapsed, problems = timed(validate, metadata)
+        print(f'{"list":>18} {args.list_annotations:>10} {name:>20} {elapsed:>9.3f} {problems:>9}')
+    del metadata
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        filename = os.path.join(tmp, 'bench.sigmf-meta')
+        make_metadata(filename, args.annotations)
+        t0 = time.perf_counter()
+        read_metadata(filename, annotation_index=True)
+        print(f'{"sigmf-idx":>18} {args.annotations:>10} {"(build)":>20} {time.perf_counter() - t0:>9.3f}')
+        for source, annotation_index in [('streamed', False), ('sigmf-idx', True)]:
+            for name, validate in validators:
+                elapsed, problems = timed(validate, read_metadata(filename, annotation_index=annotation_index))
+                print(f'{source:>18} {args.annotations:>10} {name:>20} {elapsed:>9.3f} {problems:>9}')
+        print(f'({os.path.getsize(filename) / 2**20:.0f} MiB of metadata)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_PDU_ANNOTATION_SINK_H
+#define INCLUDED_SIGMF_UTILS_PDU_ANNOTATION_SINK_H
+
+#include <gnuradio/block.h>
+#include <gnuradio/sigmf_utils/api.h>
+
+namespace gr {
+namespace sigmf_utils {
+
+/*!
+ * \brief Native equivalent of the Python `pdu_meta_writer` block.
+ * \ingroup sigmf_utils
+ *
+ * \details
+ * Accepts PDUs with gr-fhss_utils style metadata dictionaries on the `in` message
+ * port and produces SigMF annotations from them. Two kinds of PDUs are understood:
+ *
+ * - tags_to_pdu PDUs, identified by a `burst_time` tuple; the end of the burst is
+ *   inferred from the PDU length and `sample_rate` key and `pdu_num` is the burst id
+ * - fft burst detector PDUs with `start_offset`, `end_offset`, `center_frequency`
+ *   and `burst_id` keys
+ *
+ * `bandwidth` (floored at rate/1000) and `snr_db` are optional in both. A label of
+ * `use_burst_id` or `use_snr_db` generates the `core:description` from the PDU,
+ * any other label is used as is. PDUs without a finite `snr_db` are annotated
+ * without the `capture_details:SNRdB` field.
+ *
+ * The metadata file is opened when the flowgraph starts, annotations are appended
+ * as the PDUs are handled and the annotations array is closed when it stops.
+ */
+class SIGMF_UTILS_API pdu_annotation_sink : virtual public gr::block
+{
+public:
+    typedef std::shared_ptr<pdu_annotation_sink> sptr;
+
+    /*!
+     * \brief Return a shared_ptr to a new instance of sigmf_utils::pdu_annotation_sink.
+     *
+     * \param filename SigMF metadata file to generate
+     * \param freq SigMF `captures` `core:frequency` field
+     * \param rate SigMF `global` `core:sample_rate` field
+     * \param label value to use for `core:description` in annotations
+     * \param dtype SigMF data type to use for `global` `core:datatype` field
+     */
+    static sptr make(const std::string& filename,
+                     double freq,
+                     double rate,
+                     const std::string& label,
+                     const std::string& dtype);
+
+    /*!
+     * \brief Number of annotations written so far.
+     */
+    virtual uint64_t annotation_count() const = 0;
+};
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_PDU_ANNOTATION_SINK_H */
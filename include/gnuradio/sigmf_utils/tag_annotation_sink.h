@@ -0,0 +1,65 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_TAG_ANNOTATION_SINK_H
+#define INCLUDED_SIGMF_UTILS_TAG_ANNOTATION_SINK_H
+
+#include <gnuradio/sigmf_utils/api.h>
+#include <gnuradio/sync_block.h>
+
+namespace gr {
+namespace sigmf_utils {
+
+/*!
+ * \brief Native equivalent of the Python `tag_meta_writer` block.
+ * \ingroup sigmf_utils
+ *
+ * \details
+ * Produces SigMF annotations from gr-fhss_utils style `new_burst` / `gone_burst`
+ * stream tags. The tag keys are matched against pre-interned symbols and only the
+ * `burst_id`, `center_frequency`, `sample_rate`, `relative_frequency` and `bandwidth`
+ * fields of the tag dictionaries are read. The stream itself is ignored.
+ *
+ * The metadata file is opened when the flowgraph starts and every annotation is
+ * appended to it as soon as its `gone_burst` tag is seen; the annotations array is
+ * closed when the flowgraph stops.
+ */
+class SIGMF_UTILS_API tag_annotation_sink : virtual public gr::sync_block
+{
+public:
+    typedef std::shared_ptr<tag_annotation_sink> sptr;
+
+    /*!
+     * \brief Return a shared_ptr to a new instance of sigmf_utils::tag_annotation_sink.
+     *
+     * \param filename SigMF metadata file to generate
+     * \param freq SigMF `captures` `core:frequency` field
+     * \param rate SigMF `global` `core:sample_rate` field
+     * \param label value to use for `core:label` in annotations
+     * \param dtype SigMF data type to use for `global` `core:datatype` field
+     */
+    static sptr make(const std::string& filename,
+                     double freq,
+                     double rate,
+                     const std::string& label,
+                     const std::string& dtype);
+
+    /*!
+     * \brief Number of annotations written so far.
+     */
+    virtual uint64_t annotation_count() const = 0;
+
+    /*!
+     * \brief Number of bursts that have started but not ended yet.
+     */
+    virtual size_t in_progress_count() const = 0;
+};
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_TAG_ANNOTATION_SINK_H */
@@ -0,0 +1,96 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_TAG_INSERTER_H
+#define INCLUDED_SIGMF_UTILS_TAG_INSERTER_H
+
+#include <gnuradio/sigmf_utils/api.h>
+#include <gnuradio/sync_block.h>
+#include <gnuradio/tags.h>
+
+namespace gr {
+namespace sigmf_utils {
+
+/*!
+ * \brief Pass a stream through unchanged while adding a precompiled set of tags.
+ * \ingroup sigmf_utils
+ *
+ * \details
+ * This is the native implementation behind `add_tags_from_sigmf_native`. The tags are
+ * given with offsets relative to the start of the SigMF recording and are emitted just
+ * in time: each call to work only adds the tags whose offset falls within the items
+ * being passed through. If a start tag key is given nothing is tagged until a tag
+ * with that key is observed on the input, and every time it is observed the tag set
+ * is restarted relative to the offset of that tag. Bursts that are still open at a
+ * restart (a `new_burst` tag without its `gone_burst` tag) are closed there with a
+ * `gone_burst` tag, as in `add_tags_from_sigmf`.
+ *
+ * The annotations of a recording are best given to `set_bursts` as columns rather than
+ * as tags: the `new_burst` and `gone_burst` tags are then only created as they are
+ * emitted, and each burst is held in 48 bytes instead of two tags with PMT values.
+ */
+class SIGMF_UTILS_API tag_inserter : virtual public gr::sync_block
+{
+public:
+    typedef std::shared_ptr<tag_inserter> sptr;
+
+    /*!
+     * \brief Return a shared_ptr to a new instance of sigmf_utils::tag_inserter.
+     *
+     * \param itemsize size of the stream items in bytes
+     * \param tags tags to insert, offsets relative to the start of the recording
+     * \param start_tag_key key of the tag marking the start of the recording, or
+     *        PMT_NIL to insert the tags once starting at item zero
+     */
+    static sptr make(size_t itemsize,
+                     const std::vector<gr::tag_t>& tags,
+                     pmt::pmt_t start_tag_key = pmt::PMT_NIL);
+
+    /*!
+     * \brief Replace the set of tags. The current pass continues with the new tags,
+     * tags for items that have already been passed through are skipped.
+     */
+    virtual void set_tags(const std::vector<gr::tag_t>& tags) = 0;
+
+    /*!
+     * \brief Number of tags held by the block.
+     */
+    virtual size_t num_tags() const = 0;
+
+    /*!
+     * \brief Replace the set of bursts. Each burst is tagged with a `new_burst` tag at
+     * its start and a `gone_burst` tag at its end, with the values produced by
+     * `add_tags_from_sigmf`. The current pass continues with the new bursts, bursts
+     * starting at items that have already been passed through are skipped.
+     *
+     * \param start_offsets offsets of the burst starts, relative to the start of the
+     *        recording like the tags
+     * \param end_offsets offsets of the burst ends
+     * \param burst_ids burst ids (annotation numbers)
+     * \param center_frequencies capture center frequency of each burst in Hz
+     * \param bandwidths burst bandwidths in Hz, NaN if the bandwidth is not known
+     * \param relative_frequencies burst centers relative to the sample rate
+     * \param sample_rate sample rate of the recording
+     */
+    virtual void set_bursts(const std::vector<uint64_t>& start_offsets,
+                            const std::vector<uint64_t>& end_offsets,
+                            const std::vector<int64_t>& burst_ids,
+                            const std::vector<double>& center_frequencies,
+                            const std::vector<double>& bandwidths,
+                            const std::vector<double>& relative_frequencies,
+                            double sample_rate) = 0;
+
+    /*!
+     * \brief Number of bursts held by the block.
+     */
+    virtual size_t num_bursts() const = 0;
+};
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_TAG_INSERTER_H */
@@ -0,0 +1,154 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#include "annotation_writer.h"
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+
+namespace gr {
+namespace sigmf_utils {
+
+std::string format_double(double value)
+{
+    char buf[32];
+    for (int precision = 15; precision <= 17; precision++) {
+        snprintf(buf, sizeof(buf), "%.*g", precision, value);
+        if (strtod(buf, nullptr) == value) {
+            break;
+        }
+    }
+    return buf;
+}
+
+namespace {
+
+// JSON has no representation for NaN or infinity, those are written as null
+std::string json_number(double value)
+{
+    if (!std::isfinite(value)) {
+        return "null";
+    }
+    return format_double(value);
+}
+
+std::string json_string(const std::string& value)
+{
+    std::string out = "\"";
+    for (const char c : value) {
+        switch (c) {
+        case '"':
+            out += "\\\"";
+            break;
+        case '\\':
+            out += "\\\\";
+            break;
+        case '\n':
+            out += "\\n";
+            break;
+        case '\r':
+            out += "\\r";
+            break;
+        case '\t':
+            out += "\\t";
+            break;
+        default:
+            if (static_cast<unsigned char>(c) < 0x20) {
+                char buf[8];
+                snprintf(buf, sizeof(buf), "\\u%04x", c);
+                out += buf;
+            } else {
+                out += c;
+            }
+        }
+    }
+    return out + "\"";
+}
+
+} // namespace
+
+std::string sigmf_meta_filename(const std::string& filename)
+{
+    const std::string ext = ".sigmf-meta";
+    if (filename.size() >= ext.size() &&
+        filename.compare(filename.size() - ext.size(), ext.size(), ext) == 0) {
+        return filename;
+    }
+    const size_t dot = filename.find_last_of('.');
+    const size_t slash = filename.find_last_of('/');
+    if (dot == std::string::npos || (slash != std::string::npos && dot < slash)) {
+        return filename + ext;
+    }
+    return filename.substr(0, dot) + ext;
+}
+
+annotation_writer::annotation_writer(const std::string& filename,
+                                     const std::string& datatype,
+                                     double sample_rate,
+                                     double frequency)
+    : d_filename(filename),
+      d_datatype(datatype),
+      d_sample_rate(sample_rate),
+      d_frequency(frequency),
+      d_count(0)
+{
+}
+
+annotation_writer::~annotation_writer() { close(); }
+
+bool annotation_writer::open()
+{
+    close();
+    d_file.open(d_filename, std::ios::out | std::ios::trunc);
+    if (!d_file.is_open()) {
+        return false;
+    }
+    d_count = 0;
+    d_file << "{\n"
+           << "    \"global\": {\n"
+           << "        \"core:datatype\": " << json_string(d_datatype) << ",\n"
+           << "        \"core:sample_rate\": " << json_number(d_sample_rate) << ",\n"
+           << "        \"antenna:gain\": 0\n"
+           << "    },\n"
+           << "    \"captures\": [\n"
+           << "        {\n"
+           << "            \"core:sample_start\": 0,\n"
+           << "            \"core:frequency\": " << json_number(d_frequency) << "\n"
+           << "        }\n"
+           << "    ],\n"
+           << "    \"annotations\": [";
+    return d_file.good();
+}
+
+void annotation_writer::write(const annotation& anno)
+{
+    if (!d_file.is_open()) {
+        return;
+    }
+    d_file << (d_count ? ",\n" : "\n") << "        {\"core:sample_start\": " << anno.sample_start
+           << ", \"core:sample_count\": " << anno.sample_count
+           << ", \"core:freq_upper_edge\": " << json_number(anno.freq_upper_edge)
+           << ", \"core:freq_lower_edge\": " << json_number(anno.freq_lower_edge) << ", "
+           << json_string(anno.label_key) << ": " << json_string(anno.label);
+    if (anno.has_snr) {
+        d_file << ", \"capture_details:SNRdB\": " << json_number(anno.snr_db);
+    }
+    d_file << "}";
+    d_count++;
+}
+
+void annotation_writer::close()
+{
+    if (!d_file.is_open()) {
+        return;
+    }
+    d_file << (d_count ? "\n    ]\n}\n" : "]\n}\n");
+    d_file.close();
+}
+
+} /* namespace sigmf_utils */
+} /* namespace gr */
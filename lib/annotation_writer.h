@@ -0,0 +1,78 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_ANNOTATION_WRITER_H
+#define INCLUDED_SIGMF_UTILS_ANNOTATION_WRITER_H
+
+#include <cstdint>
+#include <fstream>
+#include <string>
+
+namespace gr {
+namespace sigmf_utils {
+
+/*!
+ * \brief A single SigMF annotation as written by the native meta writers.
+ */
+struct annotation {
+    uint64_t sample_start;
+    uint64_t sample_count;
+    double freq_lower_edge;
+    double freq_upper_edge;
+    std::string label_key; // `core:label` or `core:description`
+    std::string label;
+    bool has_snr;
+    double snr_db; // written as `capture_details:SNRdB`
+};
+
+/*!
+ * \brief Streaming writer for `.sigmf-meta` files.
+ *
+ * The `global` and `captures` objects are written when the file is opened and every
+ * annotation is appended to the file as it is written, one annotation per line, so
+ * memory use does not grow with the number of annotations. Closing the writer
+ * terminates the annotations array, resulting in a valid SigMF metadata file.
+ */
+class annotation_writer
+{
+private:
+    std::string d_filename;
+    std::string d_datatype;
+    double d_sample_rate;
+    double d_frequency;
+    std::ofstream d_file;
+    uint64_t d_count;
+
+public:
+    annotation_writer(const std::string& filename,
+                      const std::string& datatype,
+                      double sample_rate,
+                      double frequency);
+    ~annotation_writer();
+
+    //! open the file and write everything preceding the annotations
+    bool open();
+    //! append one annotation
+    void write(const annotation& anno);
+    //! terminate the annotations array and close the file
+    void close();
+
+    bool is_open() const { return d_file.is_open(); }
+    uint64_t count() const { return d_count; }
+    const std::string& filename() const { return d_filename; }
+};
+
+//! replace the extension of `filename` with `.sigmf-meta` if it does not have it
+std::string sigmf_meta_filename(const std::string& filename);
+
+//! shortest representation of `value` that round trips
+std::string format_double(double value);
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_ANNOTATION_WRITER_H */
@@ -0,0 +1,208 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#include "pdu_annotation_sink_impl.h"
+#include <gnuradio/io_signature.h>
+#include <cmath>
+
+namespace gr {
+namespace sigmf_utils {
+
+namespace {
+
+// text used for labels, matching how the Python block formats the values
+std::string label_string(const pmt::pmt_t& value)
+{
+    if (pmt::is_null(value)) {
+        return "None";
+    }
+    if (pmt::is_integer(value) || pmt::is_uint64(value)) {
+        return pmt::write_string(value);
+    }
+    if (pmt::is_real(value)) {
+        const double d = pmt::to_double(value);
+        if (std::isnan(d)) {
+            return "nan";
+        }
+        if (std::isinf(d)) {
+            return d > 0 ? "inf" : "-inf";
+        }
+        std::string s = format_double(d);
+        if (s.find_first_of(".e") == std::string::npos) {
+            s += ".0";
+        }
+        return s;
+    }
+    return pmt::write_string(value);
+}
+
+} // namespace
+
+pdu_annotation_sink::sptr pdu_annotation_sink::make(const std::string& filename,
+                                                    double freq,
+                                                    double rate,
+                                                    const std::string& label,
+                                                    const std::string& dtype)
+{
+    return gnuradio::make_block_sptr<pdu_annotation_sink_impl>(
+        filename, freq, rate, label, dtype);
+}
+
+pdu_annotation_sink_impl::pdu_annotation_sink_impl(const std::string& filename,
+                                                   double freq,
+                                                   double rate,
+                                                   const std::string& label,
+                                                   const std::string& dtype)
+    : gr::block("pdu_annotation_sink",
+                gr::io_signature::make(0, 0, 0),
+                gr::io_signature::make(0, 0, 0)),
+      d_writer(sigmf_meta_filename(filename), dtype, rate, freq),
+      d_freq(freq),
+      d_rate(rate),
+      d_bw_min(rate / 1000.0),
+      d_label(label),
+      d_label_mode(label == "use_burst_id" ? LABEL_BURST_ID
+                   : label == "use_snr_db" ? LABEL_SNR_DB
+                                           : LABEL_FIXED),
+      d_soo(0),
+      d_burst_time_key(pmt::intern("burst_time")),
+      d_sample_rate_key(pmt::intern("sample_rate")),
+      d_center_frequency_key(pmt::intern("center_frequency")),
+      d_bandwidth_key(pmt::intern("bandwidth")),
+      d_snr_db_key(pmt::intern("snr_db")),
+      d_pdu_num_key(pmt::intern("pdu_num")),
+      d_start_offset_key(pmt::intern("start_offset")),
+      d_end_offset_key(pmt::intern("end_offset")),
+      d_burst_id_key(pmt::intern("burst_id"))
+{
+    if (d_writer.filename() != filename) {
+        d_logger->warn("SigMF metadata filename does not end with `sigmf-meta` - using {:s}",
+                       d_writer.filename());
+    }
+
+    message_port_register_in(pmt::mp("in"));
+    set_msg_handler(pmt::mp("in"), [this](const pmt::pmt_t& msg) { this->handler(msg); });
+}
+
+pdu_annotation_sink_impl::~pdu_annotation_sink_impl() {}
+
+bool pdu_annotation_sink_impl::start()
+{
+    if (!d_writer.open()) {
+        d_logger->error("Could not write to {:s}", d_writer.filename());
+        return false;
+    }
+    return block::start();
+}
+
+bool pdu_annotation_sink_impl::stop()
+{
+    if (d_writer.is_open()) {
+        d_writer.close();
+        d_logger->info("wrote file {:s} with {:d} annotations",
+                       d_writer.filename(),
+                       d_writer.count());
+    }
+    return block::stop();
+}
+
+void pdu_annotation_sink_impl::handler(const pmt::pmt_t& pdu)
+{
+    if (!pmt::is_pdu(pdu)) {
+        d_logger->debug("Input is not a PDU!, dropping");
+        return;
+    }
+
+    // there are two basic modes here: tags_to_pdu or fft burst detector
+    // in either case we need to extract the following fields for the annotation:
+    //     - sob:    start sample of the burst
+    //     - eob:    end sample of the burst
+    //     - freq:   center frequency of the burst in hz
+    //     - bw:     bandwidth of the burst in hz
+    //     - b_id:   unique Identifier for the burst or `PMT_NIL`
+    //     - snr:    signal to noise ratio of annotation or `PMT_NIL`
+    //
+    // how these are obtained differs between the two modes.
+    const pmt::pmt_t meta = pmt::car(pdu);
+    uint64_t sob, eob;
+    double freq, bw;
+    pmt::pmt_t b_id, snr;
+
+    try {
+        const pmt::pmt_t time_pmt = pmt::dict_ref(meta, d_burst_time_key, pmt::PMT_NIL);
+        if (pmt::is_tuple(time_pmt)) {
+            // tags_to_pdu mode
+            const double burst_time = pmt::to_double(pmt::tuple_ref(time_pmt, 1)) +
+                                      pmt::to_uint64(pmt::tuple_ref(time_pmt, 0));
+            const double pdu_rate = pmt::to_double(
+                pmt::dict_ref(meta, d_sample_rate_key, pmt::from_double(d_rate)));
+            freq = pmt::to_double(
+                pmt::dict_ref(meta, d_center_frequency_key, pmt::from_double(d_freq)));
+            bw = pmt::to_double(
+                pmt::dict_ref(meta, d_bandwidth_key, pmt::from_double(d_bw_min)));
+            b_id = pmt::dict_ref(meta, d_pdu_num_key, pmt::PMT_NIL);
+
+            const uint64_t anno_len =
+                static_cast<uint64_t>(pmt::length(pmt::cdr(pdu)) * (d_rate / pdu_rate));
+            sob = static_cast<uint64_t>(d_rate * burst_time);
+            eob = sob + anno_len;
+        } else {
+            // fft burst detector mode
+            sob = pmt::to_uint64(pmt::dict_ref(meta, d_start_offset_key, pmt::PMT_NIL));
+            eob = pmt::to_uint64(pmt::dict_ref(meta, d_end_offset_key, pmt::PMT_NIL));
+            freq = pmt::to_double(
+                pmt::dict_ref(meta, d_center_frequency_key, pmt::PMT_NIL));
+            bw = pmt::to_double(
+                pmt::dict_ref(meta, d_bandwidth_key, pmt::from_double(d_bw_min)));
+            b_id = pmt::dict_ref(meta, d_burst_id_key, pmt::PMT_NIL);
+        }
+        snr = pmt::dict_ref(meta, d_snr_db_key, pmt::PMT_NIL);
+    } catch (const std::exception& e) {
+        d_logger->warn("could not parse required data from message {:s}: {:s}",
+                       pmt::write_string(meta),
+                       e.what());
+        return;
+    }
+
+    if (bw < d_bw_min) {
+        bw = d_bw_min;
+    }
+
+    annotation anno;
+    anno.sample_start = sob - d_soo;
+    anno.sample_count = eob - sob;
+    anno.freq_upper_edge = std::trunc(freq + bw / 2);
+    anno.freq_lower_edge = std::trunc(freq - bw / 2);
+    anno.label_key = "core:description";
+    anno.has_snr = false;
+    anno.snr_db = 0;
+
+    if (pmt::is_number(snr) && !pmt::is_complex(snr)) {
+        anno.snr_db = pmt::to_double(snr);
+        anno.has_snr = std::isfinite(anno.snr_db);
+        if (!anno.has_snr) {
+            d_logger->warn("Got illegal SNR value in {:s}", pmt::write_string(meta));
+        }
+    }
+
+    switch (d_label_mode) {
+    case LABEL_BURST_ID:
+        anno.label = pmt::is_null(b_id) ? "" : "burst" + label_string(b_id);
+        break;
+    case LABEL_SNR_DB:
+        // this probably isnt in here so it will end up blank...
+        anno.label = label_string(snr) + "dB";
+        break;
+    default:
+        anno.label = d_label;
+    }
+
+    d_writer.write(anno);
+}
+
+} /* namespace sigmf_utils */
+} /* namespace gr */
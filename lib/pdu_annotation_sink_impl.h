@@ -0,0 +1,59 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_PDU_ANNOTATION_SINK_IMPL_H
+#define INCLUDED_SIGMF_UTILS_PDU_ANNOTATION_SINK_IMPL_H
+
+#include "annotation_writer.h"
+#include <gnuradio/sigmf_utils/pdu_annotation_sink.h>
+
+namespace gr {
+namespace sigmf_utils {
+
+class pdu_annotation_sink_impl : public pdu_annotation_sink
+{
+private:
+    enum label_mode_t { LABEL_FIXED, LABEL_BURST_ID, LABEL_SNR_DB };
+
+    annotation_writer d_writer;
+    const double d_freq;
+    const double d_rate;
+    const double d_bw_min;
+    const std::string d_label;
+    const label_mode_t d_label_mode;
+    const uint64_t d_soo;
+
+    const pmt::pmt_t d_burst_time_key;
+    const pmt::pmt_t d_sample_rate_key;
+    const pmt::pmt_t d_center_frequency_key;
+    const pmt::pmt_t d_bandwidth_key;
+    const pmt::pmt_t d_snr_db_key;
+    const pmt::pmt_t d_pdu_num_key;
+    const pmt::pmt_t d_start_offset_key;
+    const pmt::pmt_t d_end_offset_key;
+    const pmt::pmt_t d_burst_id_key;
+
+    void handler(const pmt::pmt_t& pdu);
+
+public:
+    pdu_annotation_sink_impl(const std::string& filename,
+                             double freq,
+                             double rate,
+                             const std::string& label,
+                             const std::string& dtype);
+    ~pdu_annotation_sink_impl() override;
+
+    bool start() override;
+    bool stop() override;
+
+    uint64_t annotation_count() const override { return d_writer.count(); }
+};
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_PDU_ANNOTATION_SINK_IMPL_H */
@@ -0,0 +1,152 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#include "tag_annotation_sink_impl.h"
+#include <gnuradio/io_signature.h>
+
+namespace gr {
+namespace sigmf_utils {
+
+tag_annotation_sink::sptr tag_annotation_sink::make(const std::string& filename,
+                                                    double freq,
+                                                    double rate,
+                                                    const std::string& label,
+                                                    const std::string& dtype)
+{
+    return gnuradio::make_block_sptr<tag_annotation_sink_impl>(
+        filename, freq, rate, label, dtype);
+}
+
+tag_annotation_sink_impl::tag_annotation_sink_impl(const std::string& filename,
+                                                   double freq,
+                                                   double rate,
+                                                   const std::string& label,
+                                                   const std::string& dtype)
+    : gr::sync_block("tag_annotation_sink",
+                     gr::io_signature::make(1, 1, sizeof(gr_complex)),
+                     gr::io_signature::make(0, 0, 0)),
+      d_writer(sigmf_meta_filename(filename), dtype, rate, freq),
+      d_label(label),
+      d_new_burst_key(pmt::intern("new_burst")),
+      d_gone_burst_key(pmt::intern("gone_burst")),
+      d_burst_id_key(pmt::intern("burst_id")),
+      d_center_frequency_key(pmt::intern("center_frequency")),
+      d_sample_rate_key(pmt::intern("sample_rate")),
+      d_relative_frequency_key(pmt::intern("relative_frequency")),
+      d_bandwidth_key(pmt::intern("bandwidth"))
+{
+    if (d_writer.filename() != filename) {
+        d_logger->warn("SigMF metadata filename does not end with `sigmf-meta` - using {:s}",
+                       d_writer.filename());
+    }
+}
+
+tag_annotation_sink_impl::~tag_annotation_sink_impl() {}
+
+bool tag_annotation_sink_impl::start()
+{
+    d_in_progress.clear();
+    if (!d_writer.open()) {
+        d_logger->error("Could not write to {:s}", d_writer.filename());
+        return false;
+    }
+    return true;
+}
+
+bool tag_annotation_sink_impl::stop()
+{
+    if (d_writer.is_open()) {
+        d_writer.close();
+        d_logger->info("wrote file {:s} with {:d} annotations",
+                       d_writer.filename(),
+                       d_writer.count());
+    }
+    return true;
+}
+
+void tag_annotation_sink_impl::handle_new_burst(const gr::tag_t& tag)
+{
+    const pmt::pmt_t burst_id = pmt::dict_ref(tag.value, d_burst_id_key, pmt::PMT_NIL);
+    if (pmt::is_null(burst_id)) {
+        return;
+    }
+    burst b;
+    b.sample_start = tag.offset;
+    b.center_frequency = pmt::to_double(
+        pmt::dict_ref(tag.value, d_center_frequency_key, pmt::PMT_NIL));
+    b.sample_rate =
+        pmt::to_double(pmt::dict_ref(tag.value, d_sample_rate_key, pmt::PMT_NIL));
+    b.relative_frequency = pmt::to_double(
+        pmt::dict_ref(tag.value, d_relative_frequency_key, pmt::PMT_NIL));
+    b.bandwidth = pmt::to_double(pmt::dict_ref(tag.value, d_bandwidth_key, pmt::PMT_NIL));
+    d_in_progress[pmt::to_uint64(burst_id)] = b;
+}
+
+void tag_annotation_sink_impl::handle_gone_burst(const gr::tag_t& tag)
+{
+    const pmt::pmt_t burst_id = pmt::dict_ref(tag.value, d_burst_id_key, pmt::PMT_NIL);
+    if (pmt::is_null(burst_id)) {
+        return;
+    }
+    const uint64_t id = pmt::to_uint64(burst_id);
+    auto it = d_in_progress.find(id);
+    if (it == d_in_progress.end()) {
+        d_logger->error(
+            "Attempted to retrieve metadata for burst {:d} that has not been enqueued yet!!",
+            id);
+        return;
+    }
+    const burst& b = it->second;
+    const double center = b.center_frequency + b.sample_rate * b.relative_frequency;
+
+    annotation anno;
+    anno.sample_start = b.sample_start;
+    anno.sample_count = tag.offset - b.sample_start;
+    anno.freq_upper_edge = center + b.bandwidth / 2;
+    anno.freq_lower_edge = center - b.bandwidth / 2;
+    anno.label_key = "core:label";
+    anno.label = d_label;
+    anno.has_snr = false;
+    anno.snr_db = 0;
+    d_writer.write(anno);
+    d_in_progress.erase(it);
+}
+
+int tag_annotation_sink_impl::work(int noutput_items,
+                                   gr_vector_const_void_star& input_items,
+                                   gr_vector_void_star& output_items)
+{
+    const uint64_t window_start = nitems_read(0);
+    get_tags_in_range(d_tags, 0, window_start, window_start + noutput_items);
+
+    // good tags have keys of `new_burst` or `gone_burst and values dictionaries respectively:
+    // ((bandwidth . 263671) (sample_rate . 4e+07) (center_frequency . 9.15e+08) (relative_frequency . 0.0878906) (burst_id . 0))
+    // ((burst_id . 0))
+    for (const auto& tag : d_tags) {
+        const bool sob = pmt::eqv(tag.key, d_new_burst_key);
+        if (!sob && !pmt::eqv(tag.key, d_gone_burst_key)) {
+            continue;
+        }
+        try {
+            if (sob) {
+                handle_new_burst(tag);
+            } else {
+                handle_gone_burst(tag);
+            }
+        } catch (const std::exception& e) {
+            d_logger->warn("error processing tag...\n\tKEY: {:s}\n\tVAL: {:s}\n\t{:s}",
+                           pmt::write_string(tag.key),
+                           pmt::write_string(tag.value),
+                           e.what());
+        }
+    }
+
+    return noutput_items;
+}
+
+} /* namespace sigmf_utils */
+} /* namespace gr */
@@ -0,0 +1,67 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_TAG_ANNOTATION_SINK_IMPL_H
+#define INCLUDED_SIGMF_UTILS_TAG_ANNOTATION_SINK_IMPL_H
+
+#include "annotation_writer.h"
+#include <gnuradio/sigmf_utils/tag_annotation_sink.h>
+#include <unordered_map>
+
+namespace gr {
+namespace sigmf_utils {
+
+class tag_annotation_sink_impl : public tag_annotation_sink
+{
+private:
+    struct burst {
+        uint64_t sample_start;
+        double center_frequency;
+        double sample_rate;
+        double relative_frequency;
+        double bandwidth;
+    };
+
+    annotation_writer d_writer;
+    const std::string d_label;
+    std::unordered_map<uint64_t, burst> d_in_progress;
+    std::vector<gr::tag_t> d_tags;
+
+    const pmt::pmt_t d_new_burst_key;
+    const pmt::pmt_t d_gone_burst_key;
+    const pmt::pmt_t d_burst_id_key;
+    const pmt::pmt_t d_center_frequency_key;
+    const pmt::pmt_t d_sample_rate_key;
+    const pmt::pmt_t d_relative_frequency_key;
+    const pmt::pmt_t d_bandwidth_key;
+
+    void handle_new_burst(const gr::tag_t& tag);
+    void handle_gone_burst(const gr::tag_t& tag);
+
+public:
+    tag_annotation_sink_impl(const std::string& filename,
+                             double freq,
+                             double rate,
+                             const std::string& label,
+                             const std::string& dtype);
+    ~tag_annotation_sink_impl() override;
+
+    bool start() override;
+    bool stop() override;
+
+    uint64_t annotation_count() const override { return d_writer.count(); }
+    size_t in_progress_count() const override { return d_in_progress.size(); }
+
+    int work(int noutput_items,
+             gr_vector_const_void_star& input_items,
+             gr_vector_void_star& output_items) override;
+};
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_TAG_ANNOTATION_SINK_IMPL_H */
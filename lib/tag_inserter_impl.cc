@@ -0,0 +1,224 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#include "tag_inserter_impl.h"
+#include <gnuradio/io_signature.h>
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <limits>
+#include <stdexcept>
+
+namespace gr {
+namespace sigmf_utils {
+
+tag_inserter::sptr tag_inserter::make(size_t itemsize,
+                                      const std::vector<gr::tag_t>& tags,
+                                      pmt::pmt_t start_tag_key)
+{
+    return gnuradio::make_block_sptr<tag_inserter_impl>(itemsize, tags, start_tag_key);
+}
+
+tag_inserter_impl::tag_inserter_impl(size_t itemsize,
+                                     const std::vector<gr::tag_t>& tags,
+                                     pmt::pmt_t start_tag_key)
+    : gr::sync_block("tag_inserter",
+                     gr::io_signature::make(1, 1, itemsize),
+                     gr::io_signature::make(1, 1, itemsize)),
+      d_itemsize(itemsize),
+      d_start_tag_key(start_tag_key),
+      d_base(0),
+      d_position(0),
+      d_next(0),
+      d_next_burst(0),
+      d_sample_rate(pmt::PMT_NIL),
+      d_active(pmt::is_null(start_tag_key)),
+      d_new_burst_key(pmt::intern("new_burst")),
+      d_gone_burst_key(pmt::intern("gone_burst")),
+      d_burst_id_key(pmt::intern("burst_id")),
+      d_sample_rate_key(pmt::intern("sample_rate")),
+      d_center_frequency_key(pmt::intern("center_frequency")),
+      d_bandwidth_key(pmt::intern("bandwidth")),
+      d_relative_frequency_key(pmt::intern("relative_frequency")),
+      d_srcid(pmt::intern("SigMF Annotation"))
+{
+    set_tags(tags);
+}
+
+tag_inserter_impl::~tag_inserter_impl() {}
+
+void tag_inserter_impl::set_tags(const std::vector<gr::tag_t>& tags)
+{
+    gr::thread::scoped_lock guard(d_setlock);
+    d_tags = tags;
+    std::stable_sort(d_tags.begin(), d_tags.end(), gr::tag_t::offset_compare);
+
+    // skip anything belonging to items that have already been passed through
+    d_next = 0;
+    while (d_next < d_tags.size() && d_tags[d_next].offset + d_base < d_position) {
+        d_next++;
+    }
+}
+
+void tag_inserter_impl::set_bursts(const std::vector<uint64_t>& start_offsets,
+                                   const std::vector<uint64_t>& end_offsets,
+                                   const std::vector<int64_t>& burst_ids,
+                                   const std::vector<double>& center_frequencies,
+                                   const std::vector<double>& bandwidths,
+                                   const std::vector<double>& relative_frequencies,
+                                   double sample_rate)
+{
+    const size_t count = start_offsets.size();
+    if (end_offsets.size() != count || burst_ids.size() != count ||
+        center_frequencies.size() != count || bandwidths.size() != count ||
+        relative_frequencies.size() != count) {
+        throw std::invalid_argument("tag_inserter: burst columns must have the same length");
+    }
+
+    gr::thread::scoped_lock guard(d_setlock);
+    d_bursts.resize(count);
+    for (size_t idx = 0; idx < count; idx++) {
+        d_bursts[idx] = { start_offsets[idx],      end_offsets[idx], burst_ids[idx],
+                          center_frequencies[idx], bandwidths[idx],  relative_frequencies[idx] };
+    }
+    std::stable_sort(d_bursts.begin(), d_bursts.end(), [](const burst& a, const burst& b) {
+        return a.start_offset < b.start_offset;
+    });
+    d_sample_rate = pmt::from_double(sample_rate);
+
+    // skip the bursts starting at items that have already been passed through
+    d_next_burst = 0;
+    while (d_next_burst < d_bursts.size() &&
+           d_bursts[d_next_burst].start_offset + d_base < d_position) {
+        d_next_burst++;
+    }
+}
+
+void tag_inserter_impl::restart(uint64_t base_offset)
+{
+    // bursts that are still open from the previous pass are closed at the restart
+    for (const auto& burst : d_open_bursts) {
+        const pmt::pmt_t value =
+            pmt::dict_add(pmt::make_dict(), d_burst_id_key, pmt::from_long(burst.first));
+        add_item_tag(0, base_offset, d_gone_burst_key, value, burst.second);
+    }
+    d_open_bursts.clear();
+    d_burst_ends = decltype(d_burst_ends)();
+
+    d_base = base_offset;
+    d_next = 0;
+    d_next_burst = 0;
+    d_active = true;
+}
+
+void tag_inserter_impl::add_tag(const gr::tag_t& tag)
+{
+    add_item_tag(0, tag);
+
+    if (pmt::eqv(tag.key, d_new_burst_key) || pmt::eqv(tag.key, d_gone_burst_key)) {
+        const pmt::pmt_t burst_id = pmt::dict_ref(tag.value, d_burst_id_key, pmt::PMT_NIL);
+        if (pmt::is_integer(burst_id)) {
+            if (pmt::eqv(tag.key, d_new_burst_key)) {
+                d_open_bursts[pmt::to_long(burst_id)] = tag.srcid;
+            } else {
+                d_open_bursts.erase(pmt::to_long(burst_id));
+            }
+        }
+    }
+}
+
+void tag_inserter_impl::start_burst(const burst& b)
+{
+    // the same values (and order) as the tags of add_tags_from_sigmf
+    const pmt::pmt_t burst_id = pmt::from_long(b.burst_id);
+    pmt::pmt_t value = pmt::dict_add(pmt::make_dict(), d_sample_rate_key, d_sample_rate);
+    value = pmt::dict_add(value, d_center_frequency_key, pmt::from_double(b.center_frequency));
+    value = pmt::dict_add(value, d_burst_id_key, burst_id);
+    if (!std::isnan(b.bandwidth)) {
+        value = pmt::dict_add(value, d_bandwidth_key, pmt::from_double(b.bandwidth));
+        value = pmt::dict_add(
+            value, d_relative_frequency_key, pmt::from_double(b.relative_frequency));
+    }
+    add_item_tag(0, b.start_offset + d_base, d_new_burst_key, value, d_srcid);
+
+    d_open_bursts[b.burst_id] = d_srcid;
+    d_burst_ends.emplace(b.end_offset, b.burst_id);
+}
+
+void tag_inserter_impl::end_burst()
+{
+    const burst_end end = d_burst_ends.top();
+    d_burst_ends.pop();
+    const pmt::pmt_t value =
+        pmt::dict_add(pmt::make_dict(), d_burst_id_key, pmt::from_long(end.second));
+    add_item_tag(0, end.first + d_base, d_gone_burst_key, value, d_srcid);
+
+    d_open_bursts.erase(end.second);
+}
+
+void tag_inserter_impl::emit_until(uint64_t end_offset)
+{
+    if (!d_active) {
+        return;
+    }
+    const uint64_t none = std::numeric_limits<uint64_t>::max();
+    while (true) {
+        // merge the tags, burst starts and burst ends in offset order, at the same offset
+        // the tags come first and bursts end before the next one starts
+        const uint64_t tag_offset = d_next < d_tags.size() ? d_tags[d_next].offset : none;
+        const uint64_t start_offset =
+            d_next_burst < d_bursts.size() ? d_bursts[d_next_burst].start_offset : none;
+        const uint64_t end_burst_offset =
+            d_burst_ends.empty() ? none : d_burst_ends.top().first;
+        const uint64_t next = std::min({ tag_offset, start_offset, end_burst_offset });
+        if (next == none || next + d_base >= end_offset) {
+            break;
+        }
+
+        if (tag_offset == next) {
+            gr::tag_t tag = d_tags[d_next++];
+            tag.offset += d_base;
+            add_tag(tag);
+        } else if (end_burst_offset == next) {
+            end_burst();
+        } else {
+            start_burst(d_bursts[d_next_burst++]);
+        }
+    }
+}
+
+int tag_inserter_impl::work(int noutput_items,
+                            gr_vector_const_void_star& input_items,
+                            gr_vector_void_star& output_items)
+{
+    gr::thread::scoped_lock guard(d_setlock);
+
+    const uint64_t window_start = nitems_read(0);
+    const uint64_t window_end = window_start + noutput_items;
+
+    if (!pmt::is_null(d_start_tag_key)) {
+        // anything left over from the previous pass is only emitted up to the start tag
+        get_tags_in_range(d_start_tags, 0, window_start, window_end, d_start_tag_key);
+        std::sort(d_start_tags.begin(), d_start_tags.end(), gr::tag_t::offset_compare);
+        for (const auto& tag : d_start_tags) {
+            emit_until(tag.offset);
+            restart(tag.offset);
+        }
+    }
+
+    // only tags for items in this window are produced
+    emit_until(window_end);
+
+    d_position = window_end;
+
+    std::memcpy(output_items[0], input_items[0], noutput_items * d_itemsize);
+
+    return noutput_items;
+}
+
+} /* namespace sigmf_utils */
+} /* namespace gr */
@@ -0,0 +1,88 @@
+/* -*- c++ -*- */
+/*
+ * Copyright 2022 J. A. Gilbert
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ */
+
+#ifndef INCLUDED_SIGMF_UTILS_TAG_INSERTER_IMPL_H
+#define INCLUDED_SIGMF_UTILS_TAG_INSERTER_IMPL_H
+
+#include <gnuradio/sigmf_utils/tag_inserter.h>
+#include <functional>
+#include <map>
+#include <queue>
+
+namespace gr {
+namespace sigmf_utils {
+
+class tag_inserter_impl : public tag_inserter
+{
+private:
+    struct burst {
+        uint64_t start_offset;
+        uint64_t end_offset;
+        int64_t burst_id;
+        double center_frequency;
+        double bandwidth;
+        double relative_frequency;
+    };
+    // end offset and burst id of the bursts tagged in this pass that have not ended
+    typedef std::pair<uint64_t, int64_t> burst_end;
+
+    const size_t d_itemsize;
+    const pmt::pmt_t d_start_tag_key;
+    std::vector<gr::tag_t> d_tags;       // sorted by relative offset
+    std::vector<gr::tag_t> d_start_tags; // scratch for start tag lookups
+    uint64_t d_base;                     // offset of the current pass
+    uint64_t d_position;                 // first item not yet passed through
+    size_t d_next;                       // index of the next tag to emit
+    std::vector<burst> d_bursts;         // sorted by relative start offset
+    size_t d_next_burst;                 // index of the next burst to start
+    std::priority_queue<burst_end, std::vector<burst_end>, std::greater<burst_end>> d_burst_ends;
+    pmt::pmt_t d_sample_rate;
+    bool d_active;                       // false until the first start tag
+    std::map<int64_t, pmt::pmt_t> d_open_bursts; // burst id to srcid of open bursts
+
+    const pmt::pmt_t d_new_burst_key;
+    const pmt::pmt_t d_gone_burst_key;
+    const pmt::pmt_t d_burst_id_key;
+    const pmt::pmt_t d_sample_rate_key;
+    const pmt::pmt_t d_center_frequency_key;
+    const pmt::pmt_t d_bandwidth_key;
+    const pmt::pmt_t d_relative_frequency_key;
+    const pmt::pmt_t d_srcid;
+
+    void add_tag(const gr::tag_t& tag);
+    void start_burst(const burst& b);
+    void end_burst();
+    void emit_until(uint64_t end_offset);
+    void restart(uint64_t base_offset);
+
+public:
+    tag_inserter_impl(size_t itemsize,
+                      const std::vector<gr::tag_t>& tags,
+                      pmt::pmt_t start_tag_key);
+    ~tag_inserter_impl() override;
+
+    void set_tags(const std::vector<gr::tag_t>& tags) override;
+    size_t num_tags() const override { return d_tags.size(); }
+
+    void set_bursts(const std::vector<uint64_t>& start_offsets,
+                    const std::vector<uint64_t>& end_offsets,
+                    const std::vector<int64_t>& burst_ids,
+                    const std::vector<double>& center_frequencies,
+                    const std::vector<double>& bandwidths,
+                    const std::vector<double>& relative_frequencies,
+                    double sample_rate) override;
+    size_t num_bursts() const override { return d_bursts.size(); }
+
+    int work(int noutput_items,
+             gr_vector_const_void_star& input_items,
+             gr_vector_void_star& output_items) override;
+};
+
+} // namespace sigmf_utils
+} // namespace gr
+
+#endif /* INCLUDED_SIGMF_UTILS_TAG_INSERTER_IMPL_H */
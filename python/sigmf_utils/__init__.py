@@ -23,6 +23,15 @@ except ModuleNotFoundError:
 from .pdu_meta_writer import pdu_meta_writer
 from .tag_meta_writer import tag_meta_writer
 from .sigmf_file_source import sigmf_file_source
-from .add_tags_from_sigmf import add_tags_from_sigmf
+from .sigmf_data_source import sigmf_data_source
+from .sigmf_collection_source import sigmf_collection_source
+from .segments_to_pdu import segments_to_pdu
+from .add_tags_from_sigmf import add_tags_from_sigmf, add_tags_from_sigmf_native
 from .sigmf_tools import *
+from .annotation_writer import AnnotationWriter, ThreadedAnnotationWriter, recover_metadata
+from .convert import SampleConverter
+from .archive import SigMFArchive
+from .metadata import read_metadata
+from .sidecar import AnnotationTable, build_sidecar, open_sidecar
+from . import codec
 #
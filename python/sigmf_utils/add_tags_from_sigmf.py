@@ -8,11 +8,423 @@
 
 
 import numpy
-import json
 import pmt
-from os.path import isfile
+import heapq
+from array import array
 from gnuradio import gr
 from gnuradio import sigmf_utils
+from .metadata import load_metadata, ANNOTATION_BLOCK_SIZE
+
+
+# number of annotations converted to tags per vectorized step
+ANNOTATION_CHUNK_SIZE = 4096
+
+PMT_NEW_BURST = pmt.intern('new_burst')
+PMT_GONE_BURST = pmt.intern('gone_burst')
+PMT_BURST_ID = pmt.intern('burst_id')
+PMT_SAMPLE_RATE = pmt.intern('sample_rate')
+PMT_CENTER_FREQUENCY = pmt.intern('center_frequency')
+PMT_BANDWIDTH = pmt.intern('bandwidth')
+PMT_RELATIVE_FREQUENCY = pmt.intern('relative_frequency')
+
+
+def compile_annotations(annotations, capture_index, sample_rate, item_scale=1, first_id=0):
+    """
+    Vectorized compilation of a SigMF annotations list into the values carried by the
+    `new_burst` / `gone_burst` tags. All arithmetic is done on NumPy columns, no PMT
+    objects are created here. Returns a dictionary of arrays (one entry per annotation):
+
+        `burst_id`              annotation number
+        `start_offset`          item offset of the `new_burst` tag
+        `end_offset`            item offset of the `gone_burst` tag
+        `center_frequency`      capture `core:frequency` at the start of the annotation
+        `has_bandwidth`         True if both frequency edges are present
+        `bandwidth`             annotation bandwidth in Hz
+        `relative_frequency`    annotation center relative to the sample rate
+
+    The `item_scale` is applied to the sample offsets (2 for interleaved short data), and
+    burst ids are numbered from `first_id`.
+    """
+    columns = sigmf_utils.annotation_columns(annotations)
+    start = columns['sample_start']
+    count = columns['sample_count']
+    # a missing `core:sample_count` has always ended the burst at twice the start offset
+    count = numpy.where(count < 0, start, count)
+
+    frequency = numpy.asarray(capture_index.lookup_bulk(start, 'core:frequency', numpy.nan), dtype=numpy.float64)
+    missing = numpy.flatnonzero(numpy.isnan(frequency))
+    if len(missing):
+        raise ValueError(f'SigMF Annotation {first_id + missing[0]} has no capture `core:frequency` defined')
+
+    f_lower = columns['freq_lower_edge']
+    f_upper = columns['freq_upper_edge']
+    has_bandwidth = (f_lower != 0) & (f_upper != 0) & ~numpy.isnan(f_lower) & ~numpy.isnan(f_upper)
+    bandwidth = f_upper - f_lower
+    relative_frequency = (f_lower + bandwidth / 2.0 - frequency) / sample_rate
+
+    return {
+        'burst_id': numpy.arange(first_id, first_id + len(start), dtype=numpy.int64),
+        'start_offset': (start * item_scale).astype(numpy.int64),
+        'end_offset': ((start + count) * item_scale).astype(numpy.int64),
+        'center_frequency': frequency,
+        'has_bandwidth': has_bandwidth,
+        'bandwidth': bandwidth,
+        'relative_frequency': relative_frequency,
+    }
+
+
+class TagTemplate(object):
+    """
+    Replayable cache of the tags for a single pass over the metadata. The tags are pulled
+    from an offset ordered generator (with a base offset of zero) the first time they are
+    needed and stored as a relative offset array plus the key, value and srcid PMTs, so
+    every later pass only costs an offset add per tag. Tags that were never reached (for
+    example past the end of a truncated file) are never created.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.offsets = array('Q')
+        self.tags = []
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def replay(self, item_offset=0):
+        """
+        Generate `(offset, key, value, srcid)` tuples with offsets shifted by `item_offset`.
+        """
+        idx = 0
+        while True:
+            if idx == len(self.offsets):
+                tag = next(self.stream, None)
+                if tag is None:
+                    return
+                self.offsets.append(tag[0])
+                self.tags.append(tag[1:])
+            yield (self.offsets[idx] + item_offset,) + self.tags[idx]
+            idx += 1
+
+
+def add_tags_from_sigmf_native(dtype, metadata, add_annotation_tags=True, start_tag_key=pmt.PMT_NIL,
+                               sample_start=0, sample_end=0, annotation_index=False):
+    """
+    Construct the native equivalent of `add_tags_from_sigmf`, taking the same parameters
+    (except `position_tag_key`, runtime seeks are not supported). The global and capture
+    tags for one pass over the metadata are handed to the C++ `tag_inserter` block as
+    tags and the annotations as compiled columns (see `TagGenerator.burst_columns()`),
+    the block passes the stream through and adds the tags just in time (repeating them
+    on every start tag) without any Python in the work function. Unlike the Python block
+    the compiled annotations (48 bytes each) are held in memory for the life of the block.
+    """
+    sigmf_metadata = load_metadata(metadata, annotation_index)
+    generator = TagGenerator(sigmf_metadata, 2 if dtype == numpy.int16 else 1, False)
+    tags = [gr.tag_utils.python_to_tag(tag) for tag in generator.tag_stream(0, sample_start, sample_end)]
+    block = sigmf_utils.tag_inserter(numpy.dtype(dtype).itemsize, tags, start_tag_key)
+    if add_annotation_tags:
+        columns = generator.burst_columns(sample_start, sample_end)
+        block.set_bursts(*[column.tolist() for column in columns], generator.sample_rate)
+    return block
+
+
+class TagGenerator(object):
+    """
+    Produces the stream tags described in `add_tags_from_sigmf` from a SigMF metadata
+    dictionary as lazy, offset ordered generators. Sample offsets are multiplied by
+    `item_scale` (2 for interleaved short data). Annotations streamed from the metadata
+    file (see `read_metadata`) are compiled a block at a time as their tags are needed.
+    """
+    def __init__(self, sigmf_metadata, item_scale=1, add_annotation_tags=True):
+        self.sigmf_metadata = sigmf_metadata
+        self.item_scale = item_scale
+        self.add_annotation_tags = add_annotation_tags
+        self.offset = sigmf_metadata['global'].get('core:offset')
+        self.sample_rate = float(sigmf_metadata['global'].get('core:sample_rate'))
+        self.geolocation = sigmf_metadata['global'].get('core:geolocation')
+        self.capture_index = sigmf_utils.CaptureIndex(sigmf_metadata['captures'])
+        self.annotations = None
+        self.index = None
+        self.streamed = None
+        if add_annotation_tags and hasattr(sigmf_metadata['annotations'], 'blocks'):
+            self.streamed = sigmf_metadata['annotations']
+            # running maximum of the annotation ends up to each block compiled so far
+            self.block_reach = []
+            self.unsorted = False
+        elif add_annotation_tags:
+            self.annotations = compile_annotations(sigmf_metadata['annotations'], self.capture_index,
+                                                   self.sample_rate, item_scale)
+
+    def global_tags(self, item_offset=0, start=0, end=None):
+        """
+        Generate the global scope tags, these are emitted at the start of every capture
+        segment and at the start of the range (`start` and `end` are item offsets in the
+        dataset, the first tag of the range is placed at `item_offset`).
+        """
+        tags = []
+        if self.offset is not None:
+            tags.append((pmt.intern("offset"), pmt.from_uint64(self.offset)))
+        if self.sample_rate is not None:
+            tags.append((pmt.intern("sample_rate"), pmt.from_double(self.sample_rate)))
+        if self.geolocation is not None:
+            tags.append((pmt.intern("geolocation"), pmt.to_pmt(self.geolocation)))
+        srcid = pmt.intern('SigMF Global')
+
+        # the captures starting inside the range, found with binary searches (on scalars
+        # of the column type, a Python int would convert the whole array)
+        sample_starts = self.capture_index.sample_starts
+        lo = numpy.searchsorted(sample_starts, numpy.uint64(start // self.item_scale), side='right')
+        hi = len(sample_starts)
+        if end is not None:
+            hi = numpy.searchsorted(sample_starts, numpy.uint64(-(-end // self.item_scale)), side='left')
+        starts = [start] + [capture_start * self.item_scale for capture_start in sample_starts[lo:hi].tolist()]
+        for offset in starts:
+            for key, value in tags:
+                yield (offset - start + item_offset, key, value, srcid)
+
+    def capture_tags(self, item_offset=0, start=0, end=None):
+        """
+        Generate the capture scope tags in capture order. The capture in effect at the
+        start of the range is tagged there, with its `datetime` advanced to that item.
+        """
+        frequencies = self.capture_index.column('core:frequency')
+        first = max(self.capture_index.index(start // self.item_scale), 0)
+        for idx in range(first, len(self.capture_index)):
+            capture = self.capture_index.captures[idx]
+            capture_start = capture.get('core:sample_start', 0) * self.item_scale
+            if end is not None and capture_start >= end:
+                break
+            offset = max(capture_start, start) - start + item_offset
+            srcid = pmt.intern(f'SigMF Capture {idx}')
+            if frequencies[idx] is not None:
+                yield (offset, pmt.intern("frequency"), pmt.from_double(frequencies[idx]), srcid)
+            datetime = capture.get('core:datetime')
+            if datetime is not None:
+                if capture_start < start:
+                    datetime = sigmf_utils.offset_datetime(datetime, (start - capture_start) / self.item_scale,
+                                                           self.sample_rate)
+                yield (offset, pmt.intern("datetime"), pmt.intern(datetime), srcid)
+
+    def annotation_tags(self, item_offset=0, start=0, end=None):
+        """
+        Generate the `new_burst` / `gone_burst` tags from the compiled annotation columns
+        in offset order. Only annotations overlapping the range are tagged, and they are
+        clipped to it. Annotations are walked in order of their start and a heap holds
+        the end of every open burst, so `gone_burst` tags are interleaved correctly even
+        when annotations overlap. The annotations overlapping the range are located with
+        an `AnnotationIndex`, so restarting the tags for a short range of a large recording
+        is cheap. The per-annotation PMT objects are only created here, a chunk of annotations
+        at a time.
+        """
+        if self.streamed is not None:
+            yield from self.streamed_annotation_tags(item_offset, start, end)
+            return
+        anno = self.annotations
+        if self.index is None:
+            self.index = sigmf_utils.AnnotationIndex(anno['start_offset'], anno['end_offset'])
+        selected, starts, ends = self.clip_annotations(self.index, start, end)
+        open_bursts = []
+        yield from self.burst_tags(anno, selected, starts, ends, item_offset - start, open_bursts)
+        while open_bursts:
+            yield heapq.heappop(open_bursts)[2:]
+
+    @staticmethod
+    def clip_annotations(index, start=0, end=None):
+        """
+        Return the annotations of an `AnnotationIndex` overlapping the range of items from
+        `start` to `end` in order of their start: their positions in the compiled columns,
+        and their starts and ends clipped to the range.
+        """
+        selected, starts, ends = index.order, index.starts, index.ends
+        if start > 0 or end is not None:
+            positions = index.positions(start, end)
+            selected, starts, ends = selected[positions], starts[positions], ends[positions]
+            starts = numpy.maximum(starts, start)
+            if end is not None:
+                ends = numpy.minimum(ends, end)
+        # clipping to the range start keeps the annotations in order of their start
+        return selected, starts, ends
+
+    def burst_columns(self, sample_start=0, sample_end=0):
+        """
+        Return the annotations of one pass over the metadata (see `tag_stream()`) as the
+        columns of `tag_inserter.set_bursts()`: the `new_burst` and `gone_burst` offsets
+        relative to the start of the pass in order of the start, and the burst ids, center
+        frequencies, bandwidths (NaN if not known) and relative frequencies. Annotations
+        streamed from the metadata file are read once, a block at a time.
+        """
+        start = sample_start * self.item_scale
+        end = sample_end * self.item_scale if sample_end else None
+        anno = self.annotations
+        if anno is None:
+            anno = compile_annotations(self.sigmf_metadata['annotations'], self.capture_index, self.sample_rate,
+                                       self.item_scale)
+            index = sigmf_utils.AnnotationIndex(anno['start_offset'], anno['end_offset'])
+        else:
+            if self.index is None:
+                self.index = sigmf_utils.AnnotationIndex(anno['start_offset'], anno['end_offset'])
+            index = self.index
+        selected, starts, ends = self.clip_annotations(index, start, end)
+        bandwidth = numpy.where(anno['has_bandwidth'], anno['bandwidth'], numpy.nan)
+        return ((starts - start).astype(numpy.uint64), (ends - start).astype(numpy.uint64), anno['burst_id'][selected],
+                anno['center_frequency'][selected], bandwidth[selected], anno['relative_frequency'][selected])
+
+    def streamed_annotation_tags(self, item_offset=0, start=0, end=None):
+        """
+        `annotation_tags()` for annotations streamed from the metadata file. Blocks of
+        annotations are read and compiled as the tags are consumed, so the first tags are
+        available right away and only one block is held at a time. The reach of every
+        block compiled before is kept, so a restart skips the blocks ending before it.
+        SigMF requires annotations to be sorted by `core:sample_start`, an annotation
+        starting before one of an earlier block is tagged late (or not at all if it has
+        already ended).
+        """
+        first = numpy.searchsorted(self.block_reach, start, side='right')
+        open_bursts = []
+        # tags are never placed before the last `new_burst` tag
+        floor = start
+        previous = None
+        for index, block in self.streamed.blocks(first):
+            anno = compile_annotations(block, self.capture_index, self.sample_rate, self.item_scale, index)
+            if index // ANNOTATION_BLOCK_SIZE == len(self.block_reach):
+                reach = self.block_reach[-1] if self.block_reach else 0
+                self.block_reach.append(max(reach, int(anno['end_offset'].max())))
+            selected = numpy.argsort(anno['start_offset'], kind='stable')
+            starts = anno['start_offset'][selected]
+            ends = anno['end_offset'][selected]
+            if end is not None and starts[0] >= end:
+                break
+            if previous is not None and starts[0] < previous and not self.unsorted:
+                gr.log.warn(f'SigMF annotations are not sorted by `core:sample_start` (from annotation {index})')
+                self.unsorted = True
+            previous = int(starts[-1])
+            keep = (ends > floor) | (starts >= floor)
+            if end is not None:
+                keep &= starts < end
+            selected, starts, ends = selected[keep], numpy.maximum(starts[keep], floor), ends[keep]
+            if end is not None:
+                ends = numpy.minimum(ends, end)
+            if len(starts):
+                floor = int(starts[-1])
+            yield from self.burst_tags(anno, selected, starts, ends, item_offset - start, open_bursts)
+        while open_bursts:
+            yield heapq.heappop(open_bursts)[2:]
+
+    def burst_tags(self, anno, selected, starts, ends, item_offset, open_bursts):
+        """
+        Generate the `new_burst` tags of the `selected` compiled annotations, which start
+        and end at the (clipped, ordered) `starts` and `ends`, and the `gone_burst` tags of
+        the bursts in the `open_bursts` heap ending before them. The bursts still open are
+        left in the heap. The per-annotation PMT objects are only created here, a chunk of
+        annotations at a time.
+        """
+        # tags have keys of `new_burst` or `gone_burst and values dictionaries respectively:
+        # ((bandwidth . 263671) (noise_density . -153.272) (sample_rate . 4e+07) (magnitude . 62.6101) (center_frequency . 9.15e+08) (relative_frequency . 0.0878906) (burst_id . 0))
+        # ((burst_id . 0))
+        rate = pmt.from_double(self.sample_rate)
+        srcid = pmt.intern('SigMF Annotation')
+        for chunk in range(0, len(starts), ANNOTATION_CHUNK_SIZE):
+            idx = slice(chunk, chunk + ANNOTATION_CHUNK_SIZE)
+            anno_idx = selected[idx]
+            columns = zip(anno['burst_id'][anno_idx].tolist(), starts[idx].tolist(), ends[idx].tolist(),
+                          anno['center_frequency'][anno_idx].tolist(), anno['has_bandwidth'][anno_idx].tolist(),
+                          anno['bandwidth'][anno_idx].tolist(), anno['relative_frequency'][anno_idx].tolist())
+            for burst_id, sob, eob, frequency, has_bandwidth, bandwidth, relative_frequency in columns:
+                sob += item_offset
+                eob += item_offset
+                while open_bursts and open_bursts[0][0] <= sob:
+                    yield heapq.heappop(open_bursts)[2:]
+                burst = pmt.from_long(burst_id)
+                sob_dict = pmt.dict_add(pmt.make_dict(), PMT_SAMPLE_RATE, rate)
+                sob_dict = pmt.dict_add(sob_dict, PMT_CENTER_FREQUENCY, pmt.from_double(frequency))
+                sob_dict = pmt.dict_add(sob_dict, PMT_BURST_ID, burst)
+                if has_bandwidth:
+                    sob_dict = pmt.dict_add(sob_dict, PMT_BANDWIDTH, pmt.from_double(bandwidth))
+                    sob_dict = pmt.dict_add(sob_dict, PMT_RELATIVE_FREQUENCY, pmt.from_double(relative_frequency))
+                eob_dict = pmt.dict_add(pmt.make_dict(), PMT_BURST_ID, burst)
+                yield (sob, PMT_NEW_BURST, sob_dict, srcid)
+                # the burst id breaks ties so the PMT objects are never compared
+                heapq.heappush(open_bursts, (eob, burst_id, eob, PMT_GONE_BURST, eob_dict, srcid))
+
+    def tag_stream(self, item_offset=0, sample_start=0, sample_end=0):
+        """
+        Lazily generate `(offset, key, value, srcid)` tuples for one pass over the metadata
+        in offset order by merging the capture, global and annotation tag generators. The
+        pass covers the samples from `sample_start` up to `sample_end` (0 for no limit)
+        and the tag for `sample_start` is placed at `item_offset`.
+        """
+        start = sample_start * self.item_scale
+        end = sample_end * self.item_scale if sample_end else None
+        streams = [self.capture_tags(item_offset, start, end), self.global_tags(item_offset, start, end)]
+        if self.add_annotation_tags:
+            streams.append(self.annotation_tags(item_offset, start, end))
+        return heapq.merge(*streams, key=lambda t: t[0])
+
+
+class TagScheduler(object):
+    """
+    Adds the tags of a `TagGenerator` to the output of `block` just in time: `emit()`
+    only creates and adds the tags before the given offset, and `restart()` begins a
+    new pass over the metadata at any item offset and recording sample. With `repeat`
+    the tags of a pass starting at `sample_start` are cached in a `TagTemplate` so
+    later passes are an offset shift. When `restartable`, bursts that are still open
+    at a restart are closed with a `gone_burst` tag there. Every tag is added to each
+    of the first `nports` outputs (the channels of a multi-channel recording).
+    """
+    def __init__(self, block, generator, sample_start=0, sample_end=0, restartable=False, repeat=False,
+                 nports=1):
+        self.block = block
+        self.ports = range(nports)
+        self.generator = generator
+        self.sample_start = sample_start
+        self.sample_end = sample_end
+        self.restartable = restartable
+        self.template = None
+        if repeat:
+            self.template = TagTemplate(generator.tag_stream(0, sample_start, sample_end))
+        self.tag_iter = iter(())
+        self.next_tag = None
+        # bursts tagged in the current pass that have not ended yet
+        self.open_bursts = {}
+
+    def restart(self, item_offset, sample=None, sample_end=None):
+        """
+        Start a new pass over the metadata with tags offset by `item_offset`, beginning at
+        recording sample `sample` (the start of the range by default) and ending at
+        `sample_end` (the end of the range by default). Only the annotations overlapping
+        the pass are looked at, so restarting for a short range is cheap.
+        """
+        for burst_id, srcid in self.open_bursts.items():
+            value = pmt.dict_add(pmt.make_dict(), PMT_BURST_ID, pmt.from_long(burst_id))
+            for port in self.ports:
+                self.block.add_item_tag(port, item_offset, PMT_GONE_BURST, value, srcid)
+        self.open_bursts = {}
+
+        if sample is None:
+            sample = self.sample_start
+        if sample_end is None:
+            sample_end = self.sample_end
+        if self.template is not None and sample == self.sample_start and sample_end == self.sample_end:
+            self.tag_iter = self.template.replay(item_offset)
+        else:
+            self.tag_iter = self.generator.tag_stream(item_offset, sample, sample_end)
+        self.next_tag = next(self.tag_iter, None)
+
+    def emit(self, end_offset):
+        """
+        Add every pending tag with an offset before `end_offset` to the output stream.
+        Tags come from an offset ordered generator, so this stops at the first tag that
+        is beyond the window and nothing past it has been created yet.
+        """
+        while self.next_tag is not None and self.next_tag[0] < end_offset:
+            for port in self.ports:
+                self.block.add_item_tag(port, *self.next_tag)
+            if self.restartable:
+                offset, key, value, srcid = self.next_tag
+                if pmt.eqv(key, PMT_NEW_BURST):
+                    self.open_bursts[pmt.to_long(pmt.dict_ref(value, PMT_BURST_ID, pmt.PMT_NIL))] = srcid
+                elif pmt.eqv(key, PMT_GONE_BURST):
+                    self.open_bursts.pop(pmt.to_long(pmt.dict_ref(value, PMT_BURST_ID, pmt.PMT_NIL)), None)
+            self.next_tag = next(self.tag_iter, None)
+
 
 class add_tags_from_sigmf(gr.sync_block):
     """
@@ -38,9 +450,21 @@ class add_tags_from_sigmf(gr.sync_block):
         `gone_burst` - Value is a dictionary similar to the gr-fhss_utils tags:
             - `burst_id` - annotation number (as indexed by annotations list in file)
 
-    Tags are all generated on the first work function call, but their offset values are
-    representative of what is in the SigMF metadata. For complex interleaved types tags
-    are placed on the first (real component) item.
+    Tags are produced lazily and just in time by an offset ordered generator: each work
+    call only creates and adds the tags whose offset falls within the items it is passing
+    through, so the downstream tag buffers never hold future tags and annotations that
+    extend past the data actually produced are not tagged. When a start tag key is given
+    the tags of the first pass are cached with relative offsets, so every repeat replays
+    the same PMT objects shifted to the new base offset. Offset values are representative
+    of what is in the SigMF metadata. For complex interleaved types tags are placed on the
+    first (real component) item.
+
+    The stream can be restricted to a range of the recording: the first item (and every
+    item carrying the start tag) is taken to be `sample_start`, and only annotations that
+    overlap `sample_start` up to `sample_end` are tagged, clipped to that range. A
+    position tag (as produced by `sigmf_data_source` after a seek) restarts the tags at
+    the sample number in its value. Bursts that are still open when the tags restart are
+    closed with a `gone_burst` tag at the restart.
 
     Block paramters:
 
@@ -51,11 +475,15 @@ class add_tags_from_sigmf(gr.sync_block):
                                 tags for annotations are generated or not
         start_tag_key:          PMT object representing the key for a tag signifying the
                                 start of file, this will be used to repeat the tags
-
-    TODO:   produce tags just in time instead of all at once as soon as they are known so
-            annotations that overextend actual generated data are not tagged
+        sample_start:           sample number in the recording of the first item
+        sample_end:             end of the range of samples to tag (0 for no limit)
+        position_tag_key:       PMT object representing the key for a tag whose value is the
+                                sample number in the recording of the item it is on
+        annotation_index:       read the annotations of a sigmf-meta file from its `.sigmf-idx`
+                                sidecar (built or rebuilt when missing or out of date)
     """
-    def __init__(self, dtype, metadata, add_annotation_tags=True, start_tag_key=pmt.PMT_NIL):
+    def __init__(self, dtype, metadata, add_annotation_tags=True, start_tag_key=pmt.PMT_NIL,
+                 sample_start=0, sample_end=0, position_tag_key=pmt.PMT_NIL, annotation_index=False):
         gr.sync_block.__init__(self,
             name="add_tags_from_sigmf",
             in_sig=[dtype],
@@ -64,91 +492,44 @@ class add_tags_from_sigmf(gr.sync_block):
         self.interleaved = True if dtype == numpy.int16 else False
         self.add_annotation_tags = add_annotation_tags
         self.start_tag_key = start_tag_key
+        self.position_tag_key = position_tag_key
+        self.sample_start = sample_start
+        self.sample_end = sample_end
 
-        if isinstance(metadata, dict):
-            self.sigmf_metadata = metadata
-        elif isinstance(metadata, str) and metadata.endswith('.sigmf-meta'):
-            with open(metadata, 'r') as f:
-                gr.log.info(f'Loading SigMF metadata from {metadata}')
-                self.sigmf_metadata = json.load(f)
-        else:
-            raise ValueError(f'Invalid SigMF metadata specification {metadata}')
-        sigmf_utils.check_metadata(self.sigmf_metadata)
-        self.build_tag_list()
-
-    def build_tag_list(self, item_offset=0):
-        self.global_tags = []   # global tags will emitted at the start of every capture segment
-        self.offset = self.sigmf_metadata['global'].get('core:offset')
-        if self.offset is not None:
-            self.global_tags.append(gr.tag_utils.python_to_tag((item_offset, pmt.intern("offset"), pmt.from_uint64(self.offset), pmt.intern('SigMF Global'))))
-        self.sample_rate = float(self.sigmf_metadata['global'].get('core:sample_rate'))
-        if self.sample_rate is not None:
-            self.global_tags.append(gr.tag_utils.python_to_tag((item_offset, pmt.intern("sample_rate"), pmt.from_double(self.sample_rate), pmt.intern('SigMF Global'))))
-        self.geolocation = self.sigmf_metadata['global'].get('core:geolocation')
-        if self.geolocation is not None:
-            self.global_tags.append(gr.tag_utils.python_to_tag((item_offset, pmt.intern("geolocation"), pmt.to_pmt(self.geolocation), pmt.intern('SigMF Global'))))
-
-        self.item_tags = []
-        self.captures = self.sigmf_metadata['captures']
-        for idx, capture in enumerate(self.captures):
-            offset = capture.get('core:sample_start', 0)
-            # if the first capture does not start with sample zero, add global tags
-            if idx == 0 and offset != 0:
-                for tag in self.global_tags:
-                    self.item_tags.append(tag)
-            # add tags if they exist
-            frequency = sigmf_utils.get_capture_metadata(self.captures, offset, 'core:frequency')
-            if frequency is not None:
-                self.item_tags.append(gr.tag_utils.python_to_tag((offset + item_offset, pmt.intern("frequency"), pmt.from_double(frequency), pmt.intern(f'SigMF Capture {idx}'))))
-            datetime = capture.get('core:datetime')
-            if datetime is not None:
-                self.item_tags.append(gr.tag_utils.python_to_tag((offset + item_offset, pmt.intern("datetime"), pmt.intern(datetime), pmt.intern(f'SigMF Capture {idx}'))))
-            for tag in self.global_tags:
-                self.item_tags.append(gr.tag_utils.python_to_tag((offset + item_offset, tag.key, tag.value, tag.srcid)))
+        self.sigmf_metadata = load_metadata(metadata, annotation_index)
+        self.generator = TagGenerator(self.sigmf_metadata, 2 if self.interleaved else 1, add_annotation_tags)
 
-        if self.add_annotation_tags:
-            # tags have keys of `new_burst` or `gone_burst and values dictionaries respectively:
-            # ((bandwidth . 263671) (noise_density . -153.272) (sample_rate . 4e+07) (magnitude . 62.6101) (center_frequency . 9.15e+08) (relative_frequency . 0.0878906) (burst_id . 0))
-            # ((burst_id . 0))
-            sob = pmt.intern('new_burst')
-            eob = pmt.intern('gone_burst')
-            for idx, anno in enumerate(self.sigmf_metadata['annotations']):
-                offset = anno.get('core:sample_start', 0)
-
-                frequency = float(sigmf_utils.get_capture_metadata(self.captures, offset, 'core:frequency'))
-                end = offset + anno.get('core:sample_count', offset)
-                offset = offset * 2 if self.interleaved else offset
-                end = end * 2 if self.interleaved else end
-
-                tag_dict = {'sample_rate': self.sample_rate, 'center_frequency': frequency, 'burst_id': idx}
-
-                f_lower = anno.get('core:freq_lower_edge')
-                f_upper = anno.get('core:freq_upper_edge')
-                if f_lower and f_upper:
-                    tag_dict['bandwidth'] = float(f_upper - f_lower)
-                    freq = f_lower + float(tag_dict['bandwidth']) / 2.0
-                    tag_dict['relative_frequency'] = (freq - frequency) * 1.0 / self.sample_rate
-
-                self.item_tags.append(gr.tag_utils.python_to_tag((offset + item_offset, sob, pmt.to_pmt(tag_dict), pmt.intern(f'SigMF Annotation'))))
-                self.item_tags.append(gr.tag_utils.python_to_tag((end + item_offset, eob, pmt.to_pmt({'burst_id': idx}), pmt.intern(f'SigMF Annotation'))))
+        # bursts are only tracked when the tags can be restarted
+        restartable = not (pmt.eqv(pmt.PMT_NIL, start_tag_key) and pmt.eqv(pmt.PMT_NIL, position_tag_key))
+        # with a start tag the tags will be repeated, keep them so each repeat is just an
+        # offset shift, nothing is tagged until the start tag is observed
+        self.scheduler = TagScheduler(self, self.generator, sample_start, sample_end, restartable,
+                                      not pmt.eqv(pmt.PMT_NIL, start_tag_key))
+        if pmt.eqv(pmt.PMT_NIL, self.start_tag_key):
+            self.scheduler.restart(0)
 
     def work(self, input_items, output_items):
         in0 = input_items[0]
         out = output_items[0]
+        window_start = self.nitems_read(0)
+        window_end = window_start + len(in0)
 
-        if pmt.eqv(pmt.PMT_NIL, self.start_tag_key):
-            # add all the tags on the first work function call only once
-            if self.nitems_written(0) == 0:
-                for tag in self.item_tags:
-                    self.add_item_tag(0, tag)
-        else:
-            # look for the start of file tag key and add tags when it is observed
-            tags = self.get_tags_in_range(0, self.nitems_read(0), self.nitems_read(0) + len(in0))
-            for tag in tags:
-                if pmt.eqv(tag.key, self.start_tag_key):
-                    self.build_tag_list(tag.offset)
-                    for tag in self.item_tags:
-                        self.add_item_tag(0, tag)
+        if self.scheduler.restartable:
+            # look for the start of file and position tags and restart the tags when one
+            # is observed, anything left over from the previous pass is only emitted up to
+            # that point. A position tag takes precedence over a start tag on the same item
+            restarts = {}
+            for tag in self.get_tags_in_range(0, window_start, window_end):
+                if pmt.eqv(tag.key, self.position_tag_key):
+                    restarts[tag.offset] = pmt.to_uint64(tag.value)
+                elif pmt.eqv(tag.key, self.start_tag_key):
+                    restarts.setdefault(tag.offset, None)
+            for offset in sorted(restarts):
+                self.scheduler.emit(offset)
+                self.scheduler.restart(offset, restarts[offset])
+
+        # only tags for items in this window are produced
+        self.scheduler.emit(window_end)
 
         out[:] = in0
 
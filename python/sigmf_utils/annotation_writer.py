@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import queue
+import threading
+import time
+from . import codec
+
+
+# size of the file buffer used while streaming annotations
+WRITE_BUFFER_SIZE = 1 << 20
+
+ANNOTATIONS_START = '"annotations": ['
+ANNOTATION_INDENT = '\n        '
+COMPACT_ANNOTATIONS_START = '"annotations":['
+
+
+class AnnotationWriter(object):
+    """
+    Streaming writer for `.sigmf-meta` files. The `global` and `captures` objects are
+    written when the file is opened and every annotation is appended as soon as it is
+    written, one annotation per line, so memory use does not depend on the number of
+    annotations. Closing the writer terminates the annotations array and results in a
+    valid SigMF metadata file. If the process dies before that, `recover_metadata` can
+    turn whatever made it to disk into a valid file.
+
+    With `pretty` the `global` and `captures` objects are indented and every annotation
+    line is indented to match, otherwise the file is written without any indentation,
+    which is faster to write and smaller. Annotations are encoded with the JSON backend
+    selected in `codec` either way.
+    """
+    def __init__(self, filename, sigmf_global, sigmf_captures, pretty=True):
+        self.filename = filename
+        self.sigmf_global = sigmf_global
+        self.sigmf_captures = sigmf_captures
+        self.pretty = pretty
+        self.indent = ANNOTATION_INDENT if pretty else '\n'
+        self.file = None
+        self.count = 0
+
+    def open(self):
+        """
+        Create the file and write everything preceding the annotations.
+        """
+        self.close()
+        start = ANNOTATIONS_START if self.pretty else COMPACT_ANNOTATIONS_START
+        header = codec.dumps({'global': self.sigmf_global, 'captures': self.sigmf_captures, 'annotations': []},
+                             indent=4 if self.pretty else None)
+        # the dump ends with `"annotations": []` and the closing brace, leave the array open
+        header = header[:header.rindex(start[:-1])] + start
+        self.file = open(self.filename, 'w', buffering=WRITE_BUFFER_SIZE)
+        self.file.write(header)
+        self.count = 0
+
+    def write(self, annotation):
+        """
+        Append a single annotation dictionary.
+        """
+        self.file.write((',' if self.count else '') + self.indent + codec.dumps(annotation))
+        self.count += 1
+
+    def write_batch(self, annotations):
+        """
+        Append a list of annotation dictionaries with a single write to the file.
+        """
+        if not annotations:
+            return
+        indent = self.indent
+        lines = (indent + codec.dumps(anno) for anno in annotations)
+        self.file.write((',' if self.count else '') + ','.join(lines))
+        self.count += len(annotations)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        """
+        Terminate the annotations array and close the file.
+        """
+        if self.file is None:
+            return
+        if self.pretty:
+            self.file.write(('\n    ]' if self.count else ']') + '\n}\n')
+        else:
+            self.file.write(('\n]' if self.count else ']') + '\n}\n')
+        self.file.close()
+        self.file = None
+
+    def is_open(self):
+        return self.file is not None
+
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop')
+
+
+class ThreadedAnnotationWriter(object):
+    """
+    Wraps an `AnnotationWriter` with a bounded queue and a dedicated writer thread so
+    the caller (a block's `work()` or message handler) never waits on the disk.
+    Annotations are written in batches of up to `batch_size`, and the file is flushed
+    at least every `flush_interval` seconds while annotations are arriving.
+
+    When the queue is full the `overflow` policy applies:
+
+        `block`         wait for space in the queue (no annotations are lost)
+        `drop_oldest`   discard the oldest queued annotation to make room
+        `drop`          discard the new annotation
+
+    Discarded annotations are counted in `dropped`. The number of annotations written
+    to the file so far is available as `count`. `pretty` selects the output format of
+    the `AnnotationWriter`.
+    """
+    def __init__(self, filename, sigmf_global, sigmf_captures, queue_size=65536, batch_size=256,
+                 flush_interval=1.0, overflow='block', pretty=True):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy `{overflow}`, expected one of {OVERFLOW_POLICIES}')
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        if not flush_interval > 0:
+            raise ValueError('flush_interval must be greater than 0')
+        self.writer = AnnotationWriter(filename, sigmf_global, sigmf_captures, pretty)
+        self.queue = queue.Queue(queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self.error = None
+        self.thread = None
+
+    @property
+    def filename(self):
+        return self.writer.filename
+
+    @property
+    def count(self):
+        return self.writer.count
+
+    def queue_depth(self):
+        """
+        Number of annotations waiting to be written.
+        """
+        return self.queue.qsize()
+
+    def open(self):
+        """
+        Create the file and start the writer thread.
+        """
+        self.close()
+        self.writer.open()
+        self.dropped = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='sigmf annotation writer', daemon=True)
+        self.thread.start()
+
+    def write(self, annotation):
+        """
+        Queue a single annotation dictionary for writing.
+        """
+        if self.overflow == 'block':
+            self.queue.put(annotation)
+            return
+        try:
+            self.queue.put_nowait(annotation)
+        except queue.Full:
+            if self.overflow == 'drop':
+                self.dropped += 1
+                return
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                # the writer thread emptied the queue meanwhile, nothing had to be dropped
+                pass
+            try:
+                self.queue.put_nowait(annotation)
+            except queue.Full:
+                self.dropped += 1
+
+    def close(self):
+        """
+        Write out everything still queued, stop the writer thread and close the file.
+        Any error raised in the writer thread is raised here.
+        """
+        if self.thread is None:
+            return
+        # the sentinel must get through even under a drop policy, so always block
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.writer.close()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def is_open(self):
+        return self.thread is not None
+
+    def _run(self):
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.queue.get_nowait()
+                else:
+                    running = False
+            except queue.Empty:
+                pass
+
+            if self.error is not None:
+                # keep draining so producers never block on a dead writer
+                continue
+            try:
+                self.writer.write_batch(batch)
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    self.writer.flush()
+                    last_flush = now
+            except Exception as e:
+                self.error = e
+
+
+def recover_metadata(filename):
+    """
+    Repair a `.sigmf-meta` file left behind by an `AnnotationWriter` that was never
+    closed (for example because the process was killed). A partially written trailing
+    annotation is dropped and the annotations array is terminated. The file is fixed in
+    place working backwards from its end, so the annotations are never loaded. Returns
+    the number of annotation bytes that were discarded, or `None` if the file was
+    already complete.
+    """
+    with open(filename, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while True:
+            start, line = _last_line(f, end)
+            text = line.strip()
+            if not text and start > 0:
+                # trailing newline or blank line
+                end = start - 1
+                continue
+            if line.rstrip() == b'}':
+                # only the top level object is closed without indentation, so the
+                # writer closed the file
+                return None
+            if text.endswith((ANNOTATIONS_START.encode(), COMPACT_ANNOTATIONS_START.encode())):
+                closing = b']\n}\n'
+                end = start + len(line.rstrip())
+                break
+            try:
+                codec.loads(text.rstrip(b','))
+                closing = b'\n    ]\n}\n'
+                end = start + len(line.rstrip().rstrip(b','))
+                break
+            except ValueError:
+                if start == 0:
+                    raise ValueError(f'{filename} does not contain a SigMF annotations array')
+                # partially written annotation, drop it along with the preceding newline
+                end = start - 1
+
+        f.truncate(end)
+        f.seek(end)
+        f.write(closing)
+    return size - end
+
+
+def _last_line(f, end, block=65536):
+    """
+    Return `(start, line)` for the last line of `f` before byte offset `end`.
+    """
+    start = end
+    data = b''
+    while start > 0:
+        step = min(block, start)
+        start -= step
+        f.seek(start)
+        data = f.read(step) + data
+        idx = data.rfind(b'\n')
+        if idx >= 0:
+            return start + idx + 1, data[idx + 1:]
+    return 0, data
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import tarfile
+from os.path import basename, splitext
+from .metadata import read_metadata
+
+
+SIGMF_ARCHIVE_EXT = '.sigmf'
+
+
+class SigMFArchive(object):
+    """
+    Read access to the recordings of a SigMF archive (a `.sigmf` tar file) without
+    extracting it. Only the tar headers are parsed, the metadata member is read from
+    the archive on request and the dataset member is located by its byte offset so it
+    can be streamed or memory mapped in place. Recordings are named by the path of
+    their members without the extension (`name/name` for a standard archive), and can
+    be selected by that name or just its last component.
+
+    Compressed archives can not be read in place and are rejected.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            with tarfile.open(filename, 'r:') as tar:
+                members = tar.getmembers()
+        except tarfile.ReadError as e:
+            raise ValueError(f'{filename} is not an uncompressed SigMF archive: {e}')
+
+        meta, data = {}, {}
+        for member in members:
+            name, ext = splitext(member.name)
+            if not member.isfile() or member.issparse():
+                continue
+            if ext == '.sigmf-meta':
+                meta[name] = member
+            elif ext == '.sigmf-data':
+                data[name] = member
+        self.recordings = {name: (meta[name], data[name]) for name in sorted(meta) if name in data}
+        if not self.recordings:
+            raise ValueError(f'SigMF archive {filename} does not contain any recordings')
+
+    def names(self):
+        """
+        Return the names of the recordings in the archive.
+        """
+        return list(self.recordings)
+
+    def select(self, name=''):
+        """
+        Return the full name of the recording matching `name`, which may be omitted if
+        the archive holds a single recording.
+        """
+        if not name:
+            if len(self.recordings) > 1:
+                raise ValueError(f'SigMF archive {self.filename} contains multiple recordings, select one of '
+                                 f'{self.names()}')
+            return self.names()[0]
+        matches = [n for n in self.recordings if n == name or basename(n) == name]
+        if len(matches) != 1:
+            raise ValueError(f'SigMF archive {self.filename} has {len(matches)} recordings matching `{name}`, '
+                             f'expected one of {self.names()}')
+        return matches[0]
+
+    def metadata(self, name=''):
+        """
+        Load the metadata dictionary of a recording, the annotations are streamed from
+        the archive as they are used (see `read_metadata`).
+        """
+        member = self.recordings[self.select(name)][0]
+        return read_metadata(self.filename, member.offset_data)
+
+    def data_range(self, name=''):
+        """
+        Return the `(offset, size)` in bytes of the dataset of a recording within the
+        archive file.
+        """
+        member = self.recordings[self.select(name)][1]
+        return member.offset_data, member.size
@@ -0,0 +1,39 @@
+/*
+ * Copyright 2022 Free Software Foundation, Inc.
+ *
+ * This file is part of GNU Radio
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ *
+ */
+#include "pydoc_macros.h"
+#define D(...) DOC(gr, sigmf_utils, __VA_ARGS__)
+/*
+  This file contains placeholders for docstrings for the Python bindings.
+  Do not edit! These were automatically extracted during the binding process
+  and will be overwritten during the build process
+ */
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_tag_inserter_0 = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_tag_inserter_1 = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_make = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_set_tags = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_num_tags = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_set_bursts = R"doc()doc";
+
+
+static const char* __doc_gr_sigmf_utils_tag_inserter_num_bursts = R"doc()doc";
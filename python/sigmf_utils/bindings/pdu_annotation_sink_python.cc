@@ -0,0 +1,56 @@
+/*
+ * Copyright 2022 Free Software Foundation, Inc.
+ *
+ * This file is part of GNU Radio
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ *
+ */
+
+/***********************************************************************************/
+/* This file is automatically generated using bindtool and can be manually edited  */
+/* The following lines can be configured to regenerate this file during cmake      */
+/* If manual edits are made, the following tags should be modified accordingly.    */
+/* BINDTOOL_GEN_AUTOMATIC(0)                                                       */
+/* BINDTOOL_USE_PYGCCXML(0)                                                        */
+/* BINDTOOL_HEADER_FILE(pdu_annotation_sink.h)                                     */
+/* BINDTOOL_HEADER_FILE_HASH(fd4bc274d302483f9ee7c979dacb68fb)                     */
+/***********************************************************************************/
+
+#include <pybind11/complex.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+#include <gnuradio/sigmf_utils/pdu_annotation_sink.h>
+// pydoc.h is automatically generated in the build directory
+#include <pdu_annotation_sink_pydoc.h>
+
+void bind_pdu_annotation_sink(py::module& m)
+{
+
+    using pdu_annotation_sink = ::gr::sigmf_utils::pdu_annotation_sink;
+
+
+    py::class_<pdu_annotation_sink,
+               gr::block,
+               gr::basic_block,
+               std::shared_ptr<pdu_annotation_sink>>(
+        m, "pdu_annotation_sink", D(pdu_annotation_sink))
+
+        .def(py::init(&pdu_annotation_sink::make),
+             py::arg("filename"),
+             py::arg("freq"),
+             py::arg("rate"),
+             py::arg("label"),
+             py::arg("dtype"),
+             D(pdu_annotation_sink, make))
+
+
+        .def("annotation_count",
+             &pdu_annotation_sink::annotation_count,
+             D(pdu_annotation_sink, annotation_count))
+
+        ;
+}
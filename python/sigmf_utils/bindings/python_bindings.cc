@@ -21,6 +21,9 @@ namespace py = pybind11;
 // Please do not delete
 /**************************************/
 // BINDING_FUNCTION_PROTOTYPES(
+void bind_tag_inserter(py::module& m);
+void bind_tag_annotation_sink(py::module& m);
+void bind_pdu_annotation_sink(py::module& m);
 // ) END BINDING_FUNCTION_PROTOTYPES
 
 
@@ -49,5 +52,8 @@ PYBIND11_MODULE(sigmf_utils_python, m)
     // Please do not delete
     /**************************************/
     // BINDING_FUNCTION_CALLS(
+    bind_tag_inserter(m);
+    bind_tag_annotation_sink(m);
+    bind_pdu_annotation_sink(m);
     // ) END BINDING_FUNCTION_CALLS
 }
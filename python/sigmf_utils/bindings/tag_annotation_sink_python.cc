@@ -0,0 +1,62 @@
+/*
+ * Copyright 2022 Free Software Foundation, Inc.
+ *
+ * This file is part of GNU Radio
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ *
+ */
+
+/***********************************************************************************/
+/* This file is automatically generated using bindtool and can be manually edited  */
+/* The following lines can be configured to regenerate this file during cmake      */
+/* If manual edits are made, the following tags should be modified accordingly.    */
+/* BINDTOOL_GEN_AUTOMATIC(0)                                                       */
+/* BINDTOOL_USE_PYGCCXML(0)                                                        */
+/* BINDTOOL_HEADER_FILE(tag_annotation_sink.h)                                     */
+/* BINDTOOL_HEADER_FILE_HASH(4579701f99f0bd21768085ab2c688349)                     */
+/***********************************************************************************/
+
+#include <pybind11/complex.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+#include <gnuradio/sigmf_utils/tag_annotation_sink.h>
+// pydoc.h is automatically generated in the build directory
+#include <tag_annotation_sink_pydoc.h>
+
+void bind_tag_annotation_sink(py::module& m)
+{
+
+    using tag_annotation_sink = ::gr::sigmf_utils::tag_annotation_sink;
+
+
+    py::class_<tag_annotation_sink,
+               gr::sync_block,
+               gr::block,
+               gr::basic_block,
+               std::shared_ptr<tag_annotation_sink>>(
+        m, "tag_annotation_sink", D(tag_annotation_sink))
+
+        .def(py::init(&tag_annotation_sink::make),
+             py::arg("filename"),
+             py::arg("freq"),
+             py::arg("rate"),
+             py::arg("label"),
+             py::arg("dtype"),
+             D(tag_annotation_sink, make))
+
+
+        .def("annotation_count",
+             &tag_annotation_sink::annotation_count,
+             D(tag_annotation_sink, annotation_count))
+
+
+        .def("in_progress_count",
+             &tag_annotation_sink::in_progress_count,
+             D(tag_annotation_sink, in_progress_count))
+
+        ;
+}
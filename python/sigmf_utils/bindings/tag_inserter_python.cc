@@ -0,0 +1,73 @@
+/*
+ * Copyright 2022 Free Software Foundation, Inc.
+ *
+ * This file is part of GNU Radio
+ *
+ * SPDX-License-Identifier: GPL-3.0-or-later
+ *
+ */
+
+/***********************************************************************************/
+/* This file is automatically generated using bindtool and can be manually edited  */
+/* The following lines can be configured to regenerate this file during cmake      */
+/* If manual edits are made, the following tags should be modified accordingly.    */
+/* BINDTOOL_GEN_AUTOMATIC(0)                                                       */
+/* BINDTOOL_USE_PYGCCXML(0)                                                        */
+/* BINDTOOL_HEADER_FILE(tag_inserter.h)                                            */
+/* BINDTOOL_HEADER_FILE_HASH(e19ba401d74139f80c303b6fa5c3928b)                     */
+/***********************************************************************************/
+
+#include <pybind11/complex.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+#include <gnuradio/sigmf_utils/tag_inserter.h>
+// pydoc.h is automatically generated in the build directory
+#include <tag_inserter_pydoc.h>
+
+void bind_tag_inserter(py::module& m)
+{
+
+    using tag_inserter = ::gr::sigmf_utils::tag_inserter;
+
+
+    py::class_<tag_inserter,
+               gr::sync_block,
+               gr::block,
+               gr::basic_block,
+               std::shared_ptr<tag_inserter>>(m, "tag_inserter", D(tag_inserter))
+
+        .def(py::init(&tag_inserter::make),
+             py::arg("itemsize"),
+             py::arg("tags"),
+             py::arg("start_tag_key") = pmt::PMT_NIL,
+             D(tag_inserter, make))
+
+
+        .def("set_tags",
+             &tag_inserter::set_tags,
+             py::arg("tags"),
+             D(tag_inserter, set_tags))
+
+
+        .def("num_tags", &tag_inserter::num_tags, D(tag_inserter, num_tags))
+
+
+        .def("set_bursts",
+             &tag_inserter::set_bursts,
+             py::arg("start_offsets"),
+             py::arg("end_offsets"),
+             py::arg("burst_ids"),
+             py::arg("center_frequencies"),
+             py::arg("bandwidths"),
+             py::arg("relative_frequencies"),
+             py::arg("sample_rate"),
+             D(tag_inserter, set_bursts))
+
+
+        .def("num_bursts", &tag_inserter::num_bursts, D(tag_inserter, num_bursts))
+
+        ;
+}
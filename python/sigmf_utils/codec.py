@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    except TypeError:
+        # types orjson does not know about (or integers beyond 64 bits)
+        return _json_dumps(obj)
+
+
+# available backends as `name: (loads, dumps)`, the fastest installed one is used
+BACKENDS = {'json': (json.loads, _json_dumps)}
+if simdjson is not None:
+    BACKENDS['simdjson'] = (simdjson.loads, _json_dumps)
+if orjson is not None:
+    BACKENDS['orjson'] = (orjson.loads, _orjson_dumps)
+
+_backend = None
+_loads = None
+_dumps = None
+
+
+def set_backend(name=None):
+    """
+    Select the JSON library used for SigMF metadata by name (`orjson`, `simdjson` or
+    `json`, see `BACKENDS` for those that are installed), or the fastest installed one
+    if `name` is None. `simdjson` only parses, documents are written with `json`.
+    """
+    global _backend, _loads, _dumps
+    if name is None:
+        name = next(n for n in ['orjson', 'simdjson', 'json'] if n in BACKENDS)
+    if name not in BACKENDS:
+        raise ValueError(f'JSON backend `{name}` is not available, expected one of {list(BACKENDS)}')
+    _backend = name
+    _loads, _dumps = BACKENDS[name]
+
+
+def backend():
+    """
+    Return the name of the JSON backend in use.
+    """
+    return _backend
+
+
+def loads(data):
+    """
+    Decode a JSON document from a `str` or `bytes`.
+    """
+    return _loads(data)
+
+
+def load(f):
+    """
+    Decode the JSON document in the file object `f`.
+    """
+    return _loads(f.read())
+
+
+def dumps(obj, indent=None):
+    """
+    Encode `obj` as compact JSON text, or indented by `indent` spaces. Indented output
+    always uses the standard library so it does not depend on the backend, it is meant
+    for the small `global` and `captures` objects rather than the annotations.
+    """
+    if indent is not None:
+        return json.dumps(obj, indent=indent)
+    return _dumps(obj)
+
+
+set_backend()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import re
+import numpy
+
+
+# numpy component types for the SigMF core datatypes
+SIGMF_COMPONENT_TYPES = {'f64': 'f8', 'f32': 'f4', 'i32': 'i4', 'i16': 'i2',
+                         'u32': 'u4', 'u16': 'u2', 'i8': 'i1', 'u8': 'u1'}
+
+SIGMF_DATATYPES = [f'{kind}{component}{endian}'
+                   for kind in 'cr'
+                   for component in SIGMF_COMPONENT_TYPES
+                   for endian in ([''] if component.endswith('8') else ['_le', '_be'])]
+
+# gnuradio output types: numpy item type and the number of items per sample
+SIGMF_OUTPUT_TYPES = {'cf32_le': (numpy.complex64, 1), 'ci16_le': (numpy.int16, 2), 'rf32_le': (numpy.float32, 1)}
+
+
+def parse_datatype(datatype):
+    """
+    Split a SigMF `core:datatype` string into a flag indicating complex data and the
+    numpy type (including byte order) of a single component.
+    """
+    match = re.fullmatch(r'([cr])(f64|f32|i32|i16|u32|u16|i8|u8)(_le|_be)?', datatype or '')
+    if match is None:
+        raise ValueError(f'Invalid SigMF datatype {datatype}')
+    kind, component, endian = match.groups()
+    if endian is None and not component.endswith('8'):
+        raise ValueError(f'SigMF datatype {datatype} is missing the byte order')
+    order = '>' if endian == '_be' else '<'
+    return kind == 'c', numpy.dtype(order + SIGMF_COMPONENT_TYPES[component])
+
+
+class SampleConverter(object):
+    """
+    Converts raw samples of any SigMF datatype into one of the gnuradio output types
+    (`cf32_le` complex, `ci16_le` interleaved short, `rf32_le` float) with vectorized
+    NumPy operations writing straight into the output buffer.
+
+    Integer data is normalized to [-1.0, 1.0) for float outputs (offset binary for
+    unsigned types, so `cu8` RTL-SDR data is centered on zero) and to the full short
+    range for `ci16_le`, float data is converted to `ci16_le` with a scale of 2^15 and
+    saturated. The `scale` overrides the full scale value: integer data is divided by
+    it (and multiplied by 2^15 for `ci16_le`), float data converted to `ci16_le` is
+    multiplied by it. Real valued data produces a zero imaginary part for complex
+    outputs. When the output layout is identical to the data on disk (`passthrough`)
+    no conversion is needed and the data can be read directly into the output buffer.
+
+    Multi-channel datasets (`core:num_channels`) interleave one sample of each of the
+    `channels` per `sample_size`, `read()` then de-interleaves them into one output
+    array per channel with a strided conversion (or copy) per channel.
+    """
+    def __init__(self, datatype, output_type, scale=None, channels=1):
+        if output_type not in SIGMF_OUTPUT_TYPES:
+            raise ValueError(f'Invalid output type {output_type}, expected one of {list(SIGMF_OUTPUT_TYPES)}')
+        if scale is not None and scale <= 0:
+            raise ValueError(f'Invalid conversion scale {scale}')
+        if channels < 1:
+            raise ValueError(f'Invalid number of channels {channels}')
+        self.is_complex, self.component_type = parse_datatype(datatype)
+        self.datatype = datatype
+        self.output_type = output_type
+        self.item_type, self.items_per_sample = SIGMF_OUTPUT_TYPES[output_type]
+        if self.is_complex and output_type == 'rf32_le':
+            raise ValueError(f'Cannot convert complex SigMF datatype {datatype} to {output_type}')
+
+        self.components = 2 if self.is_complex else 1
+        self.channels = channels
+        self.sample_size = channels * self.components * self.component_type.itemsize
+        self.out_components = 1 if output_type == 'rf32_le' else 2
+
+        # integer data is normalized by the full scale value, unsigned data is offset binary
+        kind = self.component_type.kind
+        bits = 8 * self.component_type.itemsize
+        self.offset = float(2 ** (bits - 1)) if kind == 'u' else 0.0
+        if kind in 'iu':
+            self.scale = 1.0 / (scale or 2 ** (bits - 1))
+            if output_type == 'ci16_le':
+                self.scale *= 2 ** 15
+        else:
+            self.scale = float(scale or 2 ** 15) if output_type == 'ci16_le' else 1.0
+        # exact integer rescaling to short does not need rounding or saturation
+        self.exact = output_type == 'ci16_le' and kind in 'iu' and bits <= 16 and scale is None
+        native = self.component_type.newbyteorder('=')
+        self.passthrough = (self.component_type.isnative and self.is_complex == (self.out_components == 2) and
+                            native == numpy.dtype(numpy.int16 if output_type == 'ci16_le' else numpy.float32) and
+                            self.scale == 1.0 and not self.offset)
+        self.work_buffer = numpy.zeros(0, numpy.float32)
+        self.buffer = None
+
+    def make_buffer(self, nsamples):
+        """
+        Return an array suitable for reading `nsamples` raw samples from the dataset.
+        """
+        return numpy.empty((nsamples, self.channels * self.components), self.component_type)
+
+    def channel(self, samples, channel):
+        """
+        Return the (strided) view of one channel of the raw `samples`.
+        """
+        return samples[:, channel * self.components:(channel + 1) * self.components]
+
+    def read(self, reader, position, *outputs):
+        """
+        Read the samples starting at `position` from one of the dataset readers (with an
+        item size of `sample_size`) into the output arrays, one per channel, converting
+        them on the way. Returns the number of samples read.
+        """
+        nsamples = min(len(out) for out in outputs) // self.items_per_sample
+        if self.passthrough and self.channels == 1:
+            return reader.readinto(position, outputs[0][:nsamples * self.items_per_sample].reshape(nsamples, -1))
+        if self.buffer is None or len(self.buffer) < nsamples:
+            self.buffer = self.make_buffer(nsamples)
+        count = reader.readinto(position, self.buffer[:nsamples])
+        for channel, out in enumerate(outputs):
+            self.convert(self.channel(self.buffer[:count], channel), out[:count * self.items_per_sample])
+        return count
+
+    def convert(self, samples, out):
+        """
+        Convert the raw `samples` of one channel (`n` samples as returned by `make_buffer`,
+        or a `channel()` of them) into the output array `out` holding `n * items_per_sample`
+        items.
+        """
+        n = len(samples)
+        dest = out.view(numpy.int16 if self.output_type == 'ci16_le' else numpy.float32)
+        dest = dest.reshape(n, self.out_components)
+        if self.passthrough:
+            dest[:] = samples
+            return
+
+        # short output computed from float needs rounding and saturation
+        saturate = self.output_type == 'ci16_le' and not self.exact
+        if saturate:
+            if len(self.work_buffer) < n * self.components:
+                self.work_buffer = numpy.empty(n * self.components, numpy.float32)
+            target = self.work_buffer[:n * self.components].reshape(n, self.components)
+        else:
+            target = dest[:, :self.components]
+
+        if self.offset:
+            numpy.subtract(samples, self.offset, out=target, casting='unsafe')
+            numpy.multiply(target, self.scale, out=target, casting='unsafe')
+        elif self.scale != 1.0:
+            numpy.multiply(samples, self.scale, out=target, casting='unsafe')
+        else:
+            numpy.copyto(target, samples, casting='unsafe')
+
+        if saturate:
+            numpy.rint(target, out=target)
+            numpy.clip(target, -2 ** 15, 2 ** 15 - 1, out=target)
+            numpy.copyto(dest[:, :self.components], target, casting='unsafe')
+        if self.components < self.out_components:
+            dest[:, 1] = 0
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import codecs
+import json
+import re
+import numpy
+from gnuradio import gr
+from . import codec
+from .sigmf_tools import check_metadata
+from .sidecar import open_sidecar
+
+
+# bytes of a `.sigmf-meta` file read at a time
+DEFAULT_META_CHUNK_SIZE = 1 << 20
+
+# number of annotations parsed together by `StreamedAnnotations`
+ANNOTATION_BLOCK_SIZE = 4096
+
+_NON_WHITESPACE = re.compile(r'[^ \t\n\r]')
+# characters that can not follow a complete number
+_NUMBER = set('0123456789.eE+-')
+_DECODER = json.JSONDecoder()
+
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_OPEN = numpy.zeros(256, numpy.int8)
+_OPEN[[ord('['), ord('{')]] = 1
+_OPEN[[ord(']'), ord('}')]] = -1
+_COMMA = ord(',')
+_BRACKETS = [ord(c) for c in '[]{}']
+
+
+class JSONStream(object):
+    """
+    Incremental reader of a JSON document in a file, starting at byte `offset`. The
+    file is read `chunk_size` bytes at a time and values are decoded one by one with
+    the standard library decoder, so only the value being decoded is held in memory.
+    Arrays and objects can also be skipped without decoding them, their end is located
+    with a vectorized scan of the brackets outside of strings. `tell()` returns the
+    byte position in the file, which a new stream can later resume from.
+    """
+    def __init__(self, filename, offset=0, chunk_size=DEFAULT_META_CHUNK_SIZE):
+        self.file = open(filename, 'rb')
+        self.file.seek(offset)
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        # byte position in the file of text[0]
+        self.offset = offset
+        self.eof = False
+
+    def close(self):
+        self.file.close()
+
+    def _read(self, size=None):
+        # drop the consumed text and append the next chunk, returns False at the end
+        if self.eof:
+            return False
+        data = self.file.read(size or self.chunk_size)
+        self.eof = not data
+        self.offset = self.tell()
+        self.text = self.text[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def tell(self):
+        """
+        Return the byte position in the file of the next character.
+        """
+        head = self.text[:self.pos]
+        return self.offset + (len(head) if head.isascii() else len(head.encode('utf-8')))
+
+    def peek(self):
+        """
+        Return the next character that is not whitespace without consuming it, or an
+        empty string at the end of the file.
+        """
+        while True:
+            match = _NON_WHITESPACE.search(self.text, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return self.text[self.pos]
+            self.pos = len(self.text)
+            if not self._read():
+                return ''
+
+    def accept(self, char):
+        """
+        Consume the next character if it is `char`, returns True if it was.
+        """
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        """
+        Consume the next character, which has to be `char`.
+        """
+        if not self.accept(char):
+            raise ValueError(f'Invalid JSON at byte {self.tell()} of {self.file.name}, expected `{char}`')
+
+    def value(self):
+        """
+        Decode and return the next value.
+        """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                # the value may continue in the next chunk, read larger chunks for large
+                # values so they are not decoded over and over
+                if not self._read(size):
+                    raise ValueError(f'Invalid JSON at byte {self.tell()} of {self.file.name}: {e.msg}')
+                size *= 2
+                continue
+            if (end == len(self.text) or self.text[end] in _NUMBER) and self._read(size):
+                # a number or literal could continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def _scan(self, depth, commas=None):
+        """
+        Scan forward from the current position, starting `depth` brackets deep, for the
+        bracket that closes the outermost one, or with `commas` for the `commas`th comma
+        at `depth` 1 if that comes first. Returns the index of that character in `text`.
+        Without `commas` the scanned text is dropped as the file is read, with it the
+        scanned text is kept so it can be decoded. Brackets and commas are located with
+        a vectorized scan of the characters outside of strings.
+        """
+        in_string = False
+        backslashes = 0
+        found = 0
+        scanned = self.pos
+        while True:
+            text = self.text[scanned:]
+            raw = text.encode('utf-8')
+            data = numpy.frombuffer(raw, numpy.uint8)
+            # quotes preceded by an odd number of backslashes are part of a string
+            quotes = numpy.flatnonzero(data == _QUOTE)
+            escaped = quotes[(quotes > 0) & (data[quotes - 1] == _BACKSLASH)]
+            if len(quotes) and quotes[0] == 0 and backslashes % 2:
+                escaped = numpy.concatenate(([0], escaped))
+            if len(escaped):
+                runs = []
+                for quote in escaped.tolist():
+                    start = quote
+                    while start > 0 and data[start - 1] == _BACKSLASH:
+                        start -= 1
+                    runs.append((quote - start + (backslashes if start == 0 else 0)) % 2 == 1)
+                quotes = numpy.setdiff1d(quotes, escaped[numpy.array(runs, bool)], assume_unique=True)
+
+            # brackets and commas outside of strings, brackets change the depth
+            # (comparisons are several times faster than a table lookup here)
+            mask = data == _COMMA if commas is not None else numpy.zeros(len(data), bool)
+            for bracket in _BRACKETS:
+                mask |= data == bracket
+            marks = numpy.flatnonzero(mask)
+            outside = (numpy.searchsorted(quotes, marks) + in_string) % 2 == 0
+            marks = marks[outside]
+            levels = depth + numpy.cumsum(_OPEN[data[marks]], dtype=numpy.int64)
+            stop = levels == 0
+            if commas is not None:
+                separators = (levels == 1) & (data[marks] == _COMMA)
+                stop |= separators & (found + numpy.cumsum(separators) == commas)
+                found += int(numpy.count_nonzero(separators))
+            hits = numpy.flatnonzero(stop)
+            if len(hits):
+                end = int(marks[hits[0]])
+                return scanned + (end if len(raw) == len(text) else len(raw[:end].decode('utf-8')))
+
+            if len(levels):
+                depth = int(levels[-1])
+            in_string = (in_string + len(quotes)) % 2 == 1
+            trailing = len(raw) - len(raw.rstrip(b'\\'))
+            backslashes = trailing + backslashes if trailing == len(raw) else trailing
+            if commas is None:
+                self.pos = len(self.text)
+            scanned = len(self.text) - self.pos
+            if not self._read():
+                raise ValueError(f'Invalid JSON in {self.file.name}, unterminated value')
+            scanned = self.pos + scanned
+
+    def skip(self):
+        """
+        Skip the next value without decoding it.
+        """
+        if self.peek() not in ['[', '{']:
+            self.value()
+            return
+        self.pos = self._scan(0) + 1
+
+    def elements(self, count=None):
+        """
+        Decode up to `count` (or all remaining) elements of an array whose opening
+        bracket has been consumed, and which has at least one element left. The elements
+        are located with a scan and decoded with a single call to the `codec` backend.
+        Returns `(elements, done)` where `done` is True if the array was closed.
+        """
+        end = self._scan(1, count)
+        done = self.text[end] == ']'
+        try:
+            elements = codec.loads('[' + self.text[self.pos:end] + ']')
+        except ValueError as e:
+            raise ValueError(f'Invalid JSON after byte {self.tell()} of {self.file.name}: {e}')
+        self.pos = end + 1
+        return elements, done
+
+
+class StreamedAnnotations(object):
+    """
+    The `annotations` list of a `.sigmf-meta` file, parsed from the file when it is
+    needed instead of being held in memory. It is read a block of
+    `ANNOTATION_BLOCK_SIZE` annotations at a time (see `blocks()`) and can be iterated
+    any number of times, indexed, and its length taken (which reads the list once). The
+    file position of every block is recorded as the list is read, so later reads can
+    start at any block that has been reached before. Annotations are checked like in
+    `check_metadata()` as they are parsed. Each block is decoded with the `codec`
+    backend.
+    """
+    def __init__(self, filename, position, chunk_size=DEFAULT_META_CHUNK_SIZE):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        # file position of each block, the first one is that of the opening bracket
+        self.positions = [position]
+        self.count = None
+        self.cached = (None, None)
+
+    def blocks(self, first=0):
+        """
+        Generate `(index, annotations)` for the blocks of the list starting with block
+        `first`, where `index` is the number of the first annotation of the block. The
+        file is read from the closest block with a known position.
+        """
+        block = min(first, len(self.positions) - 1)
+        stream = JSONStream(self.filename, self.positions[block], self.chunk_size)
+        try:
+            if block == 0:
+                stream.expect('[')
+                if stream.accept(']'):
+                    self.count = 0
+                    return
+            done = False
+            while not done:
+                index = block * ANNOTATION_BLOCK_SIZE
+                annotations, done = stream.elements(ANNOTATION_BLOCK_SIZE)
+                for offset, annotation in enumerate(annotations):
+                    if not isinstance(annotation, dict):
+                        raise ValueError(f'Invalid SigMF Annotation {index + offset}, not a dictionary object')
+                    if annotation.get('core:sample_start') is None:
+                        raise ValueError(f'Invalid SigMF Annotation {index + offset}, missing sample_start')
+                if done:
+                    self.count = index + len(annotations)
+                elif block + 1 == len(self.positions):
+                    self.positions.append(stream.tell())
+                self.cached = (block, annotations)
+                if block >= first:
+                    yield index, annotations
+                block += 1
+        finally:
+            stream.close()
+
+    def __iter__(self):
+        for index, annotations in self.blocks():
+            yield from annotations
+
+    def __len__(self):
+        if self.count is None:
+            for block in self.blocks(len(self.positions) - 1):
+                pass
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        block, offset = divmod(index, ANNOTATION_BLOCK_SIZE)
+        if index < 0 or (self.count is not None and index >= self.count):
+            raise IndexError('annotation index out of range')
+        if self.cached[0] != block:
+            for first, annotations in self.blocks(block):
+                if first // ANNOTATION_BLOCK_SIZE == block:
+                    break
+        if self.cached[0] != block or offset >= len(self.cached[1]):
+            raise IndexError('annotation index out of range')
+        return self.cached[1][offset]
+
+
+def read_metadata(filename, offset=0, stream_annotations=True, chunk_size=DEFAULT_META_CHUNK_SIZE,
+                  annotation_index=False):
+    """
+    Parse a `.sigmf-meta` file (or the metadata member at byte `offset` of an archive).
+    The `global` and `captures` objects are parsed right away, with `stream_annotations`
+    the `annotations` list is returned as a `StreamedAnnotations` that is only read as
+    it is used. Parsing stops once `global` and `captures` have been read when the
+    annotations follow them (as written by `AnnotationWriter`), otherwise the annotations
+    are skipped without being decoded to reach them.
+
+    With `annotation_index` the annotations of a `.sigmf-meta` file are returned as the
+    `AnnotationTable` of its `.sigmf-idx` sidecar, which is built (or rebuilt when the
+    metadata file has changed) if needed, see `open_sidecar()`. The rest of the metadata
+    is then taken from the sidecar as well, the file is only parsed to build it.
+    """
+    if annotation_index and offset == 0 and stream_annotations:
+        table = open_sidecar(filename)
+        if table is not None:
+            if table.annotations_position is not None:
+                table.annotations = StreamedAnnotations(filename, table.annotations_position, chunk_size)
+            metadata = dict(table.metadata)
+            metadata['annotations'] = table
+            return metadata
+
+    stream = JSONStream(filename, offset, chunk_size)
+    metadata = {}
+    try:
+        stream.expect('{')
+        empty = stream.accept('}')
+        while not empty:
+            key = stream.value()
+            if not isinstance(key, str):
+                raise ValueError(f'Invalid SigMF Metadata in {filename}, expected a key')
+            stream.expect(':')
+            if key == 'annotations' and stream_annotations:
+                stream.peek()
+                metadata[key] = StreamedAnnotations(filename, stream.tell(), chunk_size)
+                if 'global' in metadata and 'captures' in metadata:
+                    break
+                stream.skip()
+            else:
+                metadata[key] = stream.value()
+            if not stream.accept(','):
+                stream.expect('}')
+                break
+    finally:
+        stream.close()
+
+    if annotation_index and offset == 0 and isinstance(metadata.get('annotations'), StreamedAnnotations):
+        table = open_sidecar(filename, metadata)
+        if table is not None:
+            metadata['annotations'] = table
+    return metadata
+
+
+def load_metadata(metadata, annotation_index=False):
+    """
+    Return a SigMF metadata dictionary given either the dictionary itself or the name
+    of a `.sigmf-meta` file (read with `read_metadata()`, so the annotations are streamed
+    from the file, or with `annotation_index` taken from its sidecar), the result is
+    checked with `check_metadata`.
+    """
+    if isinstance(metadata, dict):
+        sigmf_metadata = metadata
+    elif isinstance(metadata, str) and metadata.endswith('.sigmf-meta'):
+        gr.log.info(f'Loading SigMF metadata from {metadata}')
+        sigmf_metadata = read_metadata(metadata, annotation_index=annotation_index)
+    else:
+        raise ValueError(f'Invalid SigMF metadata specification {metadata}')
+    check_metadata(sigmf_metadata)
+    return sigmf_metadata
@@ -9,10 +9,10 @@
 
 import numpy
 from gnuradio import gr
-import json
 import pmt
 from os.path import splitext
 from math import isnan, isinf
+from .annotation_writer import ThreadedAnnotationWriter
 
 
 class pdu_meta_writer(gr.basic_block):
@@ -31,6 +31,10 @@ class pdu_meta_writer(gr.basic_block):
     When operating in tags_to_pdu mode, the `end_offset` is inferred from the PDU
     length and `sample_rate` key, and the `burst_id` key is replaced by `pdu_num`.
 
+    Annotations are appended to the metadata file as they are produced and the file is
+    finalized when the flowgraph stops. A file left incomplete by a crash can be repaired
+    with `sigmf_utils.recover_metadata()`.
+
     Block paramters:
 
         filename:   SigMF metadata file to generate
@@ -39,8 +43,18 @@ class pdu_meta_writer(gr.basic_block):
         label:      Value to use for `core:label` in annotations
         dtype:      SigMF data type to use for `global` `core:datatype` field
 
+    Optional writer parameters, annotations are written to disk from a separate thread
+    so the scheduler never waits on file I/O:
+
+        queue_size:     maximum number of annotations waiting to be written
+        batch_size:     maximum number of annotations written at once
+        flush_interval: seconds between flushes of the file while annotations arrive
+        overflow:       `block`, `drop_oldest` or `drop` when the queue is full
+        pretty:         indent the metadata file, otherwise it is written compactly
+
     """
-    def __init__(self, filename, freq, rate, label, dtype):
+    def __init__(self, filename, freq, rate, label, dtype, queue_size=65536, batch_size=256,
+                 flush_interval=1.0, overflow='block', pretty=True):
         gr.basic_block.__init__(self,
             name="pdu_meta_writer",
             in_sig=None,
@@ -57,6 +71,9 @@ class pdu_meta_writer(gr.basic_block):
         self.soo = 0
         self.bw_min = rate/1000.0
         self.label = label
+        self.writer_args = {'queue_size': queue_size, 'batch_size': batch_size,
+                            'flush_interval': flush_interval, 'overflow': overflow,
+                            'pretty': pretty}
 
         self.initialize_sigmf_dict([{'core:sample_start': 0, 'core:frequency': freq}],
                                    {'core:datatype': dtype, 'core:sample_rate': rate, 'antenna:gain': 0})
@@ -64,23 +81,43 @@ class pdu_meta_writer(gr.basic_block):
         self.message_port_register_in(pmt.intern("in"))
         self.set_msg_handler(pmt.intern("in"), self.handler)
 
+    def start(self):
+        try:
+            self.writer.open()
+            for anno in self.d_dict['annotations']:
+                self.writer.write(anno)
+        except IOError as e:
+            gr.log.error(f"Could not write to {self.d_filename} because {e}")
+            quit()
+
+        return True
+
     def stop(self):
         try:
-            f = open(self.d_filename, 'w+')
-            f.write(json.dumps(self.d_dict,indent=4))
-            f.close()
-            gr.log.info(f"wrote file {self.d_filename} with {len(self.d_dict['annotations'])} annotations")
+            self.writer.close()
+            gr.log.info(f"wrote file {self.d_filename} with {self.writer.count} annotations")
+            if self.writer.dropped:
+                gr.log.warn(f"dropped {self.writer.dropped} annotations because the writer queue was full")
         except IOError as e:
             gr.log.error(f"Could not write to {self.d_filename} because {e}")
             quit()
 
         return True
 
-    def initialize_sigmf_dict(self, sigmf_captures, sigmf_global, sigmf_annotations = []):
+    def queue_depth(self):
+        return self.writer.queue_depth()
+
+    def dropped_count(self):
+        return self.writer.dropped
+
+    def initialize_sigmf_dict(self, sigmf_captures, sigmf_global, sigmf_annotations = None):
+        # annotations are streamed to disk by the writer as they are produced, the
+        # `annotations` list here only holds any that are written when the file is opened
         self.d_dict = {}
         self.d_dict['captures'] = sigmf_captures
         self.d_dict['global'] = sigmf_global
-        self.d_dict['annotations'] = sigmf_annotations
+        self.d_dict['annotations'] = sigmf_annotations if sigmf_annotations is not None else []
+        self.writer = ThreadedAnnotationWriter(self.d_filename, sigmf_global, sigmf_captures, **self.writer_args)
 
     def handler(self, pdu):
       if not pmt.is_pdu(pdu):
@@ -158,11 +195,11 @@ class pdu_meta_writer(gr.basic_block):
       try:
         if isnan(snr) or isinf(snr):
           gr.log.warn(f"Got illegal SNR value in {meta}")
-          self.d_dict['annotations'].append({'core:sample_start': sob-self.soo,
+          self.writer.write({'core:sample_start': sob-self.soo,
                       'core:sample_count': eob-sob, 'core:freq_upper_edge': int(freq+bw/2),
                       'core:freq_lower_edge': int(freq-bw/2), 'core:description': label})
         else:
-          self.d_dict['annotations'].append({'core:sample_start': sob-self.soo,
+          self.writer.write({'core:sample_start': sob-self.soo,
                       'core:sample_count': eob-sob, 'core:freq_upper_edge': int(freq+bw/2),
                       'core:freq_lower_edge': int(freq-bw/2), 'core:description': label,
                       'capture_details:SNRdB': snr})
@@ -7,9 +7,11 @@
 #
 
 from gnuradio import gr, gr_unittest
-# from gnuradio import blocks
-from gnuradio.sigmf_utils import add_tags_from_sigmf
+from gnuradio import blocks
+from gnuradio.sigmf_utils import add_tags_from_sigmf, CaptureIndex
+from gnuradio.sigmf_utils.add_tags_from_sigmf import compile_annotations, TagGenerator, TagScheduler
 import numpy as np
+import pmt
 
 class qa_add_tags_from_sigmf(gr_unittest.TestCase):
 
@@ -23,6 +25,151 @@ class qa_add_tags_from_sigmf(gr_unittest.TestCase):
         md = {'global':{'core:sample_rate':1e6, 'core:datatype':'ci16_le'}, 'captures':[], 'annotations':[]}
         instance = add_tags_from_sigmf(np.int16, md)
 
+    def test_002_compile_annotations(self):
+        captures = [{'core:sample_start': 0, 'core:frequency': 915e6},
+                    {'core:sample_start': 1000, 'core:frequency': 916e6}]
+        annotations = [{'core:sample_start': 10, 'core:sample_count': 20,
+                        'core:freq_lower_edge': 915.1e6, 'core:freq_upper_edge': 915.2e6},
+                       {'core:sample_start': 1500, 'core:sample_count': 100}]
+        compiled = compile_annotations(annotations, CaptureIndex(captures), 1e6, 2)
+        self.assertEqual(list(compiled['start_offset']), [20, 3000])
+        self.assertEqual(list(compiled['end_offset']), [60, 3200])
+        self.assertFloatTuplesAlmostEqual(compiled['center_frequency'], [915e6, 916e6])
+        self.assertEqual(list(compiled['has_bandwidth']), [True, False])
+        self.assertAlmostEqual(compiled['bandwidth'][0], 100e3)
+        self.assertAlmostEqual(compiled['relative_frequency'][0], 0.15)
+
+    def test_003_just_in_time_tags(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 20},
+                              {'core:sample_start': 90, 'core:sample_count': 20},
+                              {'core:sample_start': 500, 'core:sample_count': 10}]}
+        src = blocks.vector_source_c([0] * 100)
+        tagger = add_tags_from_sigmf(np.complex64, md)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, tagger, snk)
+        self.tb.run()
+
+        # annotations beyond the end of the produced data are never tagged
+        tags = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()]
+        self.assertIn((10, 'new_burst'), tags)
+        self.assertIn((30, 'gone_burst'), tags)
+        self.assertIn((90, 'new_burst'), tags)
+        self.assertNotIn((110, 'gone_burst'), tags)
+        self.assertNotIn((500, 'new_burst'), tags)
+
+    def test_004_repeat_tags(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 20}]}
+        start_key = pmt.intern('rx_start')
+        start_tags = [gr.tag_utils.python_to_tag((offset, start_key, pmt.PMT_NIL, pmt.PMT_NIL)) for offset in [0, 50]]
+        src = blocks.vector_source_c([0] * 100, False, 1, start_tags)
+        tagger = add_tags_from_sigmf(np.complex64, md, True, start_key)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, tagger, snk)
+        self.tb.run()
+
+        bursts = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags() if not pmt.eqv(t.key, start_key)]
+        self.assertIn((10, 'new_burst'), bursts)
+        self.assertIn((30, 'gone_burst'), bursts)
+        self.assertIn((60, 'new_burst'), bursts)
+        self.assertIn((80, 'gone_burst'), bursts)
+
+    def test_005_sample_range(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6},
+                           {'core:sample_start': 1000, 'core:frequency': 916e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 20},
+                              {'core:sample_start': 490, 'core:sample_count': 20},
+                              {'core:sample_start': 600, 'core:sample_count': 20}]}
+        src = blocks.vector_source_c([0] * 300)
+        tagger = add_tags_from_sigmf(np.complex64, md, True, pmt.PMT_NIL, 500, 1100)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, tagger, snk)
+        self.tb.run()
+
+        # annotation 0 is outside of the range and annotation 1 is clipped to its start
+        tags = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()]
+        bursts = [(t.offset, pmt.to_long(pmt.dict_ref(t.value, pmt.intern('burst_id'), pmt.PMT_NIL)))
+                  for t in snk.tags() if pmt.symbol_to_string(t.key) == 'new_burst']
+        self.assertEqual(bursts, [(0, 1), (100, 2)])
+        self.assertIn((10, 'gone_burst'), tags)
+        self.assertIn((0, 'frequency'), tags)
+
+    def test_006_position_tags(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 20},
+                              {'core:sample_start': 490, 'core:sample_count': 20}]}
+        position_key = pmt.intern('sigmf_position')
+        position_tags = [gr.tag_utils.python_to_tag((offset, position_key, pmt.from_uint64(sample), pmt.PMT_NIL))
+                         for offset, sample in [(0, 0), (20, 495)]]
+        src = blocks.vector_source_c([0] * 100, False, 1, position_tags)
+        tagger = add_tags_from_sigmf(np.complex64, md, True, pmt.PMT_NIL, 0, 0, position_key)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, tagger, snk)
+        self.tb.run()
+
+        # the burst open at the seek is closed there, the tags continue from sample 495
+        bursts = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags() if not pmt.eqv(t.key, position_key)]
+        self.assertIn((10, 'new_burst'), bursts)
+        self.assertIn((20, 'gone_burst'), bursts)
+        self.assertIn((20, 'new_burst'), bursts)
+        self.assertIn((35, 'gone_burst'), bursts)
+
+    def test_007_segment_range(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': idx * 1000, 'core:frequency': 915e6} for idx in range(20)],
+              'annotations': [{'core:sample_start': idx * 100, 'core:sample_count': 50 + idx % 7 * 30}
+                              for idx in range(200)]}
+        generator = TagGenerator(md)
+
+        # the tags of a segment match those of a pass to the end of the recording
+        def tags(start, end):
+            return [(offset, pmt.symbol_to_string(key), str(value))
+                    for offset, key, value, _ in generator.tag_stream(0, start, end) if offset < 2500]
+        self.assertEqual(tags(1234, 3734), tags(1234, 0))
+
+        # one set of global tags at the start of the range and each capture inside it
+        offsets = [tag[0] for tag in generator.global_tags(0, 1500, 4000)]
+        self.assertEqual(offsets, [0, 500, 1500])
+        offsets = [tag[0] for tag in TagGenerator(md, 2).global_tags(0, 3000, 8000)]
+        self.assertEqual(offsets, [0, 1000, 3000])
+
+    def test_008_merged_tag_stream(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6},
+                           {'core:sample_start': 40, 'core:frequency': 916e6, 'core:datetime': '2022-01-01T00:00:00Z'}],
+              'annotations': [{'core:sample_start': 5, 'core:sample_count': 50},
+                              {'core:sample_start': 10, 'core:sample_count': 10},
+                              {'core:sample_start': 40, 'core:sample_count': 0}]}
+        generator = TagGenerator(md)
+
+        # the global, capture and annotation tags are merged in offset order
+        tags = [(offset, pmt.symbol_to_string(key)) for offset, key, _, _ in generator.tag_stream()]
+        self.assertEqual(tags, [(0, 'frequency'), (0, 'sample_rate'), (5, 'new_burst'), (10, 'new_burst'),
+                                (20, 'gone_burst'), (40, 'frequency'), (40, 'datetime'), (40, 'sample_rate'),
+                                (40, 'new_burst'), (40, 'gone_burst'), (55, 'gone_burst')])
+
+        class Recorder(object):
+            def __init__(self):
+                self.tags = []
+
+            def add_item_tag(self, port, offset, key, value, srcid=pmt.PMT_NIL):
+                self.tags.append((offset, pmt.symbol_to_string(key)))
+
+        # a repeat replays the tags of the first pass from the new base offset
+        block = Recorder()
+        scheduler = TagScheduler(block, generator, restartable=True, repeat=True)
+        scheduler.restart(0)
+        scheduler.emit(100)
+        scheduler.restart(100)
+        scheduler.emit(130)
+        self.assertEqual(block.tags[:len(tags)], tags)
+        self.assertEqual(block.tags[len(tags):], [(offset + 100, key) for offset, key in tags if offset < 30])
+
     def test_001_descriptive_test_name(self):
         # set up fg
         self.tb.run()
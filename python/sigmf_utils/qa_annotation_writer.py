@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio.sigmf_utils import AnnotationWriter, ThreadedAnnotationWriter, recover_metadata
+import json
+import os
+import tempfile
+
+
+class qa_annotation_writer(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'test.sigmf-meta')
+        self.sigmf_global = {'core:datatype': 'ci16_le', 'core:sample_rate': 40e6}
+        self.sigmf_captures = [{'core:sample_start': 0, 'core:frequency': 915e6}]
+        self.annotations = [{'core:sample_start': 100 * i, 'core:sample_count': 50, 'core:label': f'burst{i}'}
+                            for i in range(10)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_annotations(self, close=True):
+        writer = AnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures)
+        writer.open()
+        for anno in self.annotations:
+            writer.write(anno)
+        if close:
+            writer.close()
+        else:
+            writer.flush()
+        return writer
+
+    def test_001_write(self):
+        writer = self.write_annotations()
+        self.assertEqual(writer.count, 10)
+        with open(self.filename) as f:
+            md = json.load(f)
+        self.assertEqual(md['global'], self.sigmf_global)
+        self.assertEqual(md['captures'], self.sigmf_captures)
+        self.assertEqual(md['annotations'], self.annotations)
+        self.assertEqual(recover_metadata(self.filename), None)
+
+    def test_002_no_annotations(self):
+        self.annotations = []
+        self.write_annotations()
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['annotations'], [])
+
+    def test_003_recover_truncated(self):
+        writer = self.write_annotations(close=False)
+        size = os.path.getsize(self.filename)
+        writer.file.close()
+
+        # cut the final annotation in half as if the process was killed mid-write
+        os.truncate(self.filename, size - 20)
+        self.assertGreater(recover_metadata(self.filename), 0)
+        with open(self.filename) as f:
+            md = json.load(f)
+        self.assertEqual(md['annotations'], self.annotations[:-1])
+
+    def test_004_recover_header_only(self):
+        self.annotations = []
+        writer = self.write_annotations(close=False)
+        writer.file.close()
+        self.assertEqual(recover_metadata(self.filename), 0)
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['annotations'], [])
+
+    def test_005_threaded(self):
+        writer = ThreadedAnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures, batch_size=3)
+        writer.open()
+        for anno in self.annotations:
+            writer.write(anno)
+        writer.close()
+        self.assertEqual(writer.count, 10)
+        self.assertEqual(writer.dropped, 0)
+        self.assertEqual(writer.queue_depth(), 0)
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['annotations'], self.annotations)
+
+    def test_006_threaded_drop(self):
+        writer = ThreadedAnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures,
+                                          queue_size=2, overflow='drop')
+        # fill the queue without a writer thread to make the overflow deterministic
+        for anno in self.annotations:
+            writer.write(anno)
+        self.assertEqual(writer.queue_depth(), 2)
+        self.assertEqual(writer.dropped, 8)
+        self.assertEqual([writer.queue.get_nowait() for i in range(2)], self.annotations[:2])
+
+    def test_007_threaded_drop_oldest(self):
+        writer = ThreadedAnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures,
+                                          queue_size=2, overflow='drop_oldest')
+        for anno in self.annotations:
+            writer.write(anno)
+        self.assertEqual(writer.dropped, 8)
+        self.assertEqual([writer.queue.get_nowait() for i in range(2)], self.annotations[-2:])
+
+    def test_008_bad_policy(self):
+        with self.assertRaises(ValueError):
+            ThreadedAnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures, overflow='spill')
+        with self.assertRaises(ValueError):
+            ThreadedAnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures, flush_interval=0)
+
+    def test_009_compact(self):
+        writer = ThreadedAnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures, pretty=False)
+        writer.open()
+        for anno in self.annotations:
+            writer.write(anno)
+        writer.close()
+        with open(self.filename) as f:
+            text = f.read()
+        self.assertNotIn('  ', text)
+        self.assertEqual(len(text.splitlines()), 13)
+        self.assertEqual(json.loads(text)['annotations'], self.annotations)
+        self.assertEqual(recover_metadata(self.filename), None)
+
+        # a compact file cut short is repaired like an indented one
+        writer = AnnotationWriter(self.filename, self.sigmf_global, self.sigmf_captures, pretty=False)
+        writer.open()
+        for anno in self.annotations:
+            writer.write(anno)
+        writer.flush()
+        size = os.path.getsize(self.filename)
+        writer.file.close()
+        with open(self.filename, 'r+b') as f:
+            f.truncate(size - 10)
+        recover_metadata(self.filename)
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['annotations'], self.annotations[:-1])
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_annotation_writer)
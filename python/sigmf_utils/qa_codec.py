@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio.sigmf_utils import codec
+import json
+import numpy as np
+
+
+class qa_codec(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.default = codec.backend()
+        self.md = {'global': {'core:datatype': 'cf32_le', 'core:sample_rate': 1e6},
+                   'captures': [{'core:sample_start': 0}],
+                   'annotations': [{'core:sample_start': 10, 'core:label': 'a "quoted" é label'}]}
+
+    def tearDown(self):
+        codec.set_backend(self.default)
+
+    def test_001_backends(self):
+        self.assertIn('json', codec.BACKENDS)
+        for backend in codec.BACKENDS:
+            codec.set_backend(backend)
+            self.assertEqual(codec.backend(), backend)
+            text = codec.dumps(self.md)
+            self.assertNotIn('\n', text)
+            self.assertEqual(json.loads(text), self.md)
+            self.assertEqual(codec.loads(text), self.md)
+            self.assertEqual(codec.loads(text.encode('utf-8')), self.md)
+            self.assertEqual(json.loads(codec.dumps(self.md, indent=4)), self.md)
+            self.assertEqual(codec.loads(codec.dumps({'core:sample_start': np.float64(2.5)})),
+                             {'core:sample_start': 2.5})
+
+    def test_002_unknown(self):
+        with self.assertRaises(ValueError):
+            codec.set_backend('not_a_json_library')
+        self.assertEqual(codec.backend(), self.default)
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_codec)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio.sigmf_utils import SampleConverter
+from gnuradio.sigmf_utils.convert import SIGMF_DATATYPES, parse_datatype
+import numpy as np
+
+
+class qa_convert(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.expected = np.array([0.5 - 0.25j, -1.0 + 0.75j, 0.0, 0.125 - 0.5j], np.complex64)
+
+    def encode(self, datatype):
+        is_complex, component = parse_datatype(datatype)
+        values = self.expected if is_complex else self.expected.real
+        parts = np.stack([values.real, values.imag], 1)[:, :2 if is_complex else 1]
+        if component.kind == 'f':
+            return parts.astype(component)
+        full_scale = 2.0 ** (8 * component.itemsize - 1)
+        offset = full_scale if component.kind == 'u' else 0
+        return np.round(parts * full_scale + offset).astype(component)
+
+    def test_001_parse(self):
+        self.assertEqual(parse_datatype('ci16_le'), (True, np.dtype('<i2')))
+        self.assertEqual(parse_datatype('rf64_be'), (False, np.dtype('>f8')))
+        self.assertEqual(parse_datatype('cu8'), (True, np.dtype('u1')))
+        for datatype in ['ci16', 'cf16_le', 'xi8', '']:
+            with self.assertRaises(ValueError):
+                parse_datatype(datatype)
+        with self.assertRaises(ValueError):
+            SampleConverter('ci16_le', 'rf32_le')
+
+    def test_002_matrix(self):
+        for datatype in SIGMF_DATATYPES:
+            is_complex = parse_datatype(datatype)[0]
+            expected = self.expected if is_complex else self.expected.real.astype(np.complex64)
+            for output_type in ['cf32_le', 'ci16_le', 'rf32_le']:
+                if is_complex and output_type == 'rf32_le':
+                    continue
+                converter = SampleConverter(datatype, output_type)
+                samples = converter.make_buffer(len(expected))
+                samples[:] = self.encode(datatype)
+                out = np.zeros(len(expected) * converter.items_per_sample, converter.item_type)
+                converter.convert(samples, out)
+                if output_type == 'ci16_le':
+                    out = (out[0::2] + 1j * out[1::2]) / 2 ** 15
+                if output_type == 'rf32_le':
+                    self.assertFloatTuplesAlmostEqual(out, expected.real, 5)
+                else:
+                    self.assertComplexTuplesAlmostEqual(out, expected, 5)
+
+    def test_003_saturate(self):
+        converter = SampleConverter('cf32_le', 'ci16_le')
+        samples = converter.make_buffer(2)
+        samples[:] = [[1.5, -2.0], [0.25, -0.25]]
+        out = np.zeros(4, np.int16)
+        converter.convert(samples, out)
+        self.assertEqual(out.tolist(), [32767, -32768, 8192, -8192])
+        converter = SampleConverter('ci16_le', 'cf32_le', 2 ** 14)
+        samples = converter.make_buffer(1)
+        samples[:] = [[2 ** 13, -2 ** 14]]
+        out = np.zeros(1, np.complex64)
+        converter.convert(samples, out)
+        self.assertComplexTuplesAlmostEqual(out, [0.5 - 1j])
+        self.assertTrue(SampleConverter('ci16_le', 'ci16_le').passthrough)
+        self.assertFalse(SampleConverter('ci16_be', 'ci16_le').passthrough)
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_convert)
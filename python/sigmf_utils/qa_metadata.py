@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio.sigmf_utils import read_metadata, select_annotations
+from gnuradio.sigmf_utils.metadata import JSONStream, StreamedAnnotations, ANNOTATION_BLOCK_SIZE
+from gnuradio.sigmf_utils.add_tags_from_sigmf import TagGenerator
+import json
+import os
+import pmt
+import tempfile
+
+
+class qa_metadata(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'test.sigmf-meta')
+        # strings with brackets, escaped quotes and non-ascii characters
+        self.annotations = [{'core:sample_start': 10 * i, 'core:sample_count': 15,
+                             'core:label': ['a"]}\\', 'é€', '[{'][i % 3]}
+                            for i in range(ANNOTATION_BLOCK_SIZE + 10)]
+        self.md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+                   'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+                   'annotations': self.annotations}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, **kwargs):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(self.md, f, **kwargs)
+
+    def test_001_stream(self):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(' [1.5, "x\\"]", {"a": [1, 2]} , 12345, "€"] "end"')
+        for chunk_size in [1, 2, 3, 4096]:
+            stream = JSONStream(self.filename, 1, chunk_size)
+            stream.expect('[')
+            self.assertEqual(stream.value(), 1.5)
+            stream.expect(',')
+            stream.skip()
+            stream.expect(',')
+            position = stream.tell()
+            stream.skip()
+            stream.expect(',')
+            self.assertEqual(stream.value(), 12345)
+            stream.expect(',')
+            self.assertEqual(stream.value(), '€')
+            stream.expect(']')
+            self.assertEqual(stream.value(), 'end')
+            self.assertEqual(stream.peek(), '')
+            stream.close()
+            stream = JSONStream(self.filename, position, chunk_size)
+            self.assertEqual(stream.value(), {'a': [1, 2]})
+            stream.close()
+
+    def test_002_read_metadata(self):
+        for kwargs in [{}, {'sort_keys': True, 'indent': 4, 'ensure_ascii': False}]:
+            self.write(**kwargs)
+            md = read_metadata(self.filename, chunk_size=1000)
+            self.assertEqual(md['global'], self.md['global'])
+            self.assertEqual(md['captures'], self.md['captures'])
+            self.assertTrue(isinstance(md['annotations'], StreamedAnnotations))
+            self.assertEqual(list(md['annotations']), self.annotations)
+            self.assertEqual(len(md['annotations']), len(self.annotations))
+            self.assertEqual(md['annotations'][ANNOTATION_BLOCK_SIZE + 1], self.annotations[ANNOTATION_BLOCK_SIZE + 1])
+            self.assertEqual(md['annotations'][-1], self.annotations[-1])
+            self.assertEqual(select_annotations(md['annotations'], label='é€').tolist(),
+                             list(range(1, len(self.annotations), 3)))
+
+    def test_003_streamed_tags(self):
+        self.write()
+        streamed = TagGenerator(read_metadata(self.filename), 2)
+        loaded = TagGenerator(self.md, 2)
+        for start, end in [(0, 0), (ANNOTATION_BLOCK_SIZE * 10 + 5, 0), (1000, 2000), (0, 0)]:
+            expected = [(t[0], pmt.symbol_to_string(t[1]), pmt.to_long(pmt.dict_ref(t[2], pmt.intern('burst_id'),
+                                                                                    pmt.PMT_NIL)))
+                        for t in loaded.annotation_tags(7, start * 2, end * 2 or None)]
+            tags = [(t[0], pmt.symbol_to_string(t[1]), pmt.to_long(pmt.dict_ref(t[2], pmt.intern('burst_id'),
+                                                                                pmt.PMT_NIL)))
+                    for t in streamed.annotation_tags(7, start * 2, end * 2 or None)]
+            self.assertEqual(tags, expected)
+
+    def test_004_invalid(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"global": {}, "captures": [], "annotations": [{"core:sample_start": 0}, 3]}')
+        md = read_metadata(self.filename)
+        with self.assertRaises(ValueError):
+            list(md['annotations'])
+        with open(self.filename, 'w') as f:
+            f.write('{"annotations": [{"core:sample_start": 0}, "]"')
+        with self.assertRaises(ValueError):
+            read_metadata(self.filename)
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_metadata)
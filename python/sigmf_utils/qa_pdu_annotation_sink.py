@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio import blocks
+from gnuradio.sigmf_utils import pdu_annotation_sink
+import json
+import os
+import pmt
+import tempfile
+import time
+
+
+class qa_pdu_annotation_sink(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+
+    def tearDown(self):
+        self.tb = None
+
+    def test_instance(self):
+        instance = pdu_annotation_sink('/tmp/a', 900e6, 40e6, 'burst', 'ci16_le')
+
+    def test_001_fft_burst_mode(self):
+        meta = pmt.to_pmt({'start_offset': 100, 'end_offset': 300, 'center_frequency': 901e6,
+                           'bandwidth': 1e6, 'burst_id': 3, 'snr_db': 12.5})
+        pdu = pmt.cons(meta, pmt.init_c32vector(4, [0] * 4))
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'test.sigmf-meta')
+            snk = pdu_annotation_sink(filename, 900e6, 40e6, 'use_burst_id', 'ci16_le')
+            # the strobe only gives the top block a connection, the PDU is posted directly
+            strobe = blocks.message_strobe(pmt.PMT_NIL, 1e6)
+            self.tb.msg_connect(strobe, 'strobe', snk, 'in')
+            self.tb.start()
+            snk.to_basic_block()._post(pmt.intern('in'), pdu)
+            for _ in range(100):
+                if snk.annotation_count() > 0:
+                    break
+                time.sleep(0.01)
+            self.tb.stop()
+            self.tb.wait()
+
+            with open(filename, 'r') as f:
+                md = json.load(f)
+        self.assertEqual(len(md['annotations']), 1)
+        anno = md['annotations'][0]
+        self.assertEqual(anno['core:sample_start'], 100)
+        self.assertEqual(anno['core:sample_count'], 200)
+        self.assertEqual(anno['core:freq_lower_edge'], 900.5e6)
+        self.assertEqual(anno['core:freq_upper_edge'], 901.5e6)
+        self.assertEqual(anno['core:description'], 'burst3')
+        self.assertEqual(anno['capture_details:SNRdB'], 12.5)
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_pdu_annotation_sink)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio import blocks
+from gnuradio.sigmf_utils import segments_to_pdu
+import numpy as np
+import pmt
+
+
+class qa_segments_to_pdu(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+
+    def tearDown(self):
+        self.tb = None
+
+    def test_001_segments(self):
+        data = np.arange(30).astype(np.complex64)
+        src = blocks.vector_source_c(data)
+        pdus = segments_to_pdu(np.complex64, [(10, {'sample_start': 100}), (15, {'sample_start': 500})])
+        dbg = blocks.message_debug()
+        self.tb.connect(src, pdus)
+        self.tb.msg_connect(pdus, 'pdus', dbg, 'store')
+        self.tb.run()
+
+        self.assertEqual(dbg.num_messages(), 2)
+        for idx, (start, length, offset) in enumerate([(100, 10, 0), (500, 15, 10)]):
+            pdu = dbg.get_message(idx)
+            meta = pmt.to_python(pmt.car(pdu))
+            self.assertEqual(meta['sample_start'], start)
+            self.assertComplexTuplesAlmostEqual(pmt.c32vector_elements(pmt.cdr(pdu)), data[offset:offset + length])
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_segments_to_pdu)
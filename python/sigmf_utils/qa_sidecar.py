@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio.sigmf_utils import (read_metadata, select_annotations, annotation_columns, annotation_segments,
+                                  AnnotationTable, build_sidecar, open_sidecar, validate_metadata)
+from gnuradio.sigmf_utils.sidecar import sidecar_filename
+from gnuradio.sigmf_utils.metadata import StreamedAnnotations
+from gnuradio.sigmf_utils.add_tags_from_sigmf import TagGenerator
+import json
+import numpy as np
+import os
+import pmt
+import tempfile
+
+
+class qa_sidecar(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'test.sigmf-meta')
+        self.annotations = [{'core:sample_start': 10 * i, 'core:sample_count': 15,
+                             'core:freq_lower_edge': 914.9e6, 'core:freq_upper_edge': 915.1e6,
+                             'core:label': ['burst', 'noise', 'é'][i % 3], 'capture_details:SNRdB': float(i % 20)}
+                            for i in range(5000)]
+        # annotations without the optional fields
+        self.annotations[1] = {'core:sample_start': 10}
+        self.annotations[2] = {'core:sample_start': 20, 'core:description': 'noise'}
+        self.md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+                   'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+                   'annotations': self.annotations}
+        with open(self.filename, 'w') as f:
+            json.dump(self.md, f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_001_build(self):
+        table = AnnotationTable(build_sidecar(self.filename, self.md))
+        self.assertEqual(len(table), len(self.annotations))
+        self.assertTrue(table.is_fresh(self.filename))
+        expected = annotation_columns(self.annotations)
+        for key, column in annotation_columns(table).items():
+            np.testing.assert_array_equal(column, expected[key])
+        self.assertEqual(table[0], self.annotations[0])
+        self.assertEqual(table[1], self.annotations[1])
+        self.assertEqual(table[2], {'core:sample_start': 20, 'core:label': 'noise'})
+        self.assertEqual(list(table)[-1], self.annotations[-1])
+
+        os.chmod(self.filename, 0o644)
+        self.assertEqual(os.stat(build_sidecar(self.filename, self.md)).st_mode & 0o777, 0o644)
+
+        self.md['annotations'] = []
+        table = AnnotationTable(build_sidecar(self.filename, self.md))
+        self.assertEqual(table.metadata, {'global': self.md['global'], 'captures': self.md['captures']})
+        self.assertIsNone(table.annotations_position)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(len(annotation_columns(table)['sample_start']), 0)
+
+    def test_002_read_metadata(self):
+        md = read_metadata(self.filename, annotation_index=True)
+        self.assertIsInstance(md['annotations'], AnnotationTable)
+        self.assertEqual(md['annotations'][4999], self.annotations[4999])
+        self.assertEqual(md['captures'], self.md['captures'])
+        sidecar = sidecar_filename(self.filename)
+        built = os.stat(sidecar).st_mtime_ns
+        inode = os.stat(sidecar).st_ino
+
+        # a fresh sidecar is used as is, also after the metadata file was only touched
+        os.utime(self.filename, ns=(built + 10**9, built + 10**9))
+        md = read_metadata(self.filename, annotation_index=True)
+        self.assertEqual(os.stat(sidecar).st_ino, inode)
+        self.assertEqual(md['annotations'].meta_mtime, built + 10**9)
+        self.assertIsInstance(read_metadata(self.filename)['annotations'], StreamedAnnotations)
+
+        # a changed metadata file rebuilds the sidecar
+        self.md['annotations'] = self.annotations[:100]
+        with open(self.filename, 'w') as f:
+            json.dump(self.md, f)
+        self.assertIsNone(open_sidecar(self.filename))
+        md = read_metadata(self.filename, annotation_index=True)
+        self.assertEqual(len(md['annotations']), 100)
+
+        # an annotation the sidecar can not hold falls back to the JSON annotations
+        self.md['annotations'][5]['core:sample_start'] = 'late'
+        with open(self.filename, 'w') as f:
+            json.dump(self.md, f)
+        self.assertIsNone(open_sidecar(self.filename, self.md))
+        self.assertFalse(os.path.exists(sidecar) and AnnotationTable(sidecar).is_fresh(self.filename))
+        for value in [1.5, '5', True, 2**70]:
+            self.md['annotations'][5]['core:sample_start'] = value
+            with open(self.filename, 'w') as f:
+                json.dump(self.md, f)
+            self.assertIsNone(open_sidecar(self.filename, self.md))
+
+    def test_003_select(self):
+        table = read_metadata(self.filename, annotation_index=True)['annotations']
+        for criteria in [{'label': 'noise'}, {'label': 'é', 'min_snr': 10}, {'freq_lower': 915.05e6},
+                         {'freq_upper': 914.8e6}, {}]:
+            expected = select_annotations(self.annotations, **criteria)
+            np.testing.assert_array_equal(select_annotations(table, **criteria), expected)
+            self.assertEqual(annotation_segments(table, expected, 2, 30000),
+                             annotation_segments(self.annotations, expected, 2, 30000))
+
+        self.annotations[3]['core:sample_count'] = -5
+        self.annotations[4]['core:sample_start'] = 0
+        self.md['global']['core:extensions'] = [{'name': 'capture_details', 'version': '1.0.0', 'optional': True}]
+        with open(self.filename, 'w') as f:
+            json.dump(self.md, f)
+        expected = validate_metadata(self.md, 'full')
+        self.assertEqual([(i['index'], i['key']) for i in expected],
+                         [(3, 'core:sample_count'), (None, 'core:version'), (4, 'core:sample_start')])
+        self.assertEqual(validate_metadata(read_metadata(self.filename), 'full'), expected)
+        self.assertEqual(validate_metadata(read_metadata(self.filename, annotation_index=True)), expected)
+
+    def test_004_tags(self):
+        def tags(md):
+            return [(t[0], pmt.symbol_to_string(t[1]), str(t[2]))
+                    for t in TagGenerator(md).tag_stream(0, 100, 20000)]
+        self.assertEqual(tags(read_metadata(self.filename, annotation_index=True)), tags(self.md))
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_sidecar)
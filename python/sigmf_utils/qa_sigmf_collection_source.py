@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio import blocks
+from gnuradio.sigmf_utils import sigmf_collection_source
+import json
+import numpy as np
+import os
+import pmt
+import tempfile
+
+
+class qa_sigmf_collection_source(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # three recordings written out of order, the second one as `ci16_le`
+        self.expected = []
+        for idx, minute in enumerate([2, 0, 1]):
+            base = os.path.join(self.tmpdir.name, f'rec{idx}')
+            data = np.full(100 + 10 * minute, minute + 1j * minute, np.complex64) / 4
+            if idx == 1:
+                (data.view(np.float32) * 2 ** 15).astype(np.int16).tofile(base + '.sigmf-data')
+            else:
+                data.tofile(base + '.sigmf-data')
+            md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'ci16_le' if idx == 1 else 'cf32_le'},
+                  'captures': [{'core:sample_start': 0, 'core:frequency': 915e6,
+                                'core:datetime': f'2022-01-01T00:0{minute}:00Z'}],
+                  'annotations': [{'core:sample_start': len(data) - 5, 'core:sample_count': 20}]}
+            with open(base + '.sigmf-meta', 'w') as f:
+                json.dump(md, f)
+            self.expected.append((minute, data))
+        self.expected = [data for minute, data in sorted(self.expected, key=lambda e: e[0])]
+        self.collection = os.path.join(self.tmpdir.name, 'test.sigmf-collection')
+        with open(self.collection, 'w') as f:
+            json.dump({'collection': {'core:version': '1.0.0',
+                                      'core:streams': [{'name': f'rec{idx}'} for idx in range(3)]}}, f)
+
+    def tearDown(self):
+        self.tb = None
+        self.tmpdir.cleanup()
+
+    def test_001_collection(self):
+        src = sigmf_collection_source(self.collection, 'cf32_le')
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, snk)
+        self.tb.run()
+
+        self.assertComplexTuplesAlmostEqual(snk.data(), np.concatenate(self.expected), 4)
+        tags = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()]
+        self.assertEqual([offset for offset, key in tags if key == 'datetime'], [0, 100, 210])
+        self.assertEqual([offset for offset, key in tags if key == 'gone_burst'], [100, 210, 330])
+
+    def test_002_glob_repeat(self):
+        src = sigmf_collection_source(os.path.join(self.tmpdir.name, 'rec*'), 'cf32_le', True,
+                                      pmt.intern('rx_start'))
+        head = blocks.head(gr.sizeof_gr_complex, 500)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, head, snk)
+        self.tb.run()
+
+        self.assertComplexTuplesAlmostEqual(snk.data(), np.tile(np.concatenate(self.expected), 2)[:500], 4)
+        starts = [t.offset for t in snk.tags() if pmt.symbol_to_string(t.key) == 'rx_start']
+        self.assertEqual(starts, [0, 330])
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_sigmf_collection_source)
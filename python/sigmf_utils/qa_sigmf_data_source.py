@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio import blocks
+from gnuradio.sigmf_utils import sigmf_data_source
+from gnuradio.sigmf_utils.readers import make_reader
+import numpy as np
+import os
+import pmt
+import tempfile
+
+
+class qa_sigmf_data_source(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'test.sigmf-data')
+        self.data = (np.arange(1000) + 1j * np.arange(1000)).astype(np.complex64)
+        self.data.tofile(self.filename)
+
+    def tearDown(self):
+        self.tb = None
+        self.tmpdir.cleanup()
+
+    def run_source(self, src, nitems=None):
+        snk = blocks.vector_sink_c()
+        if nitems is None:
+            self.tb.connect(src, snk)
+        else:
+            head = blocks.head(gr.sizeof_gr_complex, nitems)
+            self.tb.connect(src, head, snk)
+        self.tb.run()
+        return snk
+
+    def test_001_readers(self):
+        for reader in ['file', 'mmap', 'prefetch', 'direct']:
+            r = make_reader(reader, self.filename, 8, offset=16)
+            self.assertEqual(len(r), 998)
+            out = np.zeros(10, np.complex64)
+            self.assertEqual(r.readinto(990, out), 8)
+            self.assertComplexTuplesAlmostEqual(out[:8], self.data[992:])
+            self.assertEqual(r.readinto(998, out), 0)
+            r.close()
+
+    def test_002_read_file(self):
+        for reader in ['file', 'mmap', 'prefetch', 'direct']:
+            self.tb = gr.top_block()
+            snk = self.run_source(sigmf_data_source(self.filename, np.complex64, reader=reader, readahead=4096))
+            self.assertComplexTuplesAlmostEqual(snk.data(), self.data)
+
+    def test_003_nitems(self):
+        snk = self.run_source(sigmf_data_source(self.filename, np.complex64, nitems=100))
+        self.assertComplexTuplesAlmostEqual(snk.data(), self.data[:100])
+
+    def test_004_repeat_tags(self):
+        src = sigmf_data_source(self.filename, np.complex64, True, 300, pmt.intern('rx_start'))
+        snk = self.run_source(src, 1000)
+        self.assertComplexTuplesAlmostEqual(snk.data(), np.tile(self.data[:300], 4)[:1000])
+        tags = [(t.offset, pmt.to_long(t.value)) for t in snk.tags() if pmt.eqv(t.key, pmt.intern('rx_start'))]
+        self.assertEqual(tags, [(0, 0), (300, 1), (600, 2), (900, 3)])
+
+    def test_005_offset_seek(self):
+        position_key = pmt.intern('sigmf_position')
+        src = sigmf_data_source(self.filename, np.complex64, False, 100, pmt.PMT_NIL, 'mmap', 4096, 200, position_key)
+        self.assertFalse(src.seek(2000))
+        self.assertTrue(src.seek(250))
+        snk = self.run_source(src)
+        self.assertComplexTuplesAlmostEqual(snk.data(), self.data[250:300])
+        tags = [(t.offset, pmt.to_uint64(t.value)) for t in snk.tags() if pmt.eqv(t.key, position_key)]
+        self.assertEqual(tags, [(0, 250)])
+
+    def test_006_segments(self):
+        position_key = pmt.intern('sigmf_position')
+        src = sigmf_data_source(self.filename, np.complex64, position_tag=position_key,
+                                segments=[(10, 20), (50, 55), (990, 2000)])
+        snk = self.run_source(src)
+        self.assertComplexTuplesAlmostEqual(snk.data(), np.concatenate([self.data[10:20], self.data[50:55], self.data[990:]]))
+        tags = [(t.offset, pmt.to_uint64(t.value)) for t in snk.tags() if pmt.eqv(t.key, position_key)]
+        self.assertEqual(tags, [(0, 10), (10, 50), (15, 990)])
+
+    def test_007_convert(self):
+        raw = (np.arange(2000) % 256).astype(np.uint8)
+        raw.tofile(self.filename)
+        expected = (raw.astype(np.float32) - 128) / 128
+        src = sigmf_data_source(self.filename, np.complex64, offset=10, nitems=100, datatype='cu8')
+        snk = self.run_source(src)
+        self.assertComplexTuplesAlmostEqual(snk.data(), expected[20:220:2] + 1j * expected[21:220:2])
+
+        self.tb = gr.top_block()
+        src = sigmf_data_source(self.filename, np.int16, nitems=100, reader='file', datatype='cu8')
+        snk = blocks.vector_sink_s()
+        self.tb.connect(src, snk)
+        self.tb.run()
+        self.assertEqual(list(snk.data()), ((raw[:100].astype(np.int16) - 128) * 256).tolist())
+
+    def test_008_metadata_tags(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 150, 'core:sample_count': 10}]}
+        src = sigmf_data_source(self.filename, np.complex64, True, 100, offset=100, metadata=md)
+        snk = self.run_source(src, 250)
+        self.assertComplexTuplesAlmostEqual(snk.data(), np.tile(self.data[100:200], 3)[:250])
+        bursts = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags() if 'burst' in pmt.symbol_to_string(t.key)]
+        self.assertEqual(bursts, [(50, 'new_burst'), (60, 'gone_burst'), (150, 'new_burst'), (160, 'gone_burst')])
+        frequency = [t.offset for t in snk.tags() if pmt.symbol_to_string(t.key) == 'frequency']
+        self.assertEqual(frequency, [0, 100, 200])
+
+    def test_009_prefetch(self):
+        r = make_reader('prefetch', self.filename, 8, depth=3, chunk_size=1000, threads=2)
+        out = np.zeros(300, np.complex64)
+        for position in [0, 300, 600, 100, 900]:
+            count = r.readinto(position, out)
+            self.assertComplexTuplesAlmostEqual(out[:count], self.data[position:position + count])
+        self.assertEqual(r.stats()['bytes_read'], (4 * 300 + 100) * 8)
+        r.close()
+
+        src = sigmf_data_source(self.filename, np.complex64, reader='prefetch',
+                                reader_args={'depth': 2, 'chunk_size': 4096, 'threads': 1})
+        snk = self.run_source(src)
+        self.assertComplexTuplesAlmostEqual(snk.data(), self.data)
+        self.assertEqual(set(src.reader_stats()), {'stall_time', 'stalls', 'bytes_read', 'bytes_ahead'})
+
+    def test_010_direct(self):
+        # unaligned head and tail, the dataset ends partway through an aligned block
+        r = make_reader('direct', self.filename, 8, offset=24, nitems=950, depth=2, chunk_size=4096, threads=2)
+        out = np.zeros(400, np.complex64)
+        for position in [0, 400, 800, 512, 10]:
+            count = r.readinto(position, out)
+            self.assertEqual(count, min(400, 950 - position))
+            self.assertComplexTuplesAlmostEqual(out[:count], self.data[3 + position:3 + position + count])
+        self.assertIn('direct', r.stats())
+        r.close()
+
+        src = sigmf_data_source(self.filename, np.complex64, offset=7, reader='direct',
+                                reader_args={'depth': 2, 'chunk_size': 4096, 'threads': 1})
+        snk = self.run_source(src)
+        self.assertComplexTuplesAlmostEqual(snk.data(), self.data[7:])
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_sigmf_data_source)
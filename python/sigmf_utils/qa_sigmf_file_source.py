@@ -7,10 +7,15 @@
 #
 
 from gnuradio import gr, gr_unittest
-# from gnuradio import blocks
+from gnuradio import blocks
 from gnuradio.sigmf_utils import sigmf_file_source
+import io
+import json
 import numpy as np
+import os
 import pmt
+import tarfile
+import tempfile
 
 
 class qa_sigmf_file_source(gr_unittest.TestCase):
@@ -32,6 +37,123 @@ class qa_sigmf_file_source(gr_unittest.TestCase):
         self.tb.run()
         # check data
 
+    def make_recording(self, tmpdir):
+        data = (np.arange(1000) + 1j * np.arange(1000)).astype(np.complex64)
+        data.tofile(os.path.join(tmpdir, 'test.sigmf-data'))
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 100, 'core:sample_count': 10, 'core:label': 'a'},
+                              {'core:sample_start': 400, 'core:sample_count': 20, 'core:label': 'b'},
+                              {'core:sample_start': 900, 'core:sample_count': 10, 'core:label': 'a'}]}
+        with open(os.path.join(tmpdir, 'test.sigmf-meta'), 'w') as f:
+            json.dump(md, f)
+        return os.path.join(tmpdir, 'test.sigmf-meta'), data
+
+    def test_002_segment_stream(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename, data = self.make_recording(tmpdir)
+            src = sigmf_file_source(filename, 'cf32_le', 0, pmt.PMT_NIL, False, True, 'mmap',
+                                    segment_mode='stream', segment_filter={'label': 'a'}, segment_padding=5)
+            snk = blocks.vector_sink_c()
+            self.tb.connect(src, snk)
+            self.tb.run()
+
+        self.assertComplexTuplesAlmostEqual(snk.data(), np.concatenate([data[95:115], data[895:915]]))
+        bursts = [t.offset for t in snk.tags() if pmt.symbol_to_string(t.key) == 'new_burst']
+        self.assertEqual(bursts, [5, 25])
+
+    def test_003_segment_pdus(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename, data = self.make_recording(tmpdir)
+            src = sigmf_file_source(filename, 'cf32_le', 0, pmt.PMT_NIL, False, True, 'mmap',
+                                    segment_mode='pdu')
+            dbg = blocks.message_debug()
+            self.tb.msg_connect(src, 'pdus', dbg, 'store')
+            self.tb.run()
+
+        self.assertEqual(dbg.num_messages(), 3)
+        pdu = dbg.get_message(1)
+        self.assertEqual(pmt.to_python(pmt.car(pdu))['sample_start'], 400)
+        self.assertComplexTuplesAlmostEqual(pmt.c32vector_elements(pmt.cdr(pdu)), data[400:420])
+
+    def test_004_convert_tags(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.sigmf-meta')
+            data = np.arange(2000, dtype=np.int16)
+            data.tofile(os.path.join(tmpdir, 'test.sigmf-data'))
+            md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'ci16_le'},
+                  'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+                  'annotations': [{'core:sample_start': 100, 'core:sample_count': 10}]}
+            with open(filename, 'w') as f:
+                json.dump(md, f)
+            src = sigmf_file_source(filename, 'cf32_le', 0, pmt.PMT_NIL, False, True, 'mmap', scale=2 ** 14,
+                                    start_sample=50)
+            snk = blocks.vector_sink_c()
+            self.tb.connect(src, snk)
+            self.tb.run()
+
+        self.assertComplexTuplesAlmostEqual(snk.data(), (data[100::2] + 1j * data[101::2]) / 2 ** 14)
+        tags = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()]
+        self.assertIn((0, 'frequency'), tags)
+        self.assertIn((50, 'new_burst'), tags)
+        self.assertIn((60, 'gone_burst'), tags)
+
+    def test_005_archive(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.sigmf')
+            md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+                  'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+                  'annotations': []}
+            with tarfile.open(filename, 'w') as tar:
+                for name, data in [('first', np.zeros(100, np.complex64)),
+                                   ('second', (np.arange(100) - 1j * np.arange(100)).astype(np.complex64))]:
+                    for ext, payload in [('.sigmf-meta', json.dumps(md).encode()), ('.sigmf-data', data.tobytes())]:
+                        info = tarfile.TarInfo(f'{name}/{name}{ext}')
+                        info.size = len(payload)
+                        tar.addfile(info, io.BytesIO(payload))
+
+            with self.assertRaises(ValueError):
+                sigmf_file_source(filename, 'cf32_le', 0, pmt.PMT_NIL, False, True)
+            for reader in ['file', 'mmap']:
+                self.tb = gr.top_block()
+                src = sigmf_file_source(filename, 'cf32_le', 0, pmt.PMT_NIL, False, True, reader,
+                                        start_sample=10, recording='second')
+                snk = blocks.vector_sink_c()
+                self.tb.connect(src, snk)
+                self.tb.run()
+                self.assertComplexTuplesAlmostEqual(snk.data(), data[10:])
+
+    def test_006_headers_channels(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.sigmf-meta')
+            # two channels of ci16_le, with capture headers and trailing bytes
+            data = np.arange(800, dtype=np.int16).reshape(200, 4)
+            with open(os.path.join(tmpdir, 'test.sigmf-data'), 'wb') as f:
+                f.write(b'\xff' * 10 + data[:120].tobytes() + b'\xff' * 6 + data[120:].tobytes() + b'\xff' * 3)
+            md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'ci16_le', 'core:num_channels': 2,
+                             'core:trailing_bytes': 3},
+                  'captures': [{'core:sample_start': 0, 'core:frequency': 915e6, 'core:header_bytes': 10},
+                               {'core:sample_start': 120, 'core:frequency': 916e6, 'core:header_bytes': 6}],
+                  'annotations': [{'core:sample_start': 110, 'core:sample_count': 20}]}
+            with open(filename, 'w') as f:
+                json.dump(md, f)
+            for reader in ['file', 'mmap']:
+                self.tb = gr.top_block()
+                src = sigmf_file_source(filename, 'ci16_le', 0, pmt.PMT_NIL, False, True, reader,
+                                        start_sample=100, channels=2)
+                sinks = [blocks.vector_sink_s(), blocks.vector_sink_s()]
+                for channel, snk in enumerate(sinks):
+                    self.tb.connect((src, channel), snk)
+                self.tb.run()
+                for channel, snk in enumerate(sinks):
+                    self.assertEqual(list(snk.data()), data[100:, 2 * channel:2 * channel + 2].reshape(-1).tolist())
+                    tags = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()]
+                    self.assertIn((20, 'new_burst'), tags)
+                    self.assertIn((40, 'frequency'), tags)
+                    self.assertIn((60, 'gone_burst'), tags)
+            with self.assertRaises(ValueError):
+                sigmf_file_source(filename, 'ci16_le', 0, pmt.PMT_NIL, False, True, channels=1)
+
 
 if __name__ == '__main__':
     gr_unittest.run(qa_sigmf_file_source)
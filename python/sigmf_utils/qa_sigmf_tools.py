@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio.sigmf_utils import CaptureIndex, get_capture_index, get_capture_metadata, sample_at_datetime, offset_datetime, \
+    select_annotations, annotation_segments, AnnotationIndex, index_annotations, validate_metadata, check_metadata
+import numpy as np
+
+
+class qa_sigmf_tools(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.captures = [{'core:sample_start': 0, 'core:frequency': 915e6},
+                         {'core:sample_start': 100, 'core:datetime': '2022-01-01T00:00:00Z'},
+                         {'core:sample_start': 200, 'core:frequency': 920e6}]
+
+    def test_001_capture_lookup(self):
+        index = CaptureIndex(self.captures)
+        self.assertEqual(index.lookup(0, 'core:frequency'), 915e6)
+        self.assertEqual(index.lookup(150, 'core:frequency'), 915e6)
+        self.assertEqual(index.lookup(200, 'core:frequency'), 920e6)
+        self.assertEqual(index.lookup(50, 'core:datetime'), None)
+        self.assertEqual(index.lookup(250, 'core:datetime'), '2022-01-01T00:00:00Z')
+        self.assertEqual(index.lookup(199), self.captures[1])
+
+    def test_002_before_first_capture(self):
+        index = CaptureIndex(self.captures[1:])
+        self.assertEqual(index.lookup(50), None)
+        self.assertEqual(index.lookup(50, 'core:frequency'), None)
+
+    def test_003_bulk_lookup(self):
+        index = CaptureIndex(self.captures[1:])
+        freqs = index.lookup_bulk(np.array([0, 100, 199, 200, 1000]), 'core:frequency', np.nan)
+        self.assertTrue(np.all(np.isnan(freqs[:3])))
+        self.assertFloatTuplesAlmostEqual(freqs[3:], [920e6, 920e6])
+        self.assertEqual(list(index.indices([0, 100, 250])), [-1, 0, 1])
+
+    def test_004_get_capture_metadata(self):
+        for sample in [0, 99, 100, 199, 200, 5000]:
+            expected = None
+            for capture in self.captures:
+                if capture['core:sample_start'] > sample:
+                    break
+                expected = capture.get('core:frequency', expected)
+            self.assertEqual(get_capture_metadata(self.captures, sample, 'core:frequency'), expected)
+
+        # the captures list can be modified between lookups
+        self.captures[1] = {'core:sample_start': 50, 'core:frequency': 3.0}
+        self.assertEqual(get_capture_metadata(self.captures, 150, 'core:frequency'), 3.0)
+        self.assertEqual(get_capture_metadata(self.captures, 60, 'core:frequency'), 3.0)
+        self.captures[1]['core:sample_start'] = 120
+        self.assertEqual(get_capture_metadata(self.captures, 60, 'core:frequency'), 915e6)
+        self.captures[2]['core:frequency'] = 4.0
+        self.assertEqual(get_capture_metadata(self.captures, 250, 'core:frequency'), 4.0)
+        self.assertIs(get_capture_index(self.captures), get_capture_index(list(self.captures)))
+
+    def test_005_datetime(self):
+        captures = [{'core:sample_start': 0, 'core:datetime': '2022-01-01T00:00:00Z'},
+                    {'core:sample_start': 1000, 'core:datetime': '2022-01-01T00:01:00Z'}]
+        self.assertEqual(sample_at_datetime(captures, 1e3, '2022-01-01T00:00:00.5Z'), 500)
+        self.assertEqual(sample_at_datetime(captures, 1e3, '2022-01-01T00:01:02Z'), 3000)
+        with self.assertRaises(ValueError):
+            sample_at_datetime(captures, 1e3, '2021-12-31T23:59:59Z')
+        self.assertEqual(offset_datetime('2022-01-01T00:00:00Z', 250, 1e3), '2022-01-01T00:00:00.250000000Z')
+
+    def test_006_annotation_segments(self):
+        annotations = [{'core:sample_start': 100, 'core:sample_count': 10, 'core:label': 'a',
+                        'core:freq_lower_edge': 915e6, 'core:freq_upper_edge': 915.1e6, 'capture_details:SNRdB': 10},
+                       {'core:sample_start': 115, 'core:sample_count': 10, 'core:label': 'b'},
+                       {'core:sample_start': 5, 'core:sample_count': 10, 'core:label': 'a', 'capture_details:SNRdB': 3}]
+        self.assertEqual(list(select_annotations(annotations, label='a')), [0, 2])
+        self.assertEqual(list(select_annotations(annotations, freq_lower=915.05e6)), [0])
+        self.assertEqual(list(select_annotations(annotations, min_snr=5)), [0])
+        self.assertEqual(annotation_segments(annotations, padding=3), [(2, 18, [2]), (97, 128, [0, 1])])
+        self.assertEqual(annotation_segments(annotations, [0, 1], padding=2, end=120), [(98, 112, [0]), (113, 120, [1])])
+
+    def test_007_annotation_index(self):
+        annotations = [{'core:sample_start': 100, 'core:sample_count': 10,
+                        'core:freq_lower_edge': 915e6, 'core:freq_upper_edge': 915.1e6},
+                       {'core:sample_start': 0, 'core:sample_count': 1000},
+                       {'core:sample_start': 105},
+                       {'core:sample_start': 50, 'core:sample_count': 60,
+                        'core:freq_lower_edge': 914.9e6, 'core:freq_upper_edge': 915e6}]
+        index = index_annotations(annotations)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(list(index.overlapping(100, 105)), [1, 3, 0])
+        self.assertEqual(list(index.overlapping(105, 106)), [1, 3, 0, 2])
+        self.assertEqual(list(index.overlapping(110)), [1])
+        self.assertEqual(list(index.overlapping(0, 100, freq_lower=914.95e6)), [3])
+        self.assertEqual(list(index.overlapping(0, freq_upper=915e6)), [3])
+        self.assertEqual(list(index.at(105)), [1, 3, 0])
+        self.assertEqual(list(index.at(105, 915.05e6)), [0])
+        self.assertEqual(list(index.at(1000)), [])
+        self.assertEqual(index.count(100, 100), 0)
+        self.assertEqual(index.count(105, 106), 4)
+        self.assertEqual(index.count(0, freq_lower=914e6), 2)
+
+        # against a scan of random annotations, including zero length ones
+        rng = np.random.default_rng(0)
+        starts = rng.integers(0, 10000, 2000)
+        ends = starts + rng.integers(0, 50, 2000) * (rng.random(2000) < 0.9)
+        index = AnnotationIndex(starts, ends)
+        for a, b in rng.integers(0, 10100, (200, 2)):
+            expected = np.flatnonzero((starts < b) & ((ends > a) | (starts >= a)))
+            np.testing.assert_array_equal(np.sort(index.overlapping(a, b)), expected)
+            self.assertEqual(index.count(a, b), len(expected))
+            np.testing.assert_array_equal(np.sort(index.at(a)), np.flatnonzero((starts <= a) & (ends > a)))
+        with self.assertRaises(ValueError):
+            index.at(0, 915e6)
+
+    def test_008_validate_metadata(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le', 'core:version': '1.0.0',
+                         'core:extensions': [{'name': 'capture_details', 'version': '1.0.0', 'optional': True}]},
+              'captures': [{'core:sample_start': 0, 'core:datetime': '2022-01-01T00:00:00Z'},
+                           {'core:sample_start': 100, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 5, 'capture_details:SNRdB': 3.5},
+                              {'core:sample_start': 20, 'core:freq_lower_edge': 1.0, 'core:freq_upper_edge': 2.0}]}
+        self.assertEqual(validate_metadata(md), [])
+        self.assertEqual(validate_metadata(md, 'full'), [])
+        check_metadata(md)
+
+        md['global']['core:datatype'] = 'cf32'
+        md['captures'].append({'core:sample_start': 100})
+        md['annotations'] += [{'core:sample_start': 5, 'core:sample_count': -1}, 'burst', {'core:sample_count': 1},
+                              {'core:sample_start': 30, 'core:freq_lower_edge': 2.0, 'core:freq_upper_edge': 1.0}]
+        issues = validate_metadata(md)
+        self.assertEqual([(i['severity'], i['section'], i['index'], i['key']) for i in issues], [
+            ('error', 'global', None, 'core:datatype'),
+            ('error', 'captures', 2, 'core:sample_start'),
+            ('error', 'annotations', 3, None),
+            ('error', 'annotations', 4, 'core:sample_start'),
+            ('error', 'annotations', 2, 'core:sample_count'),
+            ('warning', 'annotations', 2, 'core:sample_start'),
+            ('warning', 'annotations', 5, 'core:freq_lower_edge')])
+        self.assertEqual(issues[2]['message'], 'Invalid SigMF Annotation 3, not a dictionary object')
+        self.assertEqual(len(validate_metadata(md, max_issues=2)), 2)
+        with self.assertRaisesRegex(ValueError, 'unknown `core:datatype` cf32'):
+            check_metadata(md)
+
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'ci16_le', 'core:version': '1.0.0',
+                         'antenna:gain': 3, 'other': 1},
+              'captures': [{'core:sample_start': 0, 'core:datetime': '2022-01-01 00:00:00'}],
+              'annotations': [{'core:sample_start': 0, 'core:label': 7, 'core:colour': 'red',
+                               'capture_details:SNRdB': 'high', 'mine:x': 1}]}
+        self.assertEqual(validate_metadata(md), [])
+        issues = validate_metadata(md, 'full', schemas={'mine': {'annotations': {'mine:x': 'string'}}})
+        self.assertEqual([(i['severity'], i['section'], i['key']) for i in issues], [
+            ('error', 'captures', 'core:datetime'),
+            ('error', 'annotations', 'core:label'),
+            ('error', 'annotations', 'capture_details:SNRdB'),
+            ('error', 'annotations', 'mine:x'),
+            ('warning', 'global', 'antenna:gain'),
+            ('warning', 'global', 'other'),
+            ('warning', 'annotations', 'core:colour'),
+            ('warning', 'annotations', 'capture_details:SNRdB'),
+            ('warning', 'annotations', 'mine:x')])
+        with self.assertRaises(ValueError):
+            validate_metadata(md, 'thorough')
+
+        # numbers in other JSON types, or beyond 64 bits, are not converted
+        for count in ['5', True, 2**70]:
+            md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le', 'core:version': '1.0.0'},
+                  'captures': [{'core:sample_start': '10'}],
+                  'annotations': [{'core:sample_start': 0, 'core:sample_count': count}]}
+            self.assertEqual([(i['section'], i['key']) for i in validate_metadata(md)],
+                             [('captures', 'core:sample_start'), ('annotations', 'core:sample_count')])
+            with self.assertRaisesRegex(ValueError, 'Capture 0, `core:sample_start` must be'):
+                check_metadata(md)
+
+        # negative values in an otherwise regular annotations list
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le', 'core:version': '1.0.0'},
+              'captures': [{'core:sample_start': 0}],
+              'annotations': [{'core:sample_start': -5, 'core:sample_count': -3}, {'core:sample_start': 10}]}
+        self.assertEqual(len(validate_metadata(md)), 2)
+        with self.assertRaisesRegex(ValueError, 'Annotation 0, `core:sample_start` must be'):
+            check_metadata(md)
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_sigmf_tools)
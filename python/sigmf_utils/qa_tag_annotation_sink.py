@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio import blocks
+from gnuradio.sigmf_utils import tag_annotation_sink
+import json
+import os
+import pmt
+import tempfile
+
+
+class qa_tag_annotation_sink(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+
+    def tearDown(self):
+        self.tb = None
+
+    def test_instance(self):
+        instance = tag_annotation_sink('/tmp/a', 900e6, 40e6, 'burst', 'ci16_le')
+
+    def test_001_annotations(self):
+        sob = pmt.to_pmt({'burst_id': 7, 'center_frequency': 900e6, 'sample_rate': 40e6,
+                          'relative_frequency': 0.25, 'bandwidth': 1e6})
+        eob = pmt.to_pmt({'burst_id': 7})
+        tags = [gr.tag_utils.python_to_tag((10, pmt.intern('new_burst'), sob, pmt.PMT_NIL)),
+                gr.tag_utils.python_to_tag((60, pmt.intern('gone_burst'), eob, pmt.PMT_NIL))]
+        src = blocks.vector_source_c([0] * 100, False, 1, tags)
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'test.sigmf-meta')
+            snk = tag_annotation_sink(filename, 900e6, 40e6, 'burst', 'cf32_le')
+            self.tb.connect(src, snk)
+            self.tb.run()
+
+            with open(filename, 'r') as f:
+                md = json.load(f)
+        self.assertEqual(md['global']['core:datatype'], 'cf32_le')
+        self.assertEqual(len(md['annotations']), 1)
+        anno = md['annotations'][0]
+        self.assertEqual(anno['core:sample_start'], 10)
+        self.assertEqual(anno['core:sample_count'], 50)
+        self.assertAlmostEqual(anno['core:freq_lower_edge'], 909.5e6)
+        self.assertAlmostEqual(anno['core:freq_upper_edge'], 910.5e6)
+        self.assertEqual(anno['core:label'], 'burst')
+
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_tag_annotation_sink)
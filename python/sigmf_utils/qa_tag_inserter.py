@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from gnuradio import gr, gr_unittest
+from gnuradio import blocks
+from gnuradio.sigmf_utils import tag_inserter, add_tags_from_sigmf, add_tags_from_sigmf_native
+import numpy as np
+import pmt
+
+
+class qa_tag_inserter(gr_unittest.TestCase):
+
+    def setUp(self):
+        self.tb = gr.top_block()
+
+    def tearDown(self):
+        self.tb = None
+
+    def test_instance(self):
+        instance = tag_inserter(gr.sizeof_gr_complex, [])
+
+    def test_001_just_in_time_tags(self):
+        key = pmt.intern('test')
+        tags = [gr.tag_utils.python_to_tag((offset, key, pmt.from_long(offset), pmt.PMT_NIL)) for offset in [50, 5, 500]]
+        src = blocks.vector_source_c([0] * 100)
+        inserter = tag_inserter(gr.sizeof_gr_complex, tags)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, inserter, snk)
+        self.tb.run()
+
+        self.assertEqual([t.offset for t in snk.tags()], [5, 50])
+        self.assertEqual(inserter.num_tags(), 3)
+
+    def test_002_native_matches_python(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'ci16_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 20,
+                               'core:freq_lower_edge': 915.1e6, 'core:freq_upper_edge': 915.2e6}]}
+        start_key = pmt.intern('rx_start')
+        start_tags = [gr.tag_utils.python_to_tag((offset, start_key, pmt.PMT_NIL, pmt.PMT_NIL)) for offset in [0, 100]]
+        src = blocks.vector_source_s([0] * 200, False, 1, start_tags)
+        inserter = add_tags_from_sigmf_native(np.int16, md, True, start_key)
+        snk = blocks.vector_sink_s()
+        self.tb.connect(src, inserter, snk)
+        self.tb.run()
+
+        bursts = [(t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()
+                  if pmt.symbol_to_string(t.key) in ['new_burst', 'gone_burst']]
+        self.assertEqual(bursts, [(20, 'new_burst'), (60, 'gone_burst'), (120, 'new_burst'), (160, 'gone_burst')])
+        self.assertEqual(inserter.num_bursts(), 1)
+
+    def test_003_restart_closes_bursts(self):
+        md = {'global': {'core:sample_rate': 1e6, 'core:datatype': 'cf32_le'},
+              'captures': [{'core:sample_start': 0, 'core:frequency': 915e6}],
+              'annotations': [{'core:sample_start': 10, 'core:sample_count': 70}]}
+        start_key = pmt.intern('rx_start')
+        start_tags = [gr.tag_utils.python_to_tag((offset, start_key, pmt.PMT_NIL, pmt.PMT_NIL)) for offset in [0, 50]]
+
+        # the burst open at the second start tag is closed there by both implementations
+        results = []
+        for make in [add_tags_from_sigmf, add_tags_from_sigmf_native]:
+            tb = gr.top_block()
+            src = blocks.vector_source_c([0] * 200, False, 1, start_tags)
+            tagger = make(np.complex64, md, True, start_key)
+            snk = blocks.vector_sink_c()
+            tb.connect(src, tagger, snk)
+            tb.run()
+            results.append(sorted((t.offset, pmt.symbol_to_string(t.key)) for t in snk.tags()
+                                  if pmt.symbol_to_string(t.key) in ['new_burst', 'gone_burst']))
+        self.assertEqual(results[1], [(10, 'new_burst'), (50, 'gone_burst'), (60, 'new_burst'), (130, 'gone_burst')])
+        self.assertEqual(results[0], results[1])
+
+
+    def test_004_burst_columns(self):
+        src = blocks.vector_source_c([0] * 100)
+        inserter = tag_inserter(gr.sizeof_gr_complex, [])
+        inserter.set_bursts([5, 5, 50], [60, 20, 500], [0, 1, 2], [915e6] * 3, [1e3, float('nan'), 1e3],
+                            [0.1, float('nan'), 0.1], 1e6)
+        snk = blocks.vector_sink_c()
+        self.tb.connect(src, inserter, snk)
+        self.tb.run()
+
+        # bursts end in order of their end, and those past the data are never tagged
+        tags = [(t.offset, pmt.symbol_to_string(t.key), pmt.to_long(pmt.dict_ref(t.value, pmt.intern('burst_id'),
+                                                                                    pmt.PMT_NIL))) for t in snk.tags()]
+        self.assertEqual(tags, [(5, 'new_burst', 0), (5, 'new_burst', 1), (20, 'gone_burst', 1),
+                                (50, 'new_burst', 2), (60, 'gone_burst', 0)])
+        self.assertFalse(pmt.dict_has_key(snk.tags()[1].value, pmt.intern('bandwidth')))
+        with self.assertRaises(ValueError):
+            inserter.set_bursts([5], [], [0], [915e6], [1e3], [0.1], 1e6)
+
+if __name__ == '__main__':
+    gr_unittest.run(qa_tag_inserter)
@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import mmap
+import os
+import time
+import numpy
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+
+# default number of bytes ahead of the read position to request from the kernel
+DEFAULT_READAHEAD = 16 << 20
+
+# default ring of buffers kept filled ahead of the read position by the `prefetch` reader
+DEFAULT_PREFETCH_DEPTH = 8
+DEFAULT_PREFETCH_CHUNK_SIZE = 4 << 20
+DEFAULT_PREFETCH_THREADS = 2
+
+
+def byte_view(out):
+    """
+    Return a flat uint8 view of the (contiguous) array `out`.
+    """
+    return out.reshape(-1).view(numpy.uint8)
+
+
+def aligned_buffer(size, alignment=mmap.PAGESIZE):
+    """
+    Allocate a uint8 array of `size` bytes starting on an `alignment` boundary.
+    """
+    raw = numpy.empty(size + alignment, numpy.uint8)
+    start = -raw.ctypes.data % alignment
+    return raw[start:start + size]
+
+
+class FileReader(object):
+    """
+    Reads items of a SigMF dataset with ordinary unbuffered file reads. Items are read
+    directly into the destination array without any intermediate copy.
+
+        filename:   dataset file
+        itemsize:   size of one item in bytes
+        offset:     byte offset of the first item in the file
+        nitems:     number of items in the dataset (default: everything after `offset`)
+    """
+    def __init__(self, filename, itemsize, offset=0, nitems=None):
+        self.filename = filename
+        self.itemsize = itemsize
+        self.offset = offset
+        self.file = open(filename, 'rb', buffering=0)
+        if nitems is None:
+            nitems = max(os.fstat(self.file.fileno()).st_size - offset, 0) // itemsize
+        self.nitems = nitems
+
+    def __len__(self):
+        return self.nitems
+
+    def readinto(self, position, out):
+        """
+        Fill the array `out` with the items starting at item `position`. Returns the
+        number of items read, which is only less than `len(out)` at the end of the data.
+        """
+        count = min(len(out), self.nitems - position)
+        if count <= 0:
+            return 0
+        view = memoryview(byte_view(out))[:count * self.itemsize]
+        self.file.seek(self.offset + position * self.itemsize)
+        done = 0
+        while done < len(view):
+            n = self.file.readinto(view[done:])
+            if not n:
+                break
+            done += n
+        return done // self.itemsize
+
+    def prefetch(self, position=0):
+        """
+        Ask the kernel to start reading the data from item `position` into the page cache.
+        """
+        if hasattr(os, 'posix_fadvise') and self.file is not None:
+            os.posix_fadvise(self.file.fileno(), self.offset + position * self.itemsize, DEFAULT_READAHEAD,
+                             os.POSIX_FADV_WILLNEED)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class MmapReader(object):
+    """
+    Reads items of a SigMF dataset through a read-only memory map of the file. Data
+    is copied straight from the page cache into the destination array, avoiding the
+    read system call per buffer. The mapping is advised as sequential and the kernel
+    is asked (`MADV_WILLNEED`) to keep `readahead` bytes beyond the read position in
+    flight, so the page cache is populated before the data is needed.
+
+        filename:   dataset file
+        itemsize:   size of one item in bytes
+        offset:     byte offset of the first item in the file
+        nitems:     number of items in the dataset (default: everything after `offset`)
+        readahead:  bytes to request ahead of the read position (0 to disable)
+    """
+    def __init__(self, filename, itemsize, offset=0, nitems=None, readahead=DEFAULT_READAHEAD):
+        self.filename = filename
+        self.itemsize = itemsize
+        self.readahead = readahead
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if nitems is None:
+                nitems = max(size - offset, 0) // itemsize
+            self.nitems = nitems
+            length = nitems * itemsize
+            # the mapping has to start on an allocation boundary
+            map_offset = offset - offset % mmap.ALLOCATIONGRANULARITY
+            self.base = offset - map_offset
+            self.mmap = None
+            self.data = numpy.zeros(0, numpy.uint8)
+            if length > 0:
+                self.mmap = mmap.mmap(f.fileno(), self.base + length, access=mmap.ACCESS_READ, offset=map_offset)
+                self.data = numpy.frombuffer(self.mmap, numpy.uint8, length, self.base)
+        self.size = self.base + nitems * itemsize
+        self.advised_start = 0
+        self.advised_end = 0
+        self._madvise(getattr(mmap, 'MADV_SEQUENTIAL', None), 0, self.size)
+
+    def __len__(self):
+        return self.nitems
+
+    def readinto(self, position, out):
+        """
+        Fill the array `out` with the items starting at item `position`. Returns the
+        number of items read, which is only less than `len(out)` at the end of the data.
+        """
+        count = min(len(out), self.nitems - position)
+        if count <= 0:
+            return 0
+        start = position * self.itemsize
+        end = start + count * self.itemsize
+        self._readahead(self.base + end)
+        byte_view(out)[:end - start] = self.data[start:end]
+        return count
+
+    def prefetch(self, position=0):
+        """
+        Ask the kernel to start reading the data from item `position` into the page cache.
+        """
+        self._readahead(self.base + position * self.itemsize)
+
+    def _readahead(self, position):
+        # request a new window once half of the previous one has been consumed, or if
+        # the read position jumped backwards (a repeat or seek)
+        if not self.readahead:
+            return
+        if self.advised_start <= position and (self.advised_end == self.size or
+                                               position < self.advised_end - self.readahead // 2):
+            return
+        start = position - position % mmap.PAGESIZE
+        self.advised_start = start
+        self.advised_end = min(start + self.readahead, self.size)
+        self._madvise(getattr(mmap, 'MADV_WILLNEED', None), start, self.advised_end - start)
+
+    def _madvise(self, option, start, length):
+        # madvise() is not available on every platform, it is only a hint anyway
+        if self.mmap is None or option is None or length <= 0 or not hasattr(self.mmap, 'madvise'):
+            return
+        self.mmap.madvise(option, start, length)
+
+    def close(self):
+        if self.mmap is not None:
+            # the array view has to be released before the map can be closed
+            self.data = numpy.zeros(0, numpy.uint8)
+            self.mmap.close()
+            self.mmap = None
+
+
+class PrefetchReader(object):
+    """
+    Reads items of a SigMF dataset through a small pool of I/O threads that keep a ring
+    of `depth` page aligned buffers of `chunk_size` bytes filled ahead of the read
+    position. A read that blocks on slow (network) storage holds up an I/O thread rather
+    than the flowgraph, as long as the ring stays ahead of the consumer. A read outside
+    of the ring (a repeat or seek) discards it and starts filling from the new position.
+
+    The time spent waiting for data that was not ready yet and the amount of data ready
+    ahead of the read position are reported by `stats()`, so the ring can be sized.
+    Chunks are aligned in the file (to `alignment`), the dataset starts `head` bytes into
+    the first one.
+
+        filename:   dataset file
+        itemsize:   size of one item in bytes
+        offset:     byte offset of the first item in the file
+        nitems:     number of items in the dataset (default: everything after `offset`)
+        depth:      number of buffers in the ring
+        chunk_size: size of each buffer in bytes (rounded up to whole pages)
+        threads:    number of I/O threads
+    """
+    def __init__(self, filename, itemsize, offset=0, nitems=None, depth=DEFAULT_PREFETCH_DEPTH,
+                 chunk_size=DEFAULT_PREFETCH_CHUNK_SIZE, threads=DEFAULT_PREFETCH_THREADS):
+        if depth < 1 or chunk_size < 1 or threads < 1:
+            raise ValueError(f'Invalid prefetch configuration depth={depth} chunk_size={chunk_size} threads={threads}')
+        self.filename = filename
+        self.itemsize = itemsize
+        self.offset = offset
+        self.fd = self._open(filename)
+        if nitems is None:
+            nitems = max(os.fstat(self.fd).st_size - offset, 0) // itemsize
+        self.nitems = nitems
+        self.size = nitems * itemsize
+        self.head = offset % self.alignment
+        self.end = self.head + self.size
+        self.depth = depth
+        page = max(mmap.PAGESIZE, self.alignment)
+        self.chunk_size = -(-chunk_size // page) * page
+        self.free = [aligned_buffer(self.chunk_size, page) for _ in range(depth)]
+        # chunk number -> (future of the number of bytes read, buffer)
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.read_end = 0
+        self.stall_time = 0.0
+        self.stalls = 0
+        self.bytes_read = 0
+
+    # file offsets and lengths of the reads are multiples of this
+    alignment = 1
+
+    def __len__(self):
+        return self.nitems
+
+    def _open(self, filename):
+        return os.open(filename, os.O_RDONLY)
+
+    def _chunk_offset(self, chunk):
+        return self.offset - self.head + chunk * self.chunk_size
+
+    def _fill(self, chunk, buffer):
+        # runs on an I/O thread, read the chunk straight into its buffer and return the
+        # number of dataset bytes in it
+        start = chunk * self.chunk_size
+        length = min(self.chunk_size, -(-(self.end - start) // self.alignment) * self.alignment)
+        offset = self._chunk_offset(chunk)
+        done = 0
+        while done < length:
+            view = buffer[done:length]
+            if hasattr(os, 'preadv'):
+                n = os.preadv(self.fd, [view], offset + done)
+            else:
+                data = os.pread(self.fd, length - done, offset + done)
+                n = len(data)
+                view[:n] = numpy.frombuffer(data, numpy.uint8)
+            done += n
+            if not n or n % self.alignment:
+                # end of file, an aligned read can not continue from here
+                break
+        return min(done, self.end - start)
+
+    def _schedule(self, first):
+        # keep the chunks from `first` on in flight, as far as there are free buffers
+        chunk = first
+        while self.free and chunk * self.chunk_size < self.end:
+            if chunk not in self.pending:
+                buffer = self.free.pop()
+                self.pending[chunk] = (self.executor.submit(self._fill, chunk, buffer), buffer)
+            chunk += 1
+
+    def _release(self, chunk):
+        future, buffer = self.pending.pop(chunk)
+        if not future.cancel():
+            future.result()
+        self.free.append(buffer)
+
+    def readinto(self, position, out):
+        """
+        Fill the array `out` with the items starting at item `position`. Returns the
+        number of items read, which is only less than `len(out)` at the end of the data.
+        """
+        count = min(len(out), self.nitems - position)
+        if count <= 0:
+            return 0
+        dest = byte_view(out)[:count * self.itemsize]
+        start = self.head + position * self.itemsize
+        first = start // self.chunk_size
+        # drop whatever is behind the read position or too far ahead of it
+        for chunk in [c for c in self.pending if c < first or c >= first + self.depth]:
+            self._release(chunk)
+
+        done = 0
+        while done < len(dest):
+            chunk, lo = divmod(start + done, self.chunk_size)
+            self._schedule(chunk)
+            future, buffer = self.pending[chunk]
+            if not future.done():
+                t0 = time.perf_counter()
+                future.result()
+                self.stall_time += time.perf_counter() - t0
+                self.stalls += 1
+            length = future.result()
+            n = min(length - lo, len(dest) - done)
+            if n <= 0:
+                break
+            dest[done:done + n] = buffer[lo:lo + n]
+            done += n
+            if lo + n == self.chunk_size:
+                self._release(chunk)
+        self.read_end = start + done
+        self.bytes_read += done
+        self._schedule(self.read_end // self.chunk_size)
+        return done // self.itemsize
+
+    def bytes_ahead(self):
+        """
+        Return the number of bytes that have been read ahead of the read position.
+        """
+        ahead = 0
+        for chunk, (future, buffer) in self.pending.items():
+            if future.done() and not future.cancelled():
+                start = chunk * self.chunk_size
+                ahead += max(start + future.result() - max(self.read_end, start), 0)
+        return ahead
+
+    def stats(self):
+        """
+        Return the reader counters: `stall_time` (seconds spent waiting for data),
+        `stalls` (number of reads that had to wait), `bytes_read` and `bytes_ahead`.
+        """
+        return {'stall_time': self.stall_time, 'stalls': self.stalls, 'bytes_read': self.bytes_read,
+                'bytes_ahead': self.bytes_ahead()}
+
+    def prefetch(self, position=0):
+        """
+        Start filling the ring from item `position`.
+        """
+        self._schedule((self.head + position * self.itemsize) // self.chunk_size)
+
+    def close(self):
+        if self.fd is not None:
+            for chunk in list(self.pending):
+                self._release(chunk)
+            self.executor.shutdown(wait=True)
+            os.close(self.fd)
+            self.fd = None
+
+
+class DirectReader(PrefetchReader):
+    """
+    A `PrefetchReader` using direct I/O (`O_DIRECT`), the data is read from the device
+    straight into the aligned buffers of the ring and bypasses the page cache, so high
+    rate playback does not evict everything else from it. File offsets, read lengths
+    and buffers are aligned to `alignment` bytes: the unaligned head of the dataset (a
+    header or `core:offset`-style prefix, or an archive member) and its tail are read as
+    part of whole aligned blocks and dropped. Where direct I/O is not available (other
+    platforms, or file systems such as tmpfs rejecting it) ordinary reads are used and
+    the pages are dropped from the cache again after every chunk; `direct` tells which.
+
+    Takes the same parameters as `PrefetchReader`.
+    """
+    alignment = 4096
+
+    def _open(self, filename):
+        self.direct = False
+        if hasattr(os, 'O_DIRECT'):
+            try:
+                fd = os.open(filename, os.O_RDONLY | os.O_DIRECT)
+                self.direct = True
+                return fd
+            except OSError:
+                pass
+        return os.open(filename, os.O_RDONLY)
+
+    def _fill(self, chunk, buffer):
+        length = super()._fill(chunk, buffer)
+        if not self.direct and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self.fd, self._chunk_offset(chunk), self.chunk_size, os.POSIX_FADV_DONTNEED)
+        return length
+
+    def stats(self):
+        """
+        Return the `PrefetchReader` counters, and `direct` (True if direct I/O is used).
+        """
+        stats = super().stats()
+        stats['direct'] = self.direct
+        return stats
+
+
+class CaptureReader(object):
+    """
+    Reads the items of a SigMF dataset that holds non-sample header bytes in front of
+    some of its items (the `core:header_bytes` of a capture). The dataset is read with
+    one of the readers above using an item size of one byte, every read is split at
+    the headers and the headers are skipped by position, they are never read.
+
+        reader:     dataset reader with an item size of one byte
+        itemsize:   size of one item in bytes
+        headers:    list of `(item, nbytes)`, the `nbytes` header bytes precede `item`
+    """
+    def __init__(self, reader, itemsize, headers):
+        self.reader = reader
+        self.itemsize = itemsize
+        # the first item of each run of contiguous items and the header bytes before it
+        self.run_starts = [0]
+        self.run_skip = [0]
+        for item, nbytes in sorted(headers):
+            if item == self.run_starts[-1]:
+                self.run_skip[-1] += nbytes
+            else:
+                self.run_starts.append(item)
+                self.run_skip.append(self.run_skip[-1] + nbytes)
+        # the dataset ends with the last whole item in the data
+        self.nitems = 0
+        for idx, (start, skip) in enumerate(zip(self.run_starts, self.run_skip)):
+            available = max(len(reader) - start * itemsize - skip, 0) // itemsize
+            end = self.run_starts[idx + 1] if idx + 1 < len(self.run_starts) else None
+            self.nitems = start + available if end is None else min(start + available, end)
+            if end is None or self.nitems < end:
+                break
+
+    def __len__(self):
+        return self.nitems
+
+    def _byte_position(self, position):
+        run = bisect_right(self.run_starts, position) - 1
+        return run, position * self.itemsize + self.run_skip[run]
+
+    def readinto(self, position, out):
+        """
+        Fill the array `out` with the items starting at item `position`. Returns the
+        number of items read, which is only less than `len(out)` at the end of the data.
+        """
+        count = min(len(out), self.nitems - position)
+        done = 0
+        while done < count:
+            run, start = self._byte_position(position + done)
+            end = self.run_starts[run + 1] if run + 1 < len(self.run_starts) else self.nitems
+            n = min(count - done, end - position - done)
+            got = self.reader.readinto(start, byte_view(out[done:done + n])) // self.itemsize
+            done += got
+            if got < n:
+                break
+        return done
+
+    def prefetch(self, position=0):
+        """
+        Ask the underlying reader to start reading the data from item `position`.
+        """
+        self.reader.prefetch(self._byte_position(min(position, self.nitems))[1])
+
+    def stats(self):
+        """
+        Return the counters of the underlying reader, if it keeps any.
+        """
+        return self.reader.stats() if hasattr(self.reader, 'stats') else {}
+
+    def close(self):
+        self.reader.close()
+
+
+READERS = {'file': FileReader, 'mmap': MmapReader, 'prefetch': PrefetchReader, 'direct': DirectReader}
+
+
+def make_reader(reader, filename, itemsize, offset=0, nitems=None, **kwargs):
+    """
+    Construct one of the dataset readers by name (`file`, `mmap`, `prefetch` or `direct`).
+    Additional keyword arguments are passed to the reader.
+    """
+    if reader not in READERS:
+        raise ValueError(f'Unknown reader `{reader}`, expected one of {list(READERS)}')
+    return READERS[reader](filename, itemsize, offset, nitems, **kwargs)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+
+import numpy
+from gnuradio import gr
+import pmt
+
+
+class segments_to_pdu(gr.sync_block):
+    """
+    Collects a stream made of known length segments played back to back (such as the
+    segment mode of `sigmf_file_source`) into one PDU per segment, published on the
+    `pdus` message port. The PDU metadata is the dictionary given for the segment.
+
+    Block paramters:
+
+        dtype:      numpy.complex64, numpy.int16 (interleaved short data) or numpy.float32
+        segments:   list of `(nitems, metadata)` tuples in stream order
+        repeat:     start over with the first segment after the last one
+    """
+    def __init__(self, dtype, segments, repeat=False):
+        gr.sync_block.__init__(self,
+            name="segments_to_pdu",
+            in_sig=[dtype],
+            out_sig=None)
+
+        self.dtype = dtype
+        self.segments = [(int(n), pmt.to_pmt(meta)) for n, meta in segments if n > 0]
+        self.repeat = repeat
+        self.index = 0
+        self.fill = 0
+        self.buffer = None
+        self.pdu_count = 0
+
+        self.message_port_register_out(pmt.intern("pdus"))
+
+    def make_vector(self, data):
+        if self.dtype == numpy.int16:
+            return pmt.init_s16vector(len(data), data)
+        if self.dtype == numpy.float32:
+            return pmt.init_f32vector(len(data), data)
+        return pmt.init_c32vector(len(data), data)
+
+    def work(self, input_items, output_items):
+        in0 = input_items[0]
+
+        consumed = 0
+        while consumed < len(in0):
+            if self.index >= len(self.segments):
+                if not self.repeat or not self.segments:
+                    # nothing left to collect, drop the rest of the stream
+                    break
+                self.index = 0
+
+            length, meta = self.segments[self.index]
+            if self.buffer is None:
+                self.buffer = numpy.empty(length, dtype=self.dtype)
+                self.fill = 0
+            count = min(length - self.fill, len(in0) - consumed)
+            self.buffer[self.fill:self.fill + count] = in0[consumed:consumed + count]
+            self.fill += count
+            consumed += count
+
+            if self.fill == length:
+                self.message_port_pub(pmt.intern("pdus"), pmt.cons(meta, self.make_vector(self.buffer)))
+                self.pdu_count += 1
+                self.buffer = None
+                self.index += 1
+
+        return len(in0)
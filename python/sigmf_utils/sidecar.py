@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import hashlib
+import os
+import struct
+import tempfile
+import numpy
+from gnuradio import gr
+from . import codec
+from .sigmf_tools import annotation_columns
+
+
+SIDECAR_EXT = '.sigmf-idx'
+SIDECAR_VERSION = 1
+
+# magic, version, header length, meta file size, meta file mtime (ns), meta file hash,
+# number of annotations, followed by the JSON header and the columns (from the first
+# aligned offset after the header, column offsets in the header are relative to that)
+_PREFIX = struct.Struct('<8sIIqq16sq')
+_MAGIC = b'SIGMFIDX'
+_MTIME_OFFSET = 24
+# every column starts on a multiple of this many bytes
+_ALIGNMENT = 64
+
+# name and little endian dtype of each column
+SIDECAR_COLUMNS = [
+    ('sample_start', '<i8'),
+    ('sample_count', '<i8'),
+    ('freq_lower_edge', '<f8'),
+    ('freq_upper_edge', '<f8'),
+    ('label', '<i4'),
+    ('snr', '<f8'),
+]
+
+
+def sidecar_filename(meta_filename):
+    """
+    Return the name of the annotation sidecar of a `.sigmf-meta` file.
+    """
+    return os.path.splitext(meta_filename)[0] + SIDECAR_EXT
+
+
+def file_hash(filename, block=1 << 20):
+    """
+    Return the 16 byte BLAKE2b digest of a file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for data in iter(lambda: f.read(block), b''):
+            digest.update(data)
+    return digest.digest()
+
+
+def _pad(size):
+    return -size % _ALIGNMENT
+
+
+class AnnotationTable(object):
+    """
+    Annotations of a recording as memory mapped columns read from its `.sigmf-idx`
+    sidecar (see `build_sidecar()`). `columns` holds one array per annotation field, in
+    list order:
+
+        `sample_start`      int64, `core:sample_start`
+        `sample_count`      int64, `core:sample_count` (-1 if missing)
+        `freq_lower_edge`   float64, `core:freq_lower_edge` (NaN if missing)
+        `freq_upper_edge`   float64, `core:freq_upper_edge` (NaN if missing)
+        `label`             int32, index in `labels` of `core:label` (or `core:description`,
+                            -1 if missing or not a string)
+        `snr`               float64, `capture_details:SNRdB` (NaN if missing)
+
+    `annotation_columns()`, `select_annotations()` and `annotation_segments()` work on
+    the columns directly. The annotation dictionaries themselves are taken from
+    `annotations` (usually the `StreamedAnnotations` of the metadata file) when they are
+    indexed or iterated, without it they are rebuilt from the columns.
+
+    The sidecar also holds the rest of the metadata (`metadata`, without annotations)
+    and the byte position of the annotations list in the metadata file when it was built
+    from a `StreamedAnnotations` (`annotations_position`, otherwise None), so a fresh
+    sidecar replaces parsing the metadata file entirely.
+    """
+    def __init__(self, filename, annotations=None):
+        self.filename = filename
+        self.annotations = annotations
+        with open(filename, 'rb') as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise ValueError(f'{filename} is not a SigMF annotation sidecar')
+            magic, version, header_size, self.meta_size, self.meta_mtime, self.meta_hash, self.count = \
+                _PREFIX.unpack(prefix)
+            if magic != _MAGIC or version != SIDECAR_VERSION:
+                raise ValueError(f'{filename} is not a version {SIDECAR_VERSION} SigMF annotation sidecar')
+            header = codec.loads(f.read(header_size))
+        self.labels = header['labels']
+        self.metadata = header['metadata']
+        self.annotations_position = header['annotations_position']
+        self.columns = {}
+        data_start = _PREFIX.size + header_size + _pad(_PREFIX.size + header_size)
+        for name, dtype, offset in header['columns']:
+            if self.count:
+                self.columns[name] = numpy.memmap(filename, numpy.dtype(dtype), 'r', data_start + offset,
+                                                  (self.count,))
+            else:
+                self.columns[name] = numpy.zeros(0, numpy.dtype(dtype))
+
+    def is_fresh(self, meta_filename):
+        """
+        Return True if the sidecar describes the current contents of `meta_filename`. The
+        size and modification time are compared first, only if the file was touched is
+        its hash compared (the modification time in the sidecar is updated if it matches).
+        """
+        try:
+            stat = os.stat(meta_filename)
+        except OSError:
+            return False
+        if stat.st_size != self.meta_size:
+            return False
+        if stat.st_mtime_ns == self.meta_mtime:
+            return True
+        if file_hash(meta_filename) != self.meta_hash:
+            return False
+        try:
+            with open(self.filename, 'r+b') as f:
+                f.seek(_MTIME_OFFSET)
+                f.write(struct.pack('<q', stat.st_mtime_ns))
+            self.meta_mtime = stat.st_mtime_ns
+        except OSError:
+            pass
+        return True
+
+    def label_ids(self, label):
+        """
+        Return the ids in the `label` column of the annotations labeled `label`.
+        """
+        return [idx for idx, value in enumerate(self.labels) if value == label]
+
+    def annotation(self, index):
+        """
+        Rebuild the core fields of annotation `index` from the columns.
+        """
+        columns = {name: column[index].item() for name, column in self.columns.items()}
+        annotation = {'core:sample_start': columns['sample_start']}
+        if columns['sample_count'] >= 0:
+            annotation['core:sample_count'] = columns['sample_count']
+        for name in ['freq_lower_edge', 'freq_upper_edge']:
+            if not numpy.isnan(columns[name]):
+                annotation['core:' + name] = columns[name]
+        if columns['label'] >= 0:
+            annotation['core:label'] = self.labels[columns['label']]
+        if not numpy.isnan(columns['snr']):
+            annotation['capture_details:SNRdB'] = columns['snr']
+        return annotation
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self.annotations is not None:
+            yield from self.annotations
+        else:
+            for index in range(self.count):
+                yield self.annotation(index)
+
+    def __getitem__(self, index):
+        if self.annotations is not None:
+            return self.annotations[index]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('annotation index out of range')
+        return self.annotation(index)
+
+
+def _block_columns(annotations, labels):
+    columns = annotation_columns(annotations)
+    label_ids = []
+    for annotation in annotations:
+        label = annotation.get('core:label', annotation.get('core:description'))
+        label_ids.append(labels.setdefault(label, len(labels)) if isinstance(label, str) else -1)
+    columns['label'] = numpy.array(label_ids, numpy.int32)
+    snr = (a.get('capture_details:SNRdB') for a in annotations)
+    columns['snr'] = numpy.fromiter((numpy.nan if v is None else v for v in snr), numpy.float64, len(annotations))
+    return columns
+
+
+def build_sidecar(meta_filename, metadata, filename=None):
+    """
+    Write the `.sigmf-idx` sidecar of `meta_filename` (next to it unless `filename` is
+    given) from its `metadata` dictionary, the annotations can be a list or the
+    `StreamedAnnotations` of the file (read a block at a time). The sidecar is keyed on
+    the size, modification time and hash of the metadata file, and is written to a
+    temporary file (given the read and write permissions of the metadata file) that
+    replaces the old sidecar once complete. Nothing is written if the metadata file
+    changes while the sidecar is built. Returns the sidecar filename.
+    """
+    filename = filename or sidecar_filename(meta_filename)
+    before = os.stat(meta_filename)
+    digest = file_hash(meta_filename)
+
+    annotations = metadata['annotations']
+    labels = {}
+    blocks = annotations.blocks() if hasattr(annotations, 'blocks') else [(0, annotations)]
+    parts = [_block_columns(block, labels) for index, block in blocks]
+    count = sum(len(part['sample_start']) for part in parts)
+
+    header = {'metadata': {key: value for key, value in metadata.items() if key != 'annotations'},
+              'annotations_position': annotations.positions[0] if hasattr(annotations, 'positions') else None,
+              'labels': list(labels), 'columns': []}
+    offset = 0
+    for name, dtype in SIDECAR_COLUMNS:
+        header['columns'].append([name, dtype, offset])
+        size = count * numpy.dtype(dtype).itemsize
+        offset += size + _pad(size)
+    header = codec.dumps(header).encode('utf-8')
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(prefix='.', suffix=SIDECAR_EXT, dir=directory)
+    try:
+        # mkstemp creates the file readable by its owner only, share it like the metadata
+        os.chmod(tmp_filename, before.st_mode & 0o666)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREFIX.pack(_MAGIC, SIDECAR_VERSION, len(header), before.st_size, before.st_mtime_ns,
+                                 digest, count))
+            f.write(header)
+            data_start = f.tell() + _pad(f.tell())
+            for name, dtype, offset in codec.loads(header)['columns']:
+                f.write(b'\0' * (data_start + offset - f.tell()))
+                for part in parts:
+                    f.write(part[name].astype(dtype, copy=False).tobytes())
+        after = os.stat(meta_filename)
+        if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+            raise RuntimeError(f'{meta_filename} changed while its annotation sidecar was built')
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+    return filename
+
+
+def open_sidecar(meta_filename, metadata=None):
+    """
+    Return the `AnnotationTable` of `meta_filename` from its `.sigmf-idx` sidecar. If it
+    is missing or stale it is built from the `metadata` dictionary of the file (see
+    `build_sidecar()`), or None is returned without `metadata`. None is also returned if
+    the sidecar can not be built, for example because the directory can not be written
+    or an annotation is invalid, so the caller can fall back to the JSON annotations.
+    """
+    filename = sidecar_filename(meta_filename)
+    annotations = metadata['annotations'] if metadata is not None else None
+    try:
+        table = AnnotationTable(filename, annotations)
+        if table.is_fresh(meta_filename):
+            return table
+    except (OSError, ValueError, KeyError):
+        pass
+    if metadata is None:
+        return None
+    try:
+        gr.log.info(f'Building SigMF annotation sidecar {filename}')
+        return AnnotationTable(build_sidecar(meta_filename, metadata, filename), annotations)
+    except (OSError, RuntimeError, ValueError, TypeError) as e:
+        gr.log.warn(f'Could not build SigMF annotation sidecar {filename}: {e}')
+        return None
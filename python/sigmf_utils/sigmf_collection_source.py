@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, join, splitext
+from gnuradio import gr
+import pmt
+from . import codec
+from .readers import make_reader, CaptureReader, DEFAULT_READAHEAD
+from .convert import SampleConverter
+from .sigmf_file_source import load_recording
+from .add_tags_from_sigmf import TagGenerator, TagScheduler
+from .sigmf_tools import capture_headers, parse_datetime
+
+
+def collection_recordings(recordings):
+    """
+    Expand the recordings argument of `sigmf_collection_source` into a list of recording
+    filenames: a `.sigmf-collection` file (its `core:streams`, relative to the collection
+    file), a glob pattern, a single filename, or a list of filenames. A recording matched
+    by a pattern through both its meta and data file is only listed once.
+    """
+    if not isinstance(recordings, str):
+        return list(recordings)
+    if recordings.endswith('.sigmf-collection'):
+        with open(recordings, 'rb') as f:
+            collection = codec.load(f)
+        streams = collection.get('collection', {}).get('core:streams', [])
+        return [join(dirname(recordings), stream['name']) for stream in streams]
+    if glob.has_magic(recordings):
+        filenames = []
+        seen = set()
+        for filename in sorted(glob.glob(recordings)):
+            base, ext = splitext(filename)
+            key = base if ext in ['.sigmf-meta', '.sigmf-data'] else filename
+            if key not in seen:
+                seen.add(key)
+                filenames.append(filename)
+        return filenames
+    return [recordings]
+
+
+class CollectionRecording(object):
+    """
+    One recording of a `sigmf_collection_source` playlist.
+    """
+    def __init__(self, filename, output_type, scale=None):
+        self.filename = filename
+        self.metadata, self.data_filename, self.data_offset, self.data_size = load_recording(filename)
+        if int(self.metadata['global'].get('core:num_channels', 1)) != 1:
+            raise ValueError(f'SigMF Collection Source does not support the multi-channel recording {filename}')
+        self.converter = SampleConverter(self.metadata['global'].get('core:datatype'), output_type, scale)
+        self.headers = capture_headers(self.metadata['captures'])
+        self.nsamples = (self.data_size - sum(nbytes for sample, nbytes in self.headers)) // self.converter.sample_size
+        self.sample_rate = float(self.metadata['global'].get('core:sample_rate'))
+        datetimes = [parse_datetime(c['core:datetime']) for c in self.metadata['captures'] if 'core:datetime' in c]
+        self.datetime = min(datetimes) if datetimes else None
+        self.generator = None
+
+    def open(self, reader, readahead):
+        """
+        Open a reader for the dataset and ask for the start of it to be read ahead.
+        """
+        kwargs = {'readahead': readahead} if reader == 'mmap' else {}
+        if self.headers:
+            dataset = CaptureReader(make_reader(reader, self.data_filename, 1, self.data_offset, self.data_size,
+                                                **kwargs), self.converter.sample_size, self.headers)
+        else:
+            dataset = make_reader(reader, self.data_filename, self.converter.sample_size, self.data_offset,
+                                  self.nsamples, **kwargs)
+        dataset.prefetch(0)
+        return dataset
+
+    def tag_generator(self, item_scale):
+        if self.generator is None:
+            self.generator = TagGenerator(self.metadata, item_scale)
+        return self.generator
+
+
+class sigmf_collection_source(gr.sync_block):
+    """
+    Plays a sequence of SigMF recordings back to back as one continuous stream, such as
+    the consecutive recordings of a sensor listed in a SigMF collection. Recordings are
+    sorted by the earliest `core:datetime` of their captures (recordings without one are
+    played last, in the given order) and are converted to the output type like in
+    `sigmf_file_source`, the SigMF datatype may differ between recordings.
+
+    There is no gap at the recording boundaries: a work call that reaches the end of a
+    recording continues from the next one, which is opened (and its first data requested
+    from the kernel) in a background thread while the current one is playing.
+
+    The `core:header_bytes` of the captures are skipped like in `sigmf_file_source`,
+    multi-channel recordings are not supported.
+
+    The SigMF tags of every recording are added at its first sample, with offsets that
+    continue across the whole stream. Bursts still open at the end of a recording are
+    closed with a `gone_burst` tag there, burst ids are the annotation numbers within
+    each recording.
+
+    Block paramters:
+
+        recordings:     `.sigmf-collection` filename, glob pattern (for example
+                        `/data/sensor1/*.sigmf-meta`) or list of recording filenames
+                        (sigmf-meta, sigmf-data or `.sigmf` archive)
+        output_type:    gnuradio output type, `cf32_le`, `ci16_le` or `rf32_le`
+        repeat:         start over with the first recording after the last one
+        add_begin_tag:  key for tag placed on the first sample of every pass, value is
+                        the repeat count (PMT_NIL to disable)
+        add_sigmf_tags: add tags for the sigmf metadata fields and annotations
+        reader:         `mmap` or `file` (see `sigmf_data_source`)
+        readahead:      bytes to request ahead of the read position (`mmap` only)
+        scale:          conversion full scale value (see `SampleConverter`)
+    """
+    def __init__(self, recordings, output_type, repeat=False, add_begin_tag=pmt.PMT_NIL, add_sigmf_tags=True,
+                 reader='mmap', readahead=DEFAULT_READAHEAD, scale=None):
+        filenames = collection_recordings(recordings)
+        if not filenames:
+            raise ValueError(f'No SigMF recordings found for {recordings}')
+        playlist = [CollectionRecording(filename, output_type, scale) for filename in filenames]
+        order = sorted(range(len(playlist)), key=lambda i: (playlist[i].datetime is None,
+                                                             playlist[i].datetime or 0, i))
+        self.playlist = [playlist[i] for i in order if playlist[i].nsamples > 0]
+        if not self.playlist:
+            raise ValueError(f'The SigMF recordings for {recordings} contain no samples')
+        rates = set(r.sample_rate for r in self.playlist)
+        if len(rates) > 1:
+            gr.log.warn(f'SigMF Collection Source recordings have different sample rates {sorted(rates)}')
+
+        converter = self.playlist[0].converter
+        gr.sync_block.__init__(self,
+            name="sigmf_collection_source",
+            in_sig=None,
+            out_sig=[converter.item_type])
+        self.item_scale = converter.items_per_sample
+        self.set_output_multiple(self.item_scale)
+
+        self.repeat = repeat
+        self.begin_tag = add_begin_tag
+        self.add_sigmf_tags = add_sigmf_tags
+        self.reader = reader
+        self.readahead = readahead
+        gr.log.info(f'SigMF Collection Source playing {len(self.playlist)} recordings, '
+                    f'{sum(r.nsamples for r in self.playlist)} samples')
+
+        self.tag_scheduler = TagScheduler(self, None, restartable=True)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.index = 0
+        self.repeat_count = 0
+        self.dataset = None
+        self.position = 0
+        self.next_dataset = self.executor.submit(self.playlist[0].open, reader, readahead)
+
+    def next_index(self):
+        if self.index + 1 < len(self.playlist):
+            return self.index + 1
+        return 0 if self.repeat else None
+
+    def start_recording(self, offset):
+        """
+        Switch to the prefetched dataset of the current recording, start opening the one
+        after it and restart the tags at item `offset`.
+        """
+        self.dataset = self.next_dataset.result()
+        self.position = 0
+        following = self.next_index()
+        self.next_dataset = None
+        if following is not None:
+            self.next_dataset = self.executor.submit(self.playlist[following].open, self.reader, self.readahead)
+
+        recording = self.playlist[self.index]
+        if self.index == 0 and not pmt.is_null(self.begin_tag):
+            self.add_item_tag(0, offset, self.begin_tag, pmt.from_long(self.repeat_count), pmt.intern(self.alias()))
+        if self.add_sigmf_tags:
+            self.tag_scheduler.emit(offset)
+            self.tag_scheduler.generator = recording.tag_generator(self.item_scale)
+            self.tag_scheduler.sample_end = recording.nsamples
+            self.tag_scheduler.restart(offset, 0)
+
+    def finish_recording(self):
+        self.dataset.close()
+        self.dataset = None
+        self.index += 1
+        if self.index == len(self.playlist) and self.repeat:
+            self.index = 0
+            self.repeat_count += 1
+
+    def work(self, input_items, output_items):
+        out = output_items[0]
+        nsamples = len(out) // self.item_scale
+
+        produced = 0
+        while produced < nsamples:
+            if self.dataset is None:
+                if self.index >= len(self.playlist):
+                    break
+                self.start_recording(self.nitems_written(0) + produced * self.item_scale)
+
+            recording = self.playlist[self.index]
+            chunk = out[produced * self.item_scale:nsamples * self.item_scale]
+            count = recording.converter.read(self.dataset, self.position, chunk)
+            self.position += count
+            produced += count
+            if self.position >= recording.nsamples or count == 0:
+                if count == 0:
+                    gr.log.warn(f"SigMF recording {recording.filename} was truncated while reading")
+                self.finish_recording()
+
+        if produced == 0:
+            return -1   # WORK_DONE
+        if self.add_sigmf_tags:
+            self.tag_scheduler.emit(self.nitems_written(0) + produced * self.item_scale)
+        return produced * self.item_scale
+
+    def stop(self):
+        if self.dataset is not None:
+            self.dataset.close()
+            self.dataset = None
+        if self.next_dataset is not None:
+            self.next_dataset.result().close()
+            self.next_dataset = None
+        self.executor.shutdown(wait=False)
+        return True
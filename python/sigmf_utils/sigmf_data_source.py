@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 J. A. Gilbert
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+
+import numpy
+from gnuradio import gr
+import pmt
+import threading
+from bisect import bisect_right
+from .readers import make_reader, CaptureReader, DEFAULT_READAHEAD
+from .convert import SampleConverter
+from .add_tags_from_sigmf import TagGenerator, TagScheduler, load_metadata
+
+
+# SigMF output type produced for each numpy item type
+OUTPUT_TYPES = {numpy.dtype(numpy.complex64): 'cf32_le', numpy.dtype(numpy.int16): 'ci16_le',
+                numpy.dtype(numpy.float32): 'rf32_le'}
+
+
+class sigmf_data_source(gr.sync_block):
+    """
+    Source block for the raw samples of a SigMF dataset file, similar to the GNU Radio
+    file source but reading through one of the `sigmf_utils` dataset readers. The
+    default `mmap` reader maps the file and copies directly from the page cache into
+    the output buffer, with kernel read-ahead requested `readahead` bytes in advance.
+    Datasets of any SigMF datatype are converted to the output type inside the block
+    (see `SampleConverter`), identical types are read straight into the output buffer.
+    Given the SigMF `metadata` the block also attaches the tags of `add_tags_from_sigmf`
+    itself, so reading, conversion and tagging happen in a single work call with one
+    write of every output item.
+
+    A dataset of interleaved multi-channel samples is de-interleaved onto `channels`
+    outputs, every tag is added to each of them. Header bytes in the dataset (such as
+    the `core:header_bytes` of SigMF captures) are skipped by read position, without
+    being read.
+
+    Block paramters:
+
+        filename:   SigMF dataset (`.sigmf-data`) file
+        dtype:      numpy type of the items produced, numpy.complex64, numpy.int16
+                    (interleaved short data) or numpy.float32 when converting
+        repeat:     repeat the data
+        nitems:     number of items to read from the file (0 for the whole file)
+        begin_tag:  key for tag placed on the first item of each pass, value is the
+                    repeat count (PMT_NIL to disable)
+        reader:     `mmap`, `file`, `prefetch` or `direct` (see `readers`)
+        readahead:  bytes to request ahead of the read position (`mmap` only)
+        offset:     item in the file to start reading from (and return to on repeat)
+        position_tag: key for tag placed on the first item of each pass, segment and after
+                    every `seek()`, value is the sample number in the dataset of that item
+                    (half the item number for interleaved short data)
+        segments:   optional list of `(start, end)` item ranges to read back to back in
+                    place of `offset` and `nitems`, the gaps are skipped without reading
+        datatype:   SigMF `core:datatype` of the file (None if the file holds `dtype` items)
+        scale:      conversion full scale value (see `SampleConverter`, None for the default)
+        metadata:   SigMF metadata dictionary or `.sigmf-meta` filename to generate the
+                    SigMF tags from (None to disable), tags restart on every pass, segment
+                    and seek at the sample being read
+        add_annotation_tags: generate `new_burst` / `gone_burst` tags for the annotations
+        data_offset: byte offset of the dataset in the file (such as a SigMF archive member)
+        data_size:  size of the dataset in bytes (None for the rest of the file)
+        reader_args: dictionary of additional reader arguments (such as the `prefetch`
+                    reader `depth`, `chunk_size` and `threads`)
+        channels:   number of interleaved channels in the dataset, one output each
+        header_bytes: list of `(sample, nbytes)`, the number of non-sample bytes preceding
+                    sample `sample` in the dataset (None or empty if there are none)
+
+    Positions and counts are given in output items (two per sample for interleaved
+    short data) and the output is always produced in whole samples.
+    The read position can be changed at runtime with `seek()`, the new position takes
+    effect at the start of the next work call and is marked by a position tag.
+    """
+    def __init__(self, filename, dtype, repeat=False, nitems=0, begin_tag=pmt.PMT_NIL, reader='mmap',
+                 readahead=DEFAULT_READAHEAD, offset=0, position_tag=pmt.PMT_NIL, segments=None, datatype=None,
+                 scale=None, metadata=None, add_annotation_tags=True, data_offset=0, data_size=None,
+                 reader_args=None, channels=1, header_bytes=None):
+        gr.sync_block.__init__(self,
+            name="sigmf_data_source",
+            in_sig=None,
+            out_sig=[dtype] * channels)
+
+        self.item_scale = 2 if dtype == numpy.int16 else 1
+        self.set_output_multiple(self.item_scale)
+        self.converter = None
+        sample_size = numpy.dtype(dtype).itemsize * self.item_scale
+        if datatype is None and channels > 1:
+            # the channels are de-interleaved by the converter
+            datatype = OUTPUT_TYPES.get(numpy.dtype(dtype))
+            if datatype is None:
+                raise ValueError(f'Cannot de-interleave channels of {numpy.dtype(dtype)} data')
+        if datatype is not None:
+            if numpy.dtype(dtype) not in OUTPUT_TYPES:
+                raise ValueError(f'Cannot convert SigMF datatype {datatype} to {numpy.dtype(dtype)}')
+            self.converter = SampleConverter(datatype, OUTPUT_TYPES[numpy.dtype(dtype)], scale, channels)
+            sample_size = self.converter.sample_size
+
+        # the reader and read position work in samples of the dataset
+        kwargs = dict(reader_args or {})
+        if reader == 'mmap':
+            kwargs.setdefault('readahead', readahead)
+        if header_bytes:
+            # headers are skipped by a reader of the dataset bytes
+            self.reader = CaptureReader(make_reader(reader, filename, 1, data_offset, data_size, **kwargs),
+                                        sample_size, header_bytes)
+        else:
+            nsamples = None if data_size is None else data_size // sample_size
+            self.reader = make_reader(reader, filename, sample_size, data_offset, nsamples, **kwargs)
+        self.filename = filename
+        self.channels = channels
+        self.repeat = repeat
+        self.begin_tag = begin_tag
+        self.position_tag = position_tag
+
+        if segments is None:
+            end = len(self.reader) * self.item_scale if nitems <= 0 else offset + nitems
+            segments = [(offset, end)]
+        # clip to the file and drop anything left empty
+        self.segments = []
+        for start, end in segments:
+            start = min(start // self.item_scale, len(self.reader))
+            end = min(end // self.item_scale, len(self.reader))
+            if start < end:
+                self.segments.append((start, end))
+        self.segment_ends = [end for start, end in self.segments]
+        if not self.segments:
+            gr.log.warn(f"SigMF dataset {filename} contains no items in the requested range")
+
+        self.segment = 0
+        self.position = self.segments[0][0] if self.segments else 0
+        self.repeat_count = 0
+        self.tag_pending = True
+        self.position_pending = True
+        self.seek_lock = threading.Lock()
+        self.seek_sample = None
+
+        self.tag_scheduler = None
+        if metadata is not None and self.segments:
+            generator = TagGenerator(load_metadata(metadata), self.item_scale, add_annotation_tags)
+            # every segment restarts the tags, limited to that segment
+            self.tag_scheduler = TagScheduler(self, generator, self.segments[0][0], self.segments[0][1],
+                                              True, repeat, channels)
+
+    def set_begin_tag(self, begin_tag):
+        self.begin_tag = begin_tag
+
+    def seek(self, item):
+        """
+        Continue reading from `item` in the file, returns False if it is outside of the
+        file. A position in a gap between (or before) the configured ranges continues from
+        the start of the next one, and playback still ends (or repeats) at the end of the
+        last range.
+        """
+        if item < 0 or item > len(self.reader) * self.item_scale:
+            gr.log.warn(f"Seek to item {item} is outside of {self.filename}")
+            return False
+        with self.seek_lock:
+            self.seek_sample = item // self.item_scale
+        return True
+
+    def reader_stats(self):
+        """
+        Return the counters of the dataset reader (see `PrefetchReader.stats()`), or an
+        empty dictionary if the reader does not keep any.
+        """
+        return self.reader.stats() if hasattr(self.reader, 'stats') else {}
+
+    def read(self, position, *outputs):
+        """
+        Read the samples starting at `position` into the outputs (one per channel),
+        converting them to the output type if needed. Returns the number of samples read.
+        """
+        if self.converter is None:
+            return self.reader.readinto(position, outputs[0].reshape(-1, self.item_scale))
+        return self.converter.read(self.reader, position, *outputs)
+
+    def add_tag(self, offset, key, value):
+        for port in range(self.channels):
+            self.add_item_tag(port, offset, key, value, pmt.intern(self.alias()))
+
+    def work(self, input_items, output_items):
+        nsamples = len(output_items[0]) // self.item_scale
+
+        with self.seek_lock:
+            if self.seek_sample is not None:
+                self.segment = bisect_right(self.segment_ends, self.seek_sample)
+                if self.segment < len(self.segments):
+                    self.position = max(self.seek_sample, self.segments[self.segment][0])
+                self.position_pending = True
+                self.seek_sample = None
+
+        produced = 0
+        while produced < nsamples:
+            if self.segment >= len(self.segments):
+                if not self.repeat or not self.segments:
+                    break
+                self.segment = 0
+                self.position = self.segments[0][0]
+                self.repeat_count += 1
+                self.tag_pending = True
+                self.position_pending = True
+
+            offset = self.nitems_written(0) + produced * self.item_scale
+            if self.tag_pending:
+                if not pmt.is_null(self.begin_tag):
+                    self.add_tag(offset, self.begin_tag, pmt.from_long(self.repeat_count))
+                self.tag_pending = False
+            if self.position_pending:
+                if not pmt.is_null(self.position_tag):
+                    self.add_tag(offset, self.position_tag, pmt.from_uint64(self.position))
+                if self.tag_scheduler is not None:
+                    self.tag_scheduler.emit(offset)
+                    self.tag_scheduler.restart(offset, self.position, self.segments[self.segment][1])
+                self.position_pending = False
+
+            end = self.segments[self.segment][1]
+            count = min(nsamples - produced, end - self.position)
+            count = self.read(self.position, *[out[produced * self.item_scale:(produced + count) * self.item_scale]
+                                               for out in output_items])
+            if count == 0:
+                gr.log.warn(f"SigMF dataset {self.filename} was truncated while reading")
+                self.repeat = False
+            self.position += count
+            produced += count
+            if self.position >= end or count == 0:
+                self.segment += 1
+                if self.segment < len(self.segments):
+                    self.position = self.segments[self.segment][0]
+                    self.position_pending = True
+
+        if produced == 0:
+            return -1   # WORK_DONE
+        if self.tag_scheduler is not None:
+            self.tag_scheduler.emit(self.nitems_written(0) + produced * self.item_scale)
+        return produced * self.item_scale
@@ -12,33 +12,38 @@ from gnuradio import gr
 from gnuradio import blocks
 from gnuradio import sigmf_utils
 import pmt
-import json
-from os.path import isfile, splitext
+from os.path import getsize, isfile, splitext
 import numpy
+from .readers import DEFAULT_READAHEAD, DEFAULT_PREFETCH_DEPTH, DEFAULT_PREFETCH_CHUNK_SIZE, DEFAULT_PREFETCH_THREADS
+from .convert import SampleConverter, SIGMF_DATATYPES, SIGMF_OUTPUT_TYPES
+from .archive import SigMFArchive, SIGMF_ARCHIVE_EXT
+from .metadata import read_metadata
 
 
-VALID_SIGMF_INPUT_TYPES = ['ci16_le', 'cf32_le']
-VALID_SIGMF_OUTPUT_TYPES = ['ci16_le', 'cf32_le']
+SEGMENT_MODES = ['off', 'stream', 'pdu']
 
-class sigmf_file_source(gr.hier_block2):
-    """
-    This is a simple hier block that abstracts the process of loading a SigMF Recording
-    and making it useful in GNU Radio. Data type conversion is handled by loading the
-    SigMF Metadata file and automatically instantiating blocks to convert to the desired
-    gnuradio output type.
+VALID_SIGMF_INPUT_TYPES = SIGMF_DATATYPES
+VALID_SIGMF_OUTPUT_TYPES = list(SIGMF_OUTPUT_TYPES)
 
-    The rest of the parameters are similar to the file source:
 
-        sigmf_filename: either the sigmf-meta or sigmf-data filename
-        output_type:    gnuradio output type (sigmf data will be converted to this type)
-        nsamples:       number of items to read from the file
-        add_begin_tag:  key for tag to be placed on the first sample
-        repeat:         repeat the data (`tags` generated on the start of each repeat)
-        add_sigmf_tags: add tags for sigmf metadata fields and annotations
+def load_recording(sigmf_filename, recording='', annotation_index=False):
     """
-    def __init__(self, sigmf_filename, output_type, nsamples, add_begin_tag, repeat, add_sigmf_tags):
-        # Determine the SigMF meta and data files
-        filebase, ext = splitext(sigmf_filename)
+    Locate a SigMF recording given either its sigmf-meta or sigmf-data filename (or the
+    name without an extension), or a `.sigmf` archive and the name of the `recording` in
+    it. Returns the metadata dictionary and the `(filename, offset, size)` of the dataset,
+    the size excludes the `core:trailing_bytes` at the end of the dataset. With
+    `annotation_index` the annotations of a `.sigmf-meta` file are read from its
+    `.sigmf-idx` sidecar (see `read_metadata()`), archives are always parsed.
+    """
+    filebase, ext = splitext(sigmf_filename)
+    if ext == SIGMF_ARCHIVE_EXT:
+        archive = SigMFArchive(sigmf_filename)
+        recording = archive.select(recording)
+        gr.log.info(f'SigMF File Source using recording {recording} of archive: {sigmf_filename}')
+        sigmf_metadata = archive.metadata(recording)
+        data_filename = sigmf_filename
+        data_offset, data_size = archive.data_range(recording)
+    else:
         if ext not in ['.sigmf-meta', '.sigmf-data', '.sigmf-']:
             filebase = sigmf_filename
         meta_filename = filebase + '.sigmf-meta'
@@ -49,11 +54,93 @@ class sigmf_file_source(gr.hier_block2):
             raise ValueError(f'SigMF data file {data_filename} does not exist')
         gr.log.info(f'SigMF File Source using metafile: {meta_filename}')
 
-        # Parse the SigMF File for Metadata
-        with open(meta_filename, 'r') as f:
-            self.sigmf_metadata = json.load(f)
-        if 'global' not in self.sigmf_metadata or 'captures' not in self.sigmf_metadata or 'annotations' not in self.sigmf_metadata:
-            raise RuntimeError(f'Invalid SigMF Metadata, missing required top level object')
+        # Parse the SigMF File for Metadata, the annotations are streamed as they are used
+        sigmf_metadata = read_metadata(meta_filename, annotation_index=annotation_index)
+        data_offset, data_size = 0, getsize(data_filename)
+    if 'global' not in sigmf_metadata or 'captures' not in sigmf_metadata or 'annotations' not in sigmf_metadata:
+        raise RuntimeError(f'Invalid SigMF Metadata, missing required top level object')
+    data_size = max(data_size - int(sigmf_metadata['global'].get('core:trailing_bytes', 0)), 0)
+    return sigmf_metadata, data_filename, data_offset, data_size
+
+
+class sigmf_file_source(gr.hier_block2):
+    """
+    This is a simple hier block that abstracts the process of loading a SigMF Recording
+    and making it useful in GNU Radio. Every SigMF core datatype is supported, the data
+    is converted to the desired gnuradio output type (`cf32_le`, `ci16_le` or `rf32_le`
+    for real valued recordings) inside the source block with vectorized conversions.
+
+    The rest of the parameters are similar to the file source:
+
+        sigmf_filename: either the sigmf-meta or sigmf-data filename, or a `.sigmf` archive
+        output_type:    gnuradio output type (sigmf data will be converted to this type)
+        nsamples:       number of items to read from the file
+        add_begin_tag:  key for tag to be placed on the first sample
+        repeat:         repeat the data (`tags` generated on the start of each repeat)
+        add_sigmf_tags: add tags for sigmf metadata fields and annotations
+        reader:         `file` to read with the GNU Radio file source (or plain file reads
+                        when converting), `mmap` to read through a memory map of the
+                        dataset, `prefetch` to read asynchronously ahead of the playback
+                        with a pool of I/O threads, or `direct` to do so with direct I/O
+                        bypassing the page cache (see `sigmf_data_source`)
+        readahead:      bytes to request ahead of the read position (`mmap` only)
+        start_sample:   first sample of the recording to play back (and return to on repeat)
+        end_sample:     sample to stop playback at (0 for the end of the recording)
+        start_datetime: alternatively to `start_sample`, a SigMF `core:datetime` string for
+                        the first sample to play back, located using the capture datetimes
+        segment_mode:   `off`, `stream` to play back only the sample ranges covered by
+                        annotations (back to back, with SigMF tags restarted for each), or
+                        `pdu` to publish each range as a PDU on the `pdus` message port
+        segment_filter: dictionary of `select_annotations()` criteria (`label`,
+                        `freq_lower`, `freq_upper`, `min_snr`) for the annotations to play
+        segment_padding: number of samples to include on either side of each annotation
+        scale:          full scale value of the conversion, integer data is divided by it
+                        and float data converted to `ci16_le` multiplied by it (None for
+                        2^15, or the full range of the SigMF integer type)
+        recording:      name of the recording to play from a multi-recording archive
+        prefetch_depth: number of buffers kept filled ahead of playback (`prefetch` and
+                        `direct` only)
+        prefetch_chunk_size: size in bytes of each of those buffers (`prefetch` and `direct`
+                        only)
+        prefetch_threads: number of I/O threads (`prefetch` and `direct` only)
+        channels:       expected `core:num_channels` of the recording (0 to accept any)
+        annotation_index: read the annotations from the `.sigmf-idx` sidecar of the
+                        metadata file, which is built or rebuilt when it is missing or
+                        out of date, instead of parsing them from the JSON
+
+    Only the selected range of the recording is read. SigMF tag offsets are relative to
+    the first sample played back and annotations are only tagged where they overlap the
+    range. Unless the GNU Radio file source is used (`file` reader without conversion) the
+    playback position can be changed at runtime with `seek()`.
+
+    In a segment mode overlapping or adjacent (after padding) annotations are merged into
+    one segment and the gaps between segments are skipped without being read. Segment
+    PDUs carry the `sample_start`, `sample_count`, `sample_rate`, `center_frequency` and
+    `annotations` (indices of the annotations in the segment) of the segment as metadata.
+
+    The `core:header_bytes` of the captures are skipped (by read position, the headers
+    are never read) and the `core:trailing_bytes` of the dataset are ignored. A recording
+    of `core:num_channels` interleaved channels is de-interleaved onto one output per
+    channel, with the SigMF tags on every output. Neither is supported by the GNU Radio
+    file source or in the `pdu` segment mode, which then fall back to a
+    `sigmf_data_source` and fail respectively.
+
+    SigMF archives are read in place: the metadata member is parsed from the archive and
+    the dataset member is read (or memory mapped) at its offset in the tar file, nothing
+    is extracted. Archives must not be compressed.
+
+    Except with the GNU Radio file source, reading, conversion and the SigMF tags are all
+    handled by a single `sigmf_data_source` block, so every output item is written once.
+    """
+    def __init__(self, sigmf_filename, output_type, nsamples, add_begin_tag, repeat, add_sigmf_tags,
+                 reader='file', readahead=DEFAULT_READAHEAD, start_sample=0, end_sample=0, start_datetime='',
+                 segment_mode='off', segment_filter=None, segment_padding=0, scale=None,
+                 recording='', prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+                 prefetch_chunk_size=DEFAULT_PREFETCH_CHUNK_SIZE, prefetch_threads=DEFAULT_PREFETCH_THREADS,
+                 channels=0, annotation_index=False):
+        # Determine the SigMF meta and data files, or the recording in a SigMF archive
+        self.sigmf_metadata, data_filename, data_offset, data_size = load_recording(sigmf_filename, recording,
+                                                                                    annotation_index)
 
         # Setup and validate the data types
         input_type = self.sigmf_metadata['global'].get('core:datatype')
@@ -61,48 +148,143 @@ class sigmf_file_source(gr.hier_block2):
             raise ValueError(f'This block does not support the SigMF data type {input_type}')
         if output_type not in VALID_SIGMF_OUTPUT_TYPES:
             raise ValueError(f'This block does not support requested output type {output_type}')
-        input_size = 2 if input_type == 'ci16_le' else 8 # cf32_le
-        output_size = gr.sizeof_short if output_type == 'ci16_le' else gr.sizeof_gr_complex
-        nsamples = nsamples * 2 if input_type == 'ci16_le' else nsamples
+        num_channels = int(self.sigmf_metadata['global'].get('core:num_channels', 1))
+        if channels and channels != num_channels:
+            raise ValueError(f'SigMF recording has {num_channels} channels, expected {channels}')
+        if num_channels > 1 and segment_mode == 'pdu':
+            raise ValueError('Segment mode `pdu` does not support multi-channel recordings')
+        self.channels = num_channels
+        converter = SampleConverter(input_type, output_type, scale, num_channels)
+        out_type = converter.item_type
+        output_size = numpy.dtype(out_type).itemsize
+
+        # capture headers are interleaved with the samples of the dataset
+        headers = sigmf_utils.capture_headers(self.sigmf_metadata['captures'])
+        recording_end = (data_size - sum(nbytes for sample, nbytes in headers)) // converter.sample_size
+
+        # Determine the range of samples to play back
+        if start_datetime:
+            start_sample = sigmf_utils.sample_at_datetime(self.sigmf_metadata['captures'],
+                                                          float(self.sigmf_metadata['global']['core:sample_rate']),
+                                                          start_datetime)
+            gr.log.info(f'SigMF File Source starting at sample {start_sample} for {start_datetime}')
+        if end_sample and end_sample <= start_sample:
+            raise ValueError(f'Invalid sample range {start_sample} to {end_sample}')
+        if end_sample and (nsamples == 0 or start_sample + nsamples > end_sample):
+            nsamples = end_sample - start_sample
+        self.start_sample = start_sample
+        self.end_sample = start_sample + nsamples if nsamples else 0
+        self.reader = reader
+        self.item_scale = converter.items_per_sample
+        nsamples = nsamples * self.item_scale
+        offset = start_sample * self.item_scale
+
+        # Determine the annotation segments to play back
+        if segment_mode not in SEGMENT_MODES:
+            raise ValueError(f'Unknown segment mode {segment_mode}, expected one of {SEGMENT_MODES}')
+        segments = None
+        if segment_mode != 'off':
+            if reader == 'file':
+                gr.log.info('SigMF File Source segment playback requires a sigmf_utils reader, using `mmap`')
+                reader = self.reader = 'mmap'
+            segments = self.annotation_segments(recording_end, segment_filter or {}, segment_padding)
+            total = sum(end - start for start, end, annotations in segments)
+            gr.log.info(f'SigMF File Source playing {total} samples in {len(segments)} annotation segments')
 
         # Construct the hier block
         gr.hier_block2.__init__(self,
             "sigmf_file_source",
             gr.io_signature(0, 0, 0),               # Input signature
-            gr.io_signature(1, 1, output_size))     # Output signature
+            gr.io_signature(0, 0, 0) if segment_mode == 'pdu' else gr.io_signature(num_channels, num_channels,
+                                                                                     output_size))
 
         gr.log.info(f'SigMF File Source reading data of type {input_type}, producing data of type {output_type}')
 
         ##################################################
         # Blocks and Connections
         ##################################################
-        self.file_source = blocks.file_source(input_size, data_filename, repeat, 0, nsamples)
-        self.file_source.set_begin_tag(add_begin_tag)
-        if add_sigmf_tags:
-            tag_type = numpy.int16 if output_type == 'ci16_le' else numpy.complex64
-            self.add_tags = sigmf_utils.add_tags_from_sigmf(tag_type, meta_filename, True, add_begin_tag)
-
-        if input_type == output_type:
-            if add_sigmf_tags:
-                self.connect((self.file_source, 0), (self.add_tags, 0), (self, 0))
-            else:
-                self.connect((self.file_source, 0), (self, 0))
-
-        elif input_type == 'ci16_le' and output_type == 'cf32_le':
-            self.ishort_to_complex = blocks.interleaved_short_to_complex(False, False, pow(2,15))
-            if add_sigmf_tags:
-                self.connect((self.file_source, 0), (self.ishort_to_complex, 0), (self.add_tags, 0), (self, 0))
-            else:
-                self.connect((self.file_source, 0), (self.ishort_to_complex, 0), (self, 0))
-
-        elif input_type == 'cf32_le' and output_type == 'ci16_le':
-            self.complex_to_ishort = blocks.complex_to_interleaved_short(False, pow(2,15))
-            if add_sigmf_tags:
-                self.connect((self.file_source, 0), (self.complex_to_ishort, 0), (self.add_tags, 0), (self, 0))
-            else:
-                self.connect((self.file_source, 0), (self.complex_to_ishort, 0), (self, 0))
+        # the GNU Radio file source is only used when no conversion is needed, otherwise the
+        # data source reads, converts and (unless segments are sent as PDUs) adds the tags
+        self.native_source = (reader == 'file' and converter.passthrough and segment_mode == 'off' and
+                              num_channels == 1 and not headers and data_offset % output_size == 0)
+        if self.native_source:
+            # the file source works in items of the whole file, limit it to the dataset
+            if data_offset or self.sigmf_metadata['global'].get('core:trailing_bytes'):
+                nsamples = nsamples or max(data_size // output_size - offset, 0)
+                offset += data_offset // output_size
+            self.file_source = blocks.file_source(output_size, data_filename, repeat, offset, nsamples)
+            self.file_source.set_begin_tag(add_begin_tag)
+        else:
+            metadata = self.sigmf_metadata if add_sigmf_tags and segment_mode != 'pdu' else None
+            reader_args = None
+            if reader in ['prefetch', 'direct']:
+                reader_args = {'depth': prefetch_depth, 'chunk_size': prefetch_chunk_size,
+                               'threads': prefetch_threads}
+            item_segments = None
+            if segments is not None:
+                item_segments = [(start * self.item_scale, end * self.item_scale) for start, end, annotations in segments]
+            self.file_source = sigmf_utils.sigmf_data_source(data_filename, out_type, repeat, nsamples,
+                                                             add_begin_tag, reader, readahead, offset, pmt.PMT_NIL,
+                                                             item_segments, input_type, scale, metadata, True,
+                                                             data_offset, data_size, reader_args, num_channels,
+                                                             headers)
 
+        if segment_mode == 'pdu':
+            rate = float(self.sigmf_metadata['global']['core:sample_rate'])
+            capture_index = sigmf_utils.CaptureIndex(self.sigmf_metadata['captures'])
+            pdu_segments = [((end - start) * self.item_scale,
+                             {'sample_start': start, 'sample_count': end - start, 'sample_rate': rate,
+                              'center_frequency': capture_index.lookup(start, 'core:frequency'),
+                              'annotations': annotations})
+                            for start, end, annotations in segments]
+            self.segment_pdus = sigmf_utils.segments_to_pdu(out_type, pdu_segments, repeat)
+            self.message_port_register_hier_out('pdus')
+            self.connect(self.file_source, self.segment_pdus)
+            self.msg_connect((self.segment_pdus, 'pdus'), (self, 'pdus'))
+        elif add_sigmf_tags and self.native_source:
+            self.add_tags = sigmf_utils.add_tags_from_sigmf(out_type, self.sigmf_metadata, True, add_begin_tag,
+                                                            self.start_sample, self.end_sample)
+            self.connect(self.file_source, self.add_tags, (self, 0))
         else:
-            raise RuntimeError(f'illegal combination of input/output {input_type} / {output_type}')
+            for channel in range(num_channels):
+                self.connect((self.file_source, channel), (self, channel))
+
+    def annotation_segments(self, recording_end, segment_filter, padding):
+        """
+        Select the annotations matching `segment_filter` and merge them into the sample
+        ranges to play back, limited to the configured range of the recording (which is
+        `recording_end` samples long).
+        """
+        annotations = self.sigmf_metadata['annotations']
+        end = min(self.end_sample, recording_end) if self.end_sample else recording_end
+        indices = sigmf_utils.select_annotations(annotations, **segment_filter)
+        if self.start_sample or end < recording_end:
+            # only the annotations reaching into the range once padded
+            index = sigmf_utils.index_annotations(annotations)
+            indices = numpy.intersect1d(indices, index.overlapping(self.start_sample - padding, end + padding))
+        segments = []
+        for start, stop, selected in sigmf_utils.annotation_segments(annotations, indices, padding, end):
+            if stop > self.start_sample:
+                segments.append((max(start, self.start_sample), stop, selected))
+        return segments
 
+    def reader_stats(self):
+        """
+        Return the counters of the dataset reader, with the `prefetch` and `direct` readers
+        these are `stall_time` (seconds the playback waited for data), `stalls`,
+        `bytes_read` and `bytes_ahead` (data ready ahead of playback) to size its buffers
+        with, and `direct` for the `direct` reader (False if it fell back to buffered reads).
+        """
+        if self.native_source:
+            return {}
+        return self.file_source.reader_stats()
 
+    def seek(self, sample):
+        """
+        Continue playback from `sample` in the recording, the SigMF tags follow the new
+        position. Not supported by the GNU Radio file source. Returns False if the sample
+        is outside of the recording.
+        """
+        if self.native_source:
+            raise RuntimeError('sigmf_file_source seek() is not supported with the GNU Radio file source')
+        return self.file_source.seek(sample * self.item_scale)
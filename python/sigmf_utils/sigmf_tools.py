@@ -6,52 +6,756 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 #
 
+import re
+import numpy
+from bisect import bisect_right
+from itertools import repeat
+from .convert import SIGMF_DATATYPES
+
+
+class CaptureIndex(object):
+    """
+    Lookup structure for a SigMF `captures` list. The `core:sample_start` values are
+    held in a sorted array so the capture segment containing a given sample can be
+    found with a binary search instead of a scan of the whole list. Per-key value
+    columns are built lazily on first use and are forward-filled, so a key that is
+    not present in a capture inherits the value from the most recent capture that
+    did define it (this matches the historical `get_capture_metadata` behavior).
+
+    Captures are expected to be sorted by `core:sample_start` as required by SigMF,
+    a stable sort is applied to be tolerant of slightly malformed files.
+    """
+    def __init__(self, captures):
+        order = sorted(range(len(captures)), key=lambda i: captures[i].get('core:sample_start'))
+        self.captures = [captures[i] for i in order]
+        self.sample_starts = numpy.array([c.get('core:sample_start') for c in self.captures], dtype=numpy.uint64)
+        self._starts = self.sample_starts.tolist()
+        self._columns = {}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.captures)
+
+    def column(self, key):
+        """
+        Return the forward-filled list of values for `key`, one entry per capture.
+        Entries are `None` until the first capture that defines the key.
+        """
+        col = self._columns.get(key)
+        if col is None:
+            col = []
+            value = None
+            for capture in self.captures:
+                value = capture.get(key, value)
+                col.append(value)
+            self._columns[key] = col
+        return col
+
+    def index(self, sample_number):
+        """
+        Return the index of the capture that contains `sample_number`, or -1 if the
+        sample is before the first capture.
+        """
+        return bisect_right(self._starts, sample_number) - 1
+
+    def lookup(self, sample_number, key=None):
+        """
+        Return the value of `key` in effect at `sample_number`, or the entire capture
+        dictionary if the key is not given. Returns `None` if the sample precedes the
+        first capture or the key has not been defined yet.
+        """
+        idx = self.index(sample_number)
+        if idx < 0:
+            return None
+        if key is None:
+            return self.captures[idx]
+        return self.column(key)[idx]
+
+    def indices(self, sample_numbers):
+        """
+        Vectorized version of `index()` taking an array of sample numbers.
+        """
+        samples = numpy.asarray(sample_numbers, dtype=numpy.uint64)
+        return numpy.searchsorted(self.sample_starts, samples, side='right').astype(numpy.int64) - 1
+
+    def lookup_bulk(self, sample_numbers, key, default=None):
+        """
+        Vectorized version of `lookup()` for a single key. Returns a NumPy array with
+        one value per sample number; samples that precede the first capture and
+        captures for which the key is not yet defined produce `default`. Passing a
+        numeric default (such as `numpy.nan`) for a numeric key yields a numeric array.
+        """
+        values = self._arrays.get((key, default))
+        if values is None:
+            # the trailing default is selected by index -1 (before the first capture)
+            values = numpy.array([default if v is None else v for v in self.column(key)] + [default])
+            self._arrays[(key, default)] = values
+        return values[self.indices(sample_numbers)]
+
+
+# single entry cache so repeated `get_capture_metadata` calls against the same
+# captures only build the index once: the capture objects and their sample starts
+# are compared on every call, so a modified list is indexed again
+_capture_index_cache = (None, None, None)
+
+
+def get_capture_index(captures):
+    """
+    Return a `CaptureIndex` for the captures list, reusing the previously built index
+    if the list holds the same captures with the same `core:sample_start` values.
+    """
+    global _capture_index_cache
+    cached_captures, cached_starts, index = _capture_index_cache
+    sample_starts = list(map(dict.get, captures, repeat('core:sample_start')))
+    if cached_starts != sample_starts or cached_captures != captures:
+        index = CaptureIndex(captures)
+        _capture_index_cache = (list(captures), sample_starts, index)
+    return index
+
+
 def get_capture_metadata(captures, sample_number, key=None):
     """
-    Iterate over the captures array to determine which capture a given sample
-    corresponds to. Will return metadata for a particular key, or the entire
-    capture if the key is not given.
+    Determine which capture a given sample corresponds to. Will return metadata for
+    a particular key, or the entire capture if the key is not given.
     """
-    return_val = None
-    for index, capture in enumerate(captures):
-        if capture.get('core:sample_start') > sample_number:
-            break
-        elif key is None:
-            return_val = capture
-        else:
-            return_val = capture.get(key, return_val)
-    return return_val
+    index = get_capture_index(captures)
+    idx = index.index(sample_number)
+    if key is None:
+        return index.captures[idx] if idx >= 0 else None
+    # read the captures rather than the cached columns, they may have been modified
+    while idx >= 0 and key not in index.captures[idx]:
+        idx -= 1
+    return index.captures[idx][key] if idx >= 0 else None
 
 
-def check_metadata(metadata):
+def annotation_columns(annotations):
     """
-    Will ensure that the top level keys exist and are of the correct type, and that
-    the basic required objects exist.
+    Pull the numeric core fields of an annotations list into NumPy columns. Returns
+    a dictionary with the following arrays (one entry per annotation, in list order):
+
+        `sample_start`      int64, `core:sample_start` (0 if missing)
+        `sample_count`      int64, `core:sample_count` (-1 if missing)
+        `freq_lower_edge`   float64, `core:freq_lower_edge` (NaN if missing)
+        `freq_upper_edge`   float64, `core:freq_upper_edge` (NaN if missing)
+
+    Annotations streamed from a file (`StreamedAnnotations`) are converted a block at a
+    time, so they are read once and never all held in memory. The memory mapped columns
+    of an `AnnotationTable` are returned without reading any annotations. A ValueError
+    is raised if a sample start or count is not an integer (or does not fit in int64).
+    """
+    if hasattr(annotations, 'columns'):
+        return {key: annotations.columns[key] for key in
+                ['sample_start', 'sample_count', 'freq_lower_edge', 'freq_upper_edge']}
+    if hasattr(annotations, 'blocks'):
+        parts = [annotation_columns(block) for index, block in annotations.blocks()]
+        if not parts:
+            return annotation_columns([])
+        return {key: numpy.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+    def column(key, default, dtype):
+        values = (a.get(key) for a in annotations)
+        return numpy.fromiter((default if v is None else v for v in values), dtype, len(annotations))
+
+    def integer_column(key, default):
+        # NumPy would truncate floats and parse strings, so only integers are converted
+        values = [default if v is None else v for v in (a.get(key) for a in annotations)]
+        if not set(map(type, values)) <= {int}:
+            for value in values:
+                if isinstance(value, bool) or not isinstance(value, (int, numpy.integer)):
+                    raise ValueError(f'SigMF annotation `{key}` must be an integer, not {value!r}')
+        try:
+            return numpy.array(values, numpy.int64)
+        except OverflowError:
+            raise ValueError(f'SigMF annotation `{key}` does not fit in 64 bits') from None
+
+    return {
+        'sample_start': integer_column('core:sample_start', 0),
+        'sample_count': integer_column('core:sample_count', -1),
+        'freq_lower_edge': column('core:freq_lower_edge', numpy.nan, numpy.float64),
+        'freq_upper_edge': column('core:freq_upper_edge', numpy.nan, numpy.float64),
+    }
+
+
+class AnnotationIndex(object):
+    """
+    Lookup structure for the sample ranges (and optionally the frequency ranges) of a
+    set of annotations, answering which annotations overlap a range of samples, which
+    contain a given sample, and how many overlap a range without a scan of them all.
+    The annotations are held in order of their start (`order` maps back to the original
+    indices, `starts` and `ends` are in that order) along with the running maximum of
+    their ends, so the first annotation reaching a sample is found with a binary search.
+    Queries take O(log n + k) for the k annotations returned when annotation lengths are
+    bounded (every annotation starting after the first one reaching the range is looked
+    at). Counting without a frequency range is O(log n) regardless.
+
+    `starts` and `ends` are the first and one past the last sample of each annotation
+    (`ends` not before `starts`). An annotation of zero length covers no samples but
+    overlaps a range it starts in. Frequency edges missing for an annotation (NaN) never
+    match a frequency range.
+    """
+    def __init__(self, starts, ends, freq_lower_edge=None, freq_upper_edge=None):
+        starts = numpy.asarray(starts)
+        ends = numpy.asarray(ends)
+        self.order = numpy.argsort(starts, kind='stable')
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.reach = numpy.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+        self.sorted_ends = numpy.sort(ends)
+        # zero length annotations, which overlap a range starting at them
+        self.points = numpy.sort(starts[ends <= starts])
+        self.freq_lower_edge = None
+        self.freq_upper_edge = None
+        if freq_lower_edge is not None and freq_upper_edge is not None:
+            self.freq_lower_edge = numpy.asarray(freq_lower_edge, dtype=numpy.float64)[self.order]
+            self.freq_upper_edge = numpy.asarray(freq_upper_edge, dtype=numpy.float64)[self.order]
+
+    def __len__(self):
+        return len(self.order)
+
+    def positions(self, start, end=None):
+        """
+        Return the positions in start order (indices into `order`, `starts` and `ends`)
+        of the annotations overlapping the samples from `start` up to `end` (None for no
+        limit), in order of their start.
+        """
+        if end is not None and end <= start:
+            return numpy.zeros(0, numpy.int64)
+        lo = min(numpy.searchsorted(self.reach, start, side='right'),
+                 numpy.searchsorted(self.starts, start, side='left'))
+        hi = len(self.starts) if end is None else numpy.searchsorted(self.starts, end, side='left')
+        keep = (self.ends[lo:hi] > start) | (self.starts[lo:hi] >= start)
+        return lo + numpy.flatnonzero(keep)
+
+    def _in_band(self, positions, freq_lower, freq_upper):
+        if freq_lower is None and freq_upper is None:
+            return positions
+        if self.freq_lower_edge is None:
+            raise ValueError('AnnotationIndex was built without frequency edges')
+        # comparisons against NaN are False so annotations without edges are dropped
+        keep = numpy.ones(len(positions), dtype=bool)
+        if freq_lower is not None:
+            keep &= self.freq_upper_edge[positions] > freq_lower
+        if freq_upper is not None:
+            keep &= self.freq_lower_edge[positions] < freq_upper
+        return positions[keep]
+
+    def overlapping(self, start, end=None, freq_lower=None, freq_upper=None):
+        """
+        Return the indices of the annotations overlapping the samples from `start` up to
+        `end` (None for no limit), and reaching above `freq_lower` and below `freq_upper`
+        when given, in order of their start.
+        """
+        return self.order[self._in_band(self.positions(start, end), freq_lower, freq_upper)]
+
+    def at(self, sample, frequency=None):
+        """
+        Return the indices of the annotations containing `sample`, and `frequency`
+        between their edges when given, in order of their start.
+        """
+        lo = numpy.searchsorted(self.reach, sample, side='right')
+        hi = numpy.searchsorted(self.starts, sample, side='right')
+        positions = lo + numpy.flatnonzero(self.ends[lo:hi] > sample)
+        if frequency is not None:
+            if self.freq_lower_edge is None:
+                raise ValueError('AnnotationIndex was built without frequency edges')
+            positions = positions[(self.freq_lower_edge[positions] <= frequency) &
+                                  (self.freq_upper_edge[positions] >= frequency)]
+        return self.order[positions]
+
+    def count(self, start, end=None, freq_lower=None, freq_upper=None):
+        """
+        Return the number of annotations `overlapping()` would return.
+        """
+        if freq_lower is not None or freq_upper is not None:
+            return len(self.overlapping(start, end, freq_lower, freq_upper))
+        if end is not None and end <= start:
+            return 0
+        # all those starting before the end, except those that ended before the start
+        before_end = len(self.starts) if end is None else numpy.searchsorted(self.starts, end, side='left')
+        ended = numpy.searchsorted(self.sorted_ends, start, side='right')
+        at_start = (numpy.searchsorted(self.points, start, side='right') -
+                    numpy.searchsorted(self.points, start, side='left'))
+        return int(before_end - ended + at_start)
+
+
+def index_annotations(annotations):
+    """
+    Build an `AnnotationIndex` over the sample and frequency ranges of an annotations
+    list (or `StreamedAnnotations`, or `AnnotationTable`). Annotations without a
+    `core:sample_count` have zero length.
+    """
+    columns = annotation_columns(annotations)
+    starts = columns['sample_start']
+    ends = starts + numpy.maximum(columns['sample_count'], 0)
+    return AnnotationIndex(starts, ends, columns['freq_lower_edge'], columns['freq_upper_edge'])
+
+
+def select_annotations(annotations, label=None, freq_lower=None, freq_upper=None, min_snr=None):
+    """
+    Return the indices of the annotations matching all of the given criteria:
+
+        `label`         equal to `core:label` (or `core:description`)
+        `freq_lower`    annotation reaches above this frequency (`core:freq_upper_edge`)
+        `freq_upper`    annotation reaches below this frequency (`core:freq_lower_edge`)
+        `min_snr`       `capture_details:SNRdB` of at least this value
+
+    Annotations missing a field that is filtered on do not match.
+    """
+    if hasattr(annotations, 'columns'):
+        columns = annotations.columns
+        selected = numpy.ones(len(annotations), dtype=bool)
+        if label is not None:
+            selected &= numpy.isin(columns['label'], annotations.label_ids(label))
+        if freq_lower is not None:
+            selected &= columns['freq_upper_edge'] > freq_lower
+        if freq_upper is not None:
+            selected &= columns['freq_lower_edge'] < freq_upper
+        if min_snr is not None:
+            selected &= columns['snr'] >= min_snr
+        return numpy.flatnonzero(selected)
+    if hasattr(annotations, 'blocks'):
+        selected = [select_annotations(block, label, freq_lower, freq_upper, min_snr) + index
+                    for index, block in annotations.blocks()]
+        return numpy.concatenate(selected) if selected else numpy.zeros(0, numpy.int64)
+    selected = numpy.ones(len(annotations), dtype=bool)
+    if label is not None:
+        selected &= numpy.fromiter((a.get('core:label', a.get('core:description')) == label for a in annotations),
+                                   bool, len(annotations))
+    if freq_lower is not None or freq_upper is not None:
+        columns = annotation_columns(annotations)
+        # comparisons against NaN are False so annotations without edges are dropped
+        if freq_lower is not None:
+            selected &= columns['freq_upper_edge'] > freq_lower
+        if freq_upper is not None:
+            selected &= columns['freq_lower_edge'] < freq_upper
+    if min_snr is not None:
+        snr = (a.get('capture_details:SNRdB') for a in annotations)
+        selected &= numpy.fromiter((numpy.nan if v is None else v for v in snr), numpy.float64,
+                                   len(annotations)) >= min_snr
+    return numpy.flatnonzero(selected)
+
+
+def annotation_segments(annotations, indices=None, padding=0, end=None):
+    """
+    Merge the sample ranges covered by the annotations (all, or those in `indices`) into
+    a sorted list of non-overlapping segments. Every annotation is extended by `padding`
+    samples on both sides, and segments are clipped to the recording length `end` when it
+    is given. Annotations without a `core:sample_count` only cover the padding. Returns a
+    list of `(sample_start, sample_end, annotation_indices)` tuples.
+    """
+    if indices is None:
+        indices = numpy.arange(len(annotations))
+    indices = numpy.asarray(indices, dtype=numpy.int64)
+    if hasattr(annotations, 'blocks') or hasattr(annotations, 'columns'):
+        columns = {key: column[indices] for key, column in annotation_columns(annotations).items()}
+    else:
+        columns = annotation_columns([annotations[i] for i in indices])
+    starts = numpy.maximum(columns['sample_start'] - padding, 0)
+    ends = columns['sample_start'] + numpy.maximum(columns['sample_count'], 0) + padding
+    if end is not None:
+        ends = numpy.minimum(ends, end)
+    keep = starts < ends
+    indices, starts, ends = indices[keep], starts[keep], ends[keep]
+    if len(starts) == 0:
+        return []
+
+    order = numpy.argsort(starts, kind='stable')
+    indices, starts, ends = indices[order], starts[order], ends[order]
+    # a new segment begins wherever an annotation starts after everything before it ended
+    reach = numpy.maximum.accumulate(ends)
+    breaks = numpy.flatnonzero(starts[1:] > reach[:-1]) + 1
+    first = numpy.concatenate(([0], breaks))
+    last = numpy.concatenate((breaks, [len(starts)]))
+    return [(int(starts[a]), int(reach[b - 1]), indices[a:b].tolist()) for a, b in zip(first, last)]
+
+
+def parse_datetime(value):
+    """
+    Convert a SigMF `core:datetime` string (ISO 8601, UTC with a `Z` suffix) into a
+    nanosecond resolution `numpy.datetime64`.
+    """
+    return numpy.datetime64(value[:-1] if value.endswith('Z') else value, 'ns')
+
+
+def format_datetime(value):
+    """
+    Format a `numpy.datetime64` as a SigMF `core:datetime` string.
+    """
+    return numpy.datetime_as_string(numpy.datetime64(value, 'ns'), unit='ns') + 'Z'
+
+
+def offset_datetime(value, samples, sample_rate):
+    """
+    Return the SigMF `core:datetime` string for the sample that is `samples` after the
+    sample with the `core:datetime` string `value`.
+    """
+    delta = numpy.timedelta64(int(round(samples * 1e9 / sample_rate)), 'ns')
+    return format_datetime(parse_datetime(value) + delta)
+
+
+def sample_at_datetime(captures, sample_rate, datetime):
+    """
+    Determine the sample number corresponding to the SigMF `core:datetime` string
+    `datetime`, based on the most recent capture with a `core:datetime` at or before
+    that time. Raises a ValueError if no capture has a datetime that early.
+    """
+    target = parse_datetime(datetime)
+    best = None
+    for capture in captures:
+        value = capture.get('core:datetime')
+        if value is None:
+            continue
+        start = parse_datetime(value)
+        if start <= target and (best is None or start >= best[0]):
+            best = (start, capture.get('core:sample_start', 0))
+    if best is None:
+        raise ValueError(f'No SigMF capture has a `core:datetime` at or before {datetime}')
+    elapsed = (target - best[0]) / numpy.timedelta64(1, 's')
+    return best[1] + int(round(elapsed * sample_rate))
+
+
+def capture_headers(captures):
+    """
+    Return the `(sample_start, header_bytes)` of every capture with `core:header_bytes`
+    of non-sample data in front of its first sample in the dataset, in sample order.
+    """
+    return [(capture['core:sample_start'], int(capture['core:header_bytes']))
+            for capture in CaptureIndex(captures).captures if capture.get('core:header_bytes')]
+
+
+# JSON type of every field of `core` and of the extensions known here, by namespace
+# and section (see `validate_metadata()`), more can be passed to it as `schemas`
+SIGMF_SCHEMAS = {
+    'core': {
+        'global': {
+            'core:datatype': 'string', 'core:sample_rate': 'number', 'core:version': 'string',
+            'core:num_channels': 'integer', 'core:sha512': 'string', 'core:offset': 'integer',
+            'core:description': 'string', 'core:author': 'string', 'core:meta_doi': 'string',
+            'core:data_doi': 'string', 'core:recorder': 'string', 'core:license': 'string',
+            'core:hw': 'string', 'core:dataset': 'string', 'core:trailing_bytes': 'integer',
+            'core:metadata_only': 'boolean', 'core:geolocation': 'object', 'core:extensions': 'array',
+            'core:collection': 'string',
+        },
+        'captures': {
+            'core:sample_start': 'integer', 'core:global_index': 'integer', 'core:header_bytes': 'integer',
+            'core:frequency': 'number', 'core:datetime': 'string',
+        },
+        'annotations': {
+            'core:sample_start': 'integer', 'core:sample_count': 'integer', 'core:generator': 'string',
+            'core:label': 'string', 'core:comment': 'string', 'core:freq_lower_edge': 'number',
+            'core:freq_upper_edge': 'number', 'core:uuid': 'string', 'core:description': 'string',
+        },
+    },
+    'capture_details': {
+        'captures': {
+            'capture_details:acq_scale_factor': 'number', 'capture_details:attenuation': 'number',
+            'capture_details:acquisition_bandwidth': 'number', 'capture_details:start_capture': 'string',
+            'capture_details:stop_capture': 'string', 'capture_details:source_file': 'string',
+            'capture_details:gain': 'number',
+        },
+        'annotations': {
+            'capture_details:SNRdB': 'number', 'capture_details:signal_reference_number': 'integer',
+        },
+    },
+    'antenna': {
+        'global': {
+            'antenna:model': 'string', 'antenna:type': 'string', 'antenna:low_frequency': 'number',
+            'antenna:high_frequency': 'number', 'antenna:gain': 'number',
+            'antenna:horizontal_gain_pattern': 'array', 'antenna:vertical_gain_pattern': 'array',
+            'antenna:horizontal_beam_width': 'number', 'antenna:vertical_beam_width': 'number',
+            'antenna:cross_polar_discrimination': 'number', 'antenna:voltage_standing_wave_ratio': 'number',
+            'antenna:cable_loss': 'number', 'antenna:steerable': 'boolean', 'antenna:mobile': 'boolean',
+            'antenna:hagl': 'number',
+        },
+        'annotations': {
+            'antenna:azimuth_angle': 'number', 'antenna:elevation_angle': 'number',
+            'antenna:polarization': 'string',
+        },
+    },
+}
+
+_JSON_TYPES = {
+    'string': lambda v: isinstance(v, str),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+}
+
+_EXACT_TYPES = {'string': {str}, 'number': {int, float}, 'integer': {int}, 'boolean': {bool},
+                'object': {dict}, 'array': {list}}
+
+_DATETIME = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z')
+
+
+def _issue(issues, limit, severity, section, index, key, message):
+    # errors and warnings are kept apart, up to `limit` of each
+    if len(issues[severity]) < limit:
+        issues[severity].append({'severity': severity, 'section': section, 'index': index, 'key': key,
+                                 'message': message})
+
+
+def _object_name(section, index):
+    if section == 'global':
+        return 'SigMF `global` Metadata'
+    return f'SigMF {"Capture" if section == "captures" else "Annotation"} {index}'
+
+
+def _report(issues, limit, severity, section, indices, key, message):
+    """
+    Add an issue for (at most `limit` of) the object `indices` failing a vectorized
+    check, `message` is formatted with the `name` of each object.
+    """
+    prefix = 'Invalid ' if severity == 'error' else ''
+    for index in numpy.asarray(indices)[:max(limit - len(issues[severity]), 0)].tolist():
+        _issue(issues, limit, severity, section, index, key, prefix + message.format(name=_object_name(section, index)))
+
+
+def _value_column(items, key):
     """
-    if not isinstance(metadata.get('global'), dict):
-        raise ValueError(f'Invalid SigMF Metadata, missing `global` dictionary object')
+    Pull `key` out of a list of objects as a float64 column: NaN where it is missing (or
+    null), -inf where the entry is not a dictionary and +inf where it is not a number
+    (strings and booleans included, which NumPy would convert).
+    """
+    nan, inf = numpy.nan, numpy.inf
+    values = [item.get(key, nan) if isinstance(item, dict) else -inf for item in items]
+    if set(map(type, values)) <= {int, float}:
+        # integers beyond 64 bits become large floats, which the range checks reject
+        return numpy.array(values, numpy.float64)
+
+    def number(value):
+        if value is None:
+            return nan
+        if isinstance(value, bool) or not isinstance(value, (int, float, numpy.integer, numpy.floating)):
+            return inf
+        return float(value)
+    return numpy.fromiter((number(value) for value in values), numpy.float64, len(values))
+
+
+def _annotation_value_columns(annotations):
+    keys = ['core:sample_start', 'core:sample_count', 'core:freq_lower_edge', 'core:freq_upper_edge']
+    if hasattr(annotations, 'columns'):
+        # the columns of an annotation sidecar, which only has valid entries
+        columns = [annotations.columns[key[5:]].astype(numpy.float64) for key in keys]
+        columns[1][columns[1] == -1] = numpy.nan
+        return columns
+    if hasattr(annotations, 'blocks'):
+        parts = [[_value_column(block, key) for key in keys] for index, block in annotations.blocks()]
+        return [numpy.concatenate([part[k] for part in parts]) if parts else numpy.zeros(0) for k in range(len(keys))]
+    return [_value_column(annotations, key) for key in keys]
+
+
+def _check_columns(issues, limit, section, starts, counts=None):
+    """
+    Vectorized checks of the `core:sample_start` (and `core:sample_count`) columns of
+    the captures or annotations.
+    """
+    _report(issues, limit, 'error', section, numpy.flatnonzero(starts == -numpy.inf), None,
+            '{name}, not a dictionary object')
+    _report(issues, limit, 'error', section, numpy.flatnonzero(numpy.isnan(starts)), 'core:sample_start',
+            '{name}, missing sample_start')
+    for key, values in [('core:sample_start', starts), ('core:sample_count', counts)]:
+        if values is None:
+            continue
+        valid = numpy.isfinite(values)
+        bad = valid & ((values < 0) | (values >= 2.0 ** 63) | (values != numpy.floor(values)))
+        _report(issues, limit, 'error', section, numpy.flatnonzero(bad | (values == numpy.inf)), key,
+                f'{{name}}, `{key}` must be a non-negative integer')
+
+    valid = numpy.isfinite(starts)
+    order = numpy.flatnonzero(valid)
+    steps = numpy.diff(starts[order])
+    if section == 'captures':
+        # the captures are contiguous segments of the dataset, two starting together overlap
+        _report(issues, limit, 'error', section, order[1:][steps == 0], 'core:sample_start',
+                '{name}, starts at the same sample as the previous capture')
+        _report(issues, limit, 'warning', section, order[1:][steps < 0], 'core:sample_start',
+                '{name} starts before the previous capture, captures must be sorted by `core:sample_start`')
     else:
-        if metadata['global'].get('core:sample_rate') is None:
-            raise ValueError(f'Invalid SigMF `global` Metadata, missing `core:sample_rate`')
-        if metadata['global'].get('core:datatype') is None:
-            raise ValueError(f'Invalid SigMF `global` Metadata, missing `core:datatype`')
+        _report(issues, limit, 'warning', section, order[1:][steps < 0], 'core:sample_start',
+                '{name} starts before the previous annotation, annotations should be sorted by `core:sample_start`')
+
+
+def _key_rule(section, key, schemas, declared):
+    """
+    Return the warnings for `key` in a global, capture or annotation object (formats of
+    the object `name`) and the JSON type of its value in the schemas, or None.
+    """
+    namespace, sep, field = key.partition(':')
+    if not sep:
+        return [f'{{name}} key `{key}` has no namespace'], None
+    warnings = []
+    if namespace != 'core' and namespace not in declared:
+        warnings.append(f'{{name}} key `{key}` is from extension `{namespace}`, which is not in `core:extensions`')
+    schema = schemas.get(namespace)
+    if schema is None:
+        return warnings, None
+    expected = schema.get(section, {}).get(key)
+    if expected is None and (namespace == 'core' or not any(key in fields for fields in schema.values())):
+        warnings.append(f'{{name}} has unknown key `{key}`')
+    return warnings, expected
+
 
-    if not isinstance(metadata.get('captures'), list):
-        raise ValueError(f'Invalid SigMF Metadata, missing `captures` list')
+def _check_object(issues, limit, section, index, obj, rules, schemas, declared):
+    """
+    Check the keys of a single global, capture or annotation object, `rules` holds the
+    `_key_rule()` of every `(section, key)` seen so far.
+    """
+    for key, value in obj.items():
+        rule = rules.get((section, key))
+        if rule is None:
+            rule = rules[section, key] = _key_rule(section, key, schemas, declared)
+        warnings, expected = rule
+        for warning in warnings:
+            _issue(issues, limit, 'warning', section, index, key, warning.format(name=_object_name(section, index)))
+        if expected is None:
+            continue
+        # exact types first, JSON decoders never produce subclasses
+        if type(value) not in _EXACT_TYPES[expected] and not _JSON_TYPES[expected](value):
+            _issue(issues, limit, 'error', section, index, key,
+                   f'Invalid {_object_name(section, index)}, `{key}` must be a JSON {expected}')
+        elif key == 'core:datetime' and not _DATETIME.fullmatch(value):
+            _issue(issues, limit, 'error', section, index, key,
+                   f'Invalid {_object_name(section, index)}, `{key}` must be an ISO 8601 UTC time ending in `Z`')
+
+
+def validate_metadata(metadata, mode='fast', schemas=None, max_issues=1000):
+    """
+    Validate a SigMF metadata dictionary and return the list of problems found, each
+    a dictionary with the `severity` (`error` for metadata that is invalid or can not
+    be played back, `warning` for metadata that is merely not recommended), the
+    `section` (`global`, `captures` or `annotations`), the `index` of the capture or
+    annotation (None for `global`), the `key` concerned (or None) and a `message`.
+    Errors come first, and at most `max_issues` problems are returned.
+
+    The `fast` mode checks the structure of the metadata: the required fields and their
+    values (`core:datatype` must be a datatype SigMF defines), that captures are sorted
+    and do not overlap, that sample starts and counts are non-negative integers, and that
+    frequency edges are ordered. The captures and annotations are pulled into NumPy
+    columns and checked in a few vectorized passes. The `full` mode also checks every key
+    of every object against `SIGMF_SCHEMAS` (the `core` fields and the `capture_details`
+    and `antenna` extensions) and `schemas` (more extensions, `{namespace: {section:
+    {key: type}}}` with JSON type names), and that the extensions used are declared in
+    `core:extensions`, which takes a Python loop over every annotation.
+
+    Annotations streamed from the metadata file (see `read_metadata()`) are validated
+    a block at a time, the whole file is read.
+    """
+    if mode not in ['fast', 'full']:
+        raise ValueError(f'Unknown SigMF validation mode `{mode}`, expected `fast` or `full`')
+    schemas = dict(SIGMF_SCHEMAS, **(schemas or {}))
+    issues = {'error': [], 'warning': []}
+
+    glob = metadata.get('global')
+    if not isinstance(glob, dict):
+        _issue(issues, max_issues, 'error', 'global', None, None,
+               'Invalid SigMF Metadata, missing `global` dictionary object')
+        glob = {}
     else:
-        for idx, capture in enumerate(metadata['captures']):
-            if not isinstance(capture, dict):
-                raise ValueError(f'Invalid SigMF Capture {idx}, not a dictionary object')
-            else:
-                if capture.get('core:sample_start') is None:
-                    raise ValueError(f'Invalid SigMF Capture {idx}, missing sample_start')
+        for key in ['core:sample_rate', 'core:datatype']:
+            if glob.get(key) is None:
+                _issue(issues, max_issues, 'error', 'global', None, key,
+                       f'Invalid SigMF `global` Metadata, missing `{key}`')
+        sample_rate = glob.get('core:sample_rate')
+        if sample_rate is not None and not (_JSON_TYPES['number'](sample_rate) and sample_rate > 0):
+            _issue(issues, max_issues, 'error', 'global', None, 'core:sample_rate',
+                   'Invalid SigMF `global` Metadata, `core:sample_rate` must be a positive number')
+        datatype = glob.get('core:datatype')
+        if datatype is not None and datatype not in SIGMF_DATATYPES:
+            _issue(issues, max_issues, 'error', 'global', None, 'core:datatype',
+                   f'Invalid SigMF `global` Metadata, unknown `core:datatype` {datatype}')
+        num_channels = glob.get('core:num_channels')
+        if num_channels is not None and not (_JSON_TYPES['integer'](num_channels) and num_channels > 0):
+            _issue(issues, max_issues, 'error', 'global', None, 'core:num_channels',
+                   'Invalid SigMF `global` Metadata, `core:num_channels` must be a positive integer')
+        if glob.get('core:version') is None:
+            _issue(issues, max_issues, 'warning', 'global', None, 'core:version',
+                   'SigMF `global` Metadata is missing `core:version`')
+
+    captures = metadata.get('captures')
+    if not isinstance(captures, list):
+        _issue(issues, max_issues, 'error', 'captures', None, None, 'Invalid SigMF Metadata, missing `captures` list')
+        captures = []
+    else:
+        _check_columns(issues, max_issues, 'captures', _value_column(captures, 'core:sample_start'))
+        header_bytes = _value_column(captures, 'core:header_bytes')
+        negative = numpy.flatnonzero(numpy.isfinite(header_bytes) & (header_bytes < 0))
+        _report(issues, max_issues, 'error', 'captures', negative, 'core:header_bytes',
+                '{name}, `core:header_bytes` must not be negative')
 
-    if not isinstance(metadata.get('annotations'), list):
-        raise ValueError(f'Invalid SigMF Metadata, missing `annotations` list')
+    annotations = metadata.get('annotations')
+    if not (isinstance(annotations, list) or hasattr(annotations, 'blocks') or hasattr(annotations, 'columns')):
+        _issue(issues, max_issues, 'error', 'annotations', None, None,
+               'Invalid SigMF Metadata, missing `annotations` list')
+        annotations = []
     else:
-        for idx, annotation in enumerate(metadata['annotations']):
-            if not isinstance(annotation, dict):
-                raise ValueError(f'Invalid SigMF Annotation {idx}, not a dictionary object')
+        starts, counts, lower, upper = _annotation_value_columns(annotations)
+        _check_columns(issues, max_issues, 'annotations', starts, counts)
+        edges = numpy.isfinite(lower) & numpy.isfinite(upper)
+        _report(issues, max_issues, 'warning', 'annotations', numpy.flatnonzero(edges & (lower > upper)),
+                'core:freq_lower_edge', '{name} has a `core:freq_lower_edge` above its `core:freq_upper_edge`')
+        unpaired = numpy.flatnonzero(numpy.isnan(lower) != numpy.isnan(upper))
+        _report(issues, max_issues, 'warning', 'annotations', unpaired, 'core:freq_lower_edge',
+                '{name} has only one of `core:freq_lower_edge` and `core:freq_upper_edge`')
+
+    if mode == 'full':
+        extensions = glob.get('core:extensions', [])
+        declared = set()
+        for idx, extension in enumerate(extensions if isinstance(extensions, list) else []):
+            if not (isinstance(extension, dict) and isinstance(extension.get('name'), str) and
+                    isinstance(extension.get('version'), str) and isinstance(extension.get('optional'), bool)):
+                _issue(issues, max_issues, 'error', 'global', None, 'core:extensions',
+                       f'Invalid SigMF `global` Metadata, `core:extensions` entry {idx} must have a '
+                       '`name`, `version` and `optional`')
             else:
-                if annotation.get('core:sample_start') is None:
-                    raise ValueError(f'Invalid SigMF Annotation {idx}, missing sample_start')
+                declared.add(extension['name'])
+        rules = {}
+        _check_object(issues, max_issues, 'global', None, glob, rules, schemas, declared)
+        for idx, capture in enumerate(captures):
+            if isinstance(capture, dict):
+                _check_object(issues, max_issues, 'captures', idx, capture, rules, schemas, declared)
+        blocks = annotations.blocks() if hasattr(annotations, 'blocks') else [(0, annotations)]
+        for first, block in blocks:
+            for idx, annotation in enumerate(block, first):
+                if isinstance(annotation, dict):
+                    _check_object(issues, max_issues, 'annotations', idx, annotation, rules, schemas, declared)
+            if len(issues['error']) >= max_issues:
+                break
+
+    return (issues['error'] + issues['warning'])[:max_issues]
+
+
+def _plain_annotations(annotations):
+    # True if every annotation is a dictionary with a non-negative int64 sample start
+    # (and sample count, if present)
+    for annotation in annotations:
+        if type(annotation) is not dict:
+            return False
+        start = annotation.get('core:sample_start')
+        count = annotation.get('core:sample_count', 0)
+        if type(start) is not int or type(count) is not int or not 0 <= start < 2 ** 63 or not 0 <= count < 2 ** 63:
+            return False
+    return True
+
+
+def check_metadata(metadata):
+    """
+    Will ensure that the top level keys exist and are of the correct type, and that
+    the basic required objects exist, raising a ValueError for the first error found by
+    a `fast` `validate_metadata()`. Annotations streamed from the file are checked as
+    they are parsed instead (and before an annotation sidecar is built from them).
+
+    A plain annotations list is first scanned for entries that are not dictionaries
+    with a non-negative integer `core:sample_start` (and `core:sample_count` if
+    present). Only if one is found are the annotations validated, as the vectorized
+    checks take several passes over the list.
+    """
+    annotations = metadata.get('annotations')
+    if isinstance(annotations, list) and _plain_annotations(annotations):
+        metadata = dict(metadata, annotations=[])
+    elif hasattr(annotations, 'blocks') or hasattr(annotations, 'columns'):
+        metadata = dict(metadata, annotations=[])
+    for issue in validate_metadata(metadata, max_issues=1):
+        if issue['severity'] == 'error':
+            raise ValueError(issue['message'])